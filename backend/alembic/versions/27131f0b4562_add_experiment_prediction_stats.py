@@ -0,0 +1,153 @@
+"""add experiment prediction stats
+
+Revision ID: 27131f0b4562
+Revises: 
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+import math
+from itertools import groupby
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '27131f0b4562'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Running statistics state as written by experiment_stats_service at this
+# revision (RunningStats.to_dict and summary), copied so the backfill does
+# not change with the service
+RELATIVE_ACCURACY = 0.01
+MAX_BUCKETS = 2048
+SUMMARY_QUANTILES = {"p05": 0.05, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p95": 0.95}
+
+
+def _running_stats(values):
+    """(prediction_stats, metrics summary) for an experiment's prediction values"""
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+    count, mean, m2, low, high = 0, 0.0, 0.0, None, None
+    positive, negative, zero_count = {}, {}, 0
+    for value in values:
+        value = float(value)
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        m2 += delta * (value - mean)
+        low = value if low is None else min(low, value)
+        high = value if high is None else max(high, value)
+        if value == 0:
+            zero_count += 1
+            continue
+        store = positive if value > 0 else negative
+        index = int(math.ceil(math.log(abs(value)) / log_gamma))
+        store[index] = store.get(index, 0) + 1
+    for store in (positive, negative):
+        while len(store) > MAX_BUCKETS:
+            lowest, second = sorted(store)[:2]
+            store[second] += store.pop(lowest)
+
+    def bucket_value(index):
+        return 2 * gamma ** index / (gamma + 1)
+
+    def quantile(q):
+        rank = q * (count - 1)
+        seen = 0
+        for index in sorted(negative, reverse=True):
+            seen += negative[index]
+            if seen > rank:
+                return -bucket_value(index)
+        seen += zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(positive):
+            seen += positive[index]
+            if seen > rank:
+                return bucket_value(index)
+        return bucket_value(max(positive))
+
+    state = {
+        "count": count,
+        "mean": mean,
+        "m2": m2,
+        "min": low,
+        "max": high,
+        "sketch": {
+            "relative_accuracy": RELATIVE_ACCURACY,
+            "max_buckets": MAX_BUCKETS,
+            "positive": {str(k): v for k, v in positive.items()},
+            "negative": {str(k): v for k, v in negative.items()},
+            "zero_count": zero_count,
+        },
+    }
+    variance = m2 / (count - 1) if count > 1 else 0.0
+    summary = {
+        "prediction_count": count,
+        "prediction_mean": mean,
+        "prediction_variance": variance,
+        "prediction_std": math.sqrt(variance),
+        "prediction_min": low,
+        "prediction_max": high,
+    }
+    for name, q in SUMMARY_QUANTILES.items():
+        summary[f"prediction_{name}"] = min(max(quantile(q), low), high)
+    return state, summary
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # Fresh databases get the column from Base.metadata.create_all
+    if "experiments" not in inspector.get_table_names():
+        return
+    columns = {c["name"] for c in inspector.get_columns("experiments")}
+    if "prediction_stats" not in columns:
+        op.add_column("experiments", sa.Column("prediction_stats", sa.JSON(), nullable=True))
+    if "predictions" not in inspector.get_table_names():
+        return
+
+    # Seed the statistics of experiments that already have predictions, one
+    # experiment at a time in a single ordered pass over predictions
+    experiments = sa.table(
+        "experiments", sa.column("id"), sa.column("metrics", sa.JSON), sa.column("prediction_stats", sa.JSON)
+    )
+    predictions = sa.table("predictions", sa.column("experiment_id"), sa.column("prediction_value"))
+    pending = {
+        row.id: row.metrics or {}
+        for row in bind.execute(sa.select(experiments.c.id, experiments.c.metrics).where(
+            experiments.c.prediction_stats.is_(None)
+        ))
+    }
+    if not pending:
+        return
+    rows = bind.execution_options(stream_results=True).execute(
+        sa.select(predictions.c.experiment_id, predictions.c.prediction_value)
+        .where(predictions.c.experiment_id.isnot(None), predictions.c.prediction_value.isnot(None))
+        .order_by(predictions.c.experiment_id)
+    )
+    updates = []
+    for experiment_id, group in groupby(rows, key=lambda row: row.experiment_id):
+        if experiment_id not in pending:
+            continue
+        state, summary = _running_stats(row.prediction_value for row in group)
+        updates.append({
+            "experiment_id": experiment_id,
+            "new_stats": state,
+            "new_metrics": {**pending[experiment_id], **summary},
+        })
+    rows.close()
+    if updates:
+        bind.execute(
+            experiments.update()
+            .where(experiments.c.id == sa.bindparam("experiment_id"))
+            .values(prediction_stats=sa.bindparam("new_stats"), metrics=sa.bindparam("new_metrics")),
+            updates,
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("experiments", "prediction_stats")
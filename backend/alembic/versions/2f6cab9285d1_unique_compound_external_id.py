@@ -0,0 +1,57 @@
+"""unique compound external id
+
+Revision ID: 2f6cab9285d1
+Revises: e2c6a8d4f913
+Create Date: 2026-10-19 21:40:13.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6cab9285d1'
+down_revision = 'e2c6a8d4f913'
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_compounds_external_source_external_id"
+
+
+def _create_index(unique: bool) -> None:
+    op.create_index(
+        INDEX, "compounds", ["external_source", "external_id"],
+        unique=unique, postgresql_concurrently=True
+    )
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "compounds" not in inspector.get_table_names():
+        return
+    indexes = {i["name"]: i for i in inspector.get_indexes("compounds")}
+    if INDEX in indexes and indexes[INDEX]["unique"]:
+        return
+    # Overlapping bulk imports may have stored a compound twice; the later
+    # copies keep their rows (and predictions) but lose the external ID
+    op.execute(sa.text(
+        "UPDATE compounds SET external_id = NULL "
+        "WHERE external_id IS NOT NULL AND EXISTS ("
+        "SELECT 1 FROM compounds AS earlier "
+        "WHERE earlier.external_source = compounds.external_source "
+        "AND earlier.external_id = compounds.external_id "
+        "AND earlier.id < compounds.id)"
+    ))
+    # Rebuilt concurrently as the table may be large
+    with op.get_context().autocommit_block():
+        if INDEX in indexes:
+            op.drop_index(INDEX, table_name="compounds", postgresql_concurrently=True)
+        _create_index(unique=True)
+
+
+def downgrade() -> None:
+    if "compounds" not in sa.inspect(op.get_bind()).get_table_names():
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="compounds", postgresql_concurrently=True)
+        _create_index(unique=False)
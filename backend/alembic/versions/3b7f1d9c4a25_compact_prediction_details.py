@@ -0,0 +1,166 @@
+"""compact prediction details
+
+Revision ID: 3b7f1d9c4a25
+Revises: 9a4d2c7e1b60
+Create Date: 2026-10-19 16:05:48.219734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.models.experiment import DescriptorSet, ModelVersion, ensure_reference_rows, split_prediction_details
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f1d9c4a25'
+down_revision = '9a4d2c7e1b60'
+branch_labels = None
+depends_on = None
+
+# Predictions rewritten per statement batch
+BATCH_SIZE = 1000
+
+predictions = sa.table(
+    "predictions",
+    sa.column("id", sa.Integer),
+    sa.column("model_type", sa.String),
+    sa.column("prediction_details", sa.JSON),
+    sa.column("model_version_id", sa.Integer),
+    sa.column("descriptor_set_id", sa.Integer),
+)
+
+
+def _batches(bind, query):
+    """Yield rows of query in id order, BATCH_SIZE at a time"""
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            query.where(predictions.c.id > last_id).order_by(predictions.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "predictions" not in inspector.get_table_names():
+        return
+
+    tables = inspector.get_table_names()
+    if "model_versions" not in tables:
+        op.create_table(
+            "model_versions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("model_type", sa.String(), nullable=False),
+            sa.Column("model_name", sa.String(), nullable=True),
+            sa.Column("details", sa.JSON(), nullable=False),
+            sa.Column("content_hash", sa.String(64), nullable=False, unique=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_model_versions_id", "model_versions", ["id"])
+    if "descriptor_sets" not in tables:
+        op.create_table(
+            "descriptor_sets",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("descriptors", sa.JSON(), nullable=False),
+            sa.Column("content_hash", sa.String(64), nullable=False, unique=True),
+        )
+        op.create_index("ix_descriptor_sets_id", "descriptor_sets", ["id"])
+
+    columns = {c["name"] for c in inspector.get_columns("predictions")}
+    with op.batch_alter_table("predictions") as batch_op:
+        if "model_version_id" not in columns:
+            batch_op.add_column(sa.Column("model_version_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_predictions_model_version_id", "model_versions", ["model_version_id"], ["id"]
+            )
+        if "descriptor_set_id" not in columns:
+            batch_op.add_column(sa.Column("descriptor_set_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_predictions_descriptor_set_id", "descriptor_sets", ["descriptor_set_id"], ["id"]
+            )
+
+    # Move model metadata and descriptors out of existing rows
+    pending = sa.select(predictions.c.id, predictions.c.model_type, predictions.c.prediction_details).where(
+        predictions.c.model_version_id.is_(None), predictions.c.descriptor_set_id.is_(None)
+    )
+    for rows in _batches(bind, pending):
+        splits = {
+            row.id: split_prediction_details(row.model_type, row.prediction_details)
+            for row in rows
+        }
+        splits = {i: split for i, split in splits.items() if split[0] or split[1]}
+        model_versions = ensure_reference_rows(
+            bind, ModelVersion, {mv["content_hash"]: mv for mv, _, _ in splits.values() if mv}
+        )
+        descriptor_sets = ensure_reference_rows(
+            bind, DescriptorSet, {ds["content_hash"]: ds for _, ds, _ in splits.values() if ds}
+        )
+        if splits:
+            bind.execute(
+                predictions.update().where(predictions.c.id == sa.bindparam("_id")).values(
+                    model_version_id=sa.bindparam("_model_version_id"),
+                    descriptor_set_id=sa.bindparam("_descriptor_set_id"),
+                    prediction_details=sa.bindparam("_extras", type_=sa.JSON),
+                ),
+                [
+                    {
+                        "_id": i,
+                        "_model_version_id": model_versions[mv["content_hash"]] if mv else None,
+                        "_descriptor_set_id": descriptor_sets[ds["content_hash"]] if ds else None,
+                        "_extras": extras,
+                    }
+                    for i, (mv, ds, extras) in splits.items()
+                ],
+            )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    model_versions = sa.table("model_versions", sa.column("id", sa.Integer), sa.column("details", sa.JSON))
+    descriptor_sets = sa.table("descriptor_sets", sa.column("id", sa.Integer), sa.column("descriptors", sa.JSON))
+
+    # Write the full details back into every compacted row
+    compacted = sa.select(
+        predictions.c.id, predictions.c.prediction_details,
+        model_versions.c.details, descriptor_sets.c.descriptors,
+    ).select_from(
+        predictions
+        .outerjoin(model_versions, model_versions.c.id == predictions.c.model_version_id)
+        .outerjoin(descriptor_sets, descriptor_sets.c.id == predictions.c.descriptor_set_id)
+    ).where(sa.or_(
+        predictions.c.model_version_id.isnot(None), predictions.c.descriptor_set_id.isnot(None)
+    ))
+    for rows in _batches(bind, compacted):
+        updates = []
+        for row in rows:
+            details = dict(row.details or {})
+            if row.descriptors is not None:
+                details["properties_used"] = row.descriptors
+            details.update(row.prediction_details or {})
+            updates.append({"_id": row.id, "_details": details})
+        bind.execute(
+            predictions.update().where(predictions.c.id == sa.bindparam("_id")).values(
+                prediction_details=sa.bindparam("_details", type_=sa.JSON),
+                model_version_id=None,
+                descriptor_set_id=None,
+            ),
+            updates,
+        )
+
+    # Tables from create_all carry the dialect's default constraint names
+    foreign_keys = [
+        fk["name"] for fk in sa.inspect(bind).get_foreign_keys("predictions")
+        if fk["name"] and fk["referred_table"] in ("model_versions", "descriptor_sets")
+    ]
+    with op.batch_alter_table("predictions") as batch_op:
+        for name in foreign_keys:
+            batch_op.drop_constraint(name, type_="foreignkey")
+        batch_op.drop_column("descriptor_set_id")
+        batch_op.drop_column("model_version_id")
+    op.drop_index("ix_descriptor_sets_id", table_name="descriptor_sets")
+    op.drop_table("descriptor_sets")
+    op.drop_index("ix_model_versions_id", table_name="model_versions")
+    op.drop_table("model_versions")
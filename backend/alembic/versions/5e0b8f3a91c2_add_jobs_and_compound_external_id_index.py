@@ -0,0 +1,61 @@
+"""add jobs and compound external id index
+
+Revision ID: 5e0b8f3a91c2
+Revises: c7c394d1cd38
+Create Date: 2026-10-19 16:05:48.227310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b8f3a91c2'
+down_revision = 'c7c394d1cd38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if "jobs" not in tables:
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("job_type", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("parameters", sa.JSON(), nullable=True),
+            sa.Column("total", sa.Integer(), nullable=False),
+            sa.Column("processed", sa.Integer(), nullable=False),
+            sa.Column("result", sa.JSON(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_jobs_id", "jobs", ["id"])
+        op.create_index("ix_jobs_job_type", "jobs", ["job_type"])
+        op.create_index("ix_jobs_user_id", "jobs", ["user_id"])
+
+    if "compounds" not in tables:
+        return
+    indexes = {i["name"] for i in inspector.get_indexes("compounds")}
+    if "ix_compounds_external_source_external_id" not in indexes:
+        # Dedupes bulk ChEMBL imports against already imported IDs
+        op.create_index(
+            "ix_compounds_external_source_external_id",
+            "compounds",
+            ["external_source", "external_id"],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_compounds_external_source_external_id", table_name="compounds")
+    op.drop_index("ix_jobs_user_id", table_name="jobs")
+    op.drop_index("ix_jobs_job_type", table_name="jobs")
+    op.drop_index("ix_jobs_id", table_name="jobs")
+    op.drop_table("jobs")
@@ -0,0 +1,81 @@
+"""add latest predictions
+
+Revision ID: 6c2e8a4f1d37
+Revises: 3b7f1d9c4a25
+Create Date: 2026-10-19 17:31:09.584102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2e8a4f1d37'
+down_revision = '3b7f1d9c4a25'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "user_id", "compound_id", "model_type", "model_name", "prediction_id", "experiment_id",
+    "prediction_value", "prediction_confidence", "created_at",
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "predictions" not in inspector.get_table_names():
+        return
+
+    if "latest_predictions" not in inspector.get_table_names():
+        op.create_table(
+            "latest_predictions",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("compound_id", sa.Integer(), sa.ForeignKey("compounds.id"), primary_key=True),
+            sa.Column("model_type", sa.String(), primary_key=True),
+            sa.Column("model_name", sa.String(), primary_key=True),
+            sa.Column("prediction_id", sa.Integer(), sa.ForeignKey("predictions.id"), nullable=False),
+            sa.Column("experiment_id", sa.Integer(), sa.ForeignKey("experiments.id"), nullable=True),
+            sa.Column("prediction_value", sa.Float(), nullable=True),
+            sa.Column("prediction_confidence", sa.Float(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index(
+            "ix_latest_predictions_user_id_model_type_compound_id",
+            "latest_predictions",
+            ["user_id", "model_type", "compound_id", "model_name"],
+        )
+
+    # Seed from history: the highest id per key, in one pass over predictions
+    predictions = sa.table(
+        "predictions", *(sa.column(name) for name in (
+            "id", "user_id", "compound_id", "model_type", "model_name", "experiment_id",
+            "prediction_value", "prediction_confidence", "created_at",
+        ))
+    )
+    model_name = sa.func.coalesce(predictions.c.model_name, "")
+    ranked = sa.select(
+        predictions.c.user_id,
+        predictions.c.compound_id,
+        predictions.c.model_type,
+        model_name.label("model_name"),
+        predictions.c.id.label("prediction_id"),
+        predictions.c.experiment_id,
+        predictions.c.prediction_value,
+        predictions.c.prediction_confidence,
+        predictions.c.created_at,
+        sa.func.row_number().over(
+            partition_by=(predictions.c.user_id, predictions.c.compound_id, predictions.c.model_type, model_name),
+            order_by=predictions.c.id.desc(),
+        ).label("rank"),
+    ).subquery()
+    latest = sa.table("latest_predictions", *(sa.column(name) for name in COLUMNS))
+    bind.execute(latest.delete())
+    bind.execute(latest.insert().from_select(
+        COLUMNS, sa.select(*(ranked.c[name] for name in COLUMNS)).where(ranked.c.rank == 1)
+    ))
+
+
+def downgrade() -> None:
+    op.drop_index("ix_latest_predictions_user_id_model_type_compound_id", table_name="latest_predictions")
+    op.drop_table("latest_predictions")
@@ -0,0 +1,47 @@
+"""index predictions
+
+Revision ID: 9a4d2c7e1b60
+Revises: 5e0b8f3a91c2
+Create Date: 2026-10-19 17:21:09.553014
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2c7e1b60'
+down_revision = '5e0b8f3a91c2'
+branch_labels = None
+depends_on = None
+
+# name -> columns; listings page newest first, so created_at and id descend
+INDEXES = {
+    "ix_predictions_user_id_created_at": ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    "ix_predictions_user_id_model_type_created_at": [
+        "user_id", "model_type", sa.text("created_at DESC"), sa.text("id DESC")
+    ],
+    "ix_predictions_compound_id_user_id_created_at": [
+        "compound_id", "user_id", sa.text("created_at DESC"), sa.text("id DESC")
+    ],
+    "ix_predictions_experiment_id_compound_id": ["experiment_id", "compound_id"],
+}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "predictions" not in inspector.get_table_names():
+        return
+    existing = {i["name"] for i in inspector.get_indexes("predictions")}
+    # Build without blocking writes on large tables (PostgreSQL); concurrent
+    # builds cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            if name not in existing:
+                op.create_index(name, "predictions", columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name="predictions", postgresql_concurrently=True)
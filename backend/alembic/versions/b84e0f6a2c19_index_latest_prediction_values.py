@@ -0,0 +1,38 @@
+"""index latest prediction values
+
+Revision ID: b84e0f6a2c19
+Revises: 6c2e8a4f1d37
+Create Date: 2026-10-19 17:52:40.118263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b84e0f6a2c19'
+down_revision = '6c2e8a4f1d37'
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_latest_predictions_user_id_model_type_value"
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "latest_predictions" not in inspector.get_table_names():
+        return
+    if INDEX in {i["name"] for i in inspector.get_indexes("latest_predictions")}:
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX,
+            "latest_predictions",
+            ["user_id", "model_type", "prediction_value", "compound_id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="latest_predictions", postgresql_concurrently=True)
@@ -0,0 +1,35 @@
+"""index compound versions by time
+
+Revision ID: c7c394d1cd38
+Revises: d50bbd8d1190
+Create Date: 2026-10-19 13:40:05.118730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7c394d1cd38'
+down_revision = 'd50bbd8d1190'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "compound_versions" not in inspector.get_table_names():
+        return
+    indexes = {i["name"] for i in inspector.get_indexes("compound_versions")}
+    if "ix_compound_versions_compound_id_created_at" not in indexes:
+        # Serves the DISTINCT ON (compound_id) ... ORDER BY created_at, id
+        # lookups behind as_of snapshots
+        op.create_index(
+            "ix_compound_versions_compound_id_created_at",
+            "compound_versions",
+            ["compound_id", "created_at", "id"],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_compound_versions_compound_id_created_at", table_name="compound_versions")
@@ -0,0 +1,183 @@
+"""delta encode compound versions
+
+Revision ID: d50bbd8d1190
+Revises: 27131f0b4562
+Create Date: 2026-10-19 11:02:17.604522
+
+"""
+import copy
+import json
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd50bbd8d1190'
+down_revision = '27131f0b4562'
+branch_labels = None
+depends_on = None
+
+compound_versions = sa.table(
+    "compound_versions",
+    sa.column("id", sa.Integer),
+    sa.column("compound_id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("smiles", sa.String),
+    sa.column("properties", sa.JSON),
+    sa.column("base_id", sa.Integer),
+    sa.column("delta", sa.JSON),
+)
+
+
+# Encoding as of this revision (versioning_service), copied so later
+# changes to the service or settings do not change what the migration writes
+CHECKPOINT_INTERVAL = 16
+
+
+def _escape_pointer(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape_pointer(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_json_patch(source, target, path=""):
+    """JSON patch (RFC 6902) turning source into target, diffing objects key by key"""
+    if isinstance(source, dict) and isinstance(target, dict):
+        patch = []
+        for key in source:
+            if key not in target:
+                patch.append({"op": "remove", "path": f"{path}/{_escape_pointer(key)}"})
+        for key, value in target.items():
+            child = f"{path}/{_escape_pointer(key)}"
+            if key not in source:
+                patch.append({"op": "add", "path": child, "value": value})
+            else:
+                patch.extend(make_json_patch(source[key], value, child))
+        return patch
+    if source == target and type(source) is type(target):
+        return []
+    return [{"op": "replace", "path": path, "value": target}]
+
+
+def apply_json_patch(document, patch):
+    """Apply a patch from make_json_patch to a copy of document"""
+    document = copy.deepcopy(document)
+    for operation in patch:
+        tokens = [_unescape_pointer(t) for t in operation["path"].split("/")[1:]]
+        if not tokens:
+            document = copy.deepcopy(operation["value"])
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[token]
+        if operation["op"] == "remove":
+            del parent[tokens[-1]]
+        else:
+            parent[tokens[-1]] = copy.deepcopy(operation["value"])
+    return document
+
+
+def encode_version_state(state, checkpoint_state, chain_length):
+    """A patch against the checkpoint, or None to write a new checkpoint"""
+    if checkpoint_state is None or chain_length >= CHECKPOINT_INTERVAL:
+        return None
+    delta = make_json_patch(checkpoint_state, state)
+    if len(json.dumps(delta, default=str)) >= len(json.dumps(state, default=str)):
+        return None
+    return delta
+
+
+def _full_states(rows):
+    """Reconstruct the full state of every row of one compound"""
+    states = {}
+    for row in rows:
+        if row.base_id is None:
+            states[row.id] = {"name": row.name, "smiles": row.smiles, "properties": row.properties}
+        else:
+            states[row.id] = apply_json_patch(states[row.base_id], row.delta or [])
+    return states
+
+
+def _compound_rows(bind, compound_id):
+    return bind.execute(
+        sa.select(compound_versions)
+        .where(compound_versions.c.compound_id == compound_id)
+        .order_by(compound_versions.c.id)
+    ).fetchall()
+
+
+def _compound_ids(bind):
+    return bind.execute(
+        sa.select(compound_versions.c.compound_id).distinct()
+    ).scalars().all()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "compound_versions" not in inspector.get_table_names():
+        return
+
+    columns = {c["name"] for c in inspector.get_columns("compound_versions")}
+    with op.batch_alter_table("compound_versions") as batch_op:
+        if "base_id" not in columns:
+            batch_op.add_column(sa.Column("base_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_compound_versions_base_id", "compound_versions", ["base_id"], ["id"]
+            )
+        if "delta" not in columns:
+            batch_op.add_column(sa.Column("delta", sa.JSON(), nullable=True))
+        batch_op.alter_column("name", existing_type=sa.String(), nullable=True)
+        batch_op.alter_column("smiles", existing_type=sa.String(), nullable=True)
+    indexes = {i["name"] for i in inspector.get_indexes("compound_versions")}
+    if "ix_compound_versions_compound_id_id" not in indexes:
+        op.create_index(
+            "ix_compound_versions_compound_id_id", "compound_versions", ["compound_id", "id"]
+        )
+
+    # Compact existing history into checkpoints plus deltas, one compound at a time
+    for compound_id in _compound_ids(bind):
+        rows = _compound_rows(bind, compound_id)
+        states = _full_states(rows)
+        checkpoint_id, checkpoint_state, chain_length = None, None, 0
+        for row in rows:
+            state = states[row.id]
+            delta = encode_version_state(state, checkpoint_state, chain_length)
+            if delta is None:
+                values = dict(state, base_id=None, delta=None)
+                checkpoint_id, checkpoint_state, chain_length = row.id, state, 0
+            else:
+                values = dict(name=None, smiles=None, properties=None, base_id=checkpoint_id, delta=delta)
+                chain_length += 1
+            bind.execute(
+                compound_versions.update()
+                .where(compound_versions.c.id == row.id)
+                .values(**values)
+            )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    # Expand every delta row back into a full snapshot
+    for compound_id in _compound_ids(bind):
+        rows = _compound_rows(bind, compound_id)
+        states = _full_states(rows)
+        for row in rows:
+            if row.base_id is None:
+                continue
+            bind.execute(
+                compound_versions.update()
+                .where(compound_versions.c.id == row.id)
+                .values(**states[row.id], base_id=None, delta=None)
+            )
+
+    op.drop_index("ix_compound_versions_compound_id_id", table_name="compound_versions")
+    with op.batch_alter_table("compound_versions") as batch_op:
+        batch_op.drop_constraint("fk_compound_versions_base_id", type_="foreignkey")
+        batch_op.drop_column("delta")
+        batch_op.drop_column("base_id")
+        batch_op.alter_column("name", existing_type=sa.String(), nullable=False)
+        batch_op.alter_column("smiles", existing_type=sa.String(), nullable=False)
@@ -0,0 +1,48 @@
+"""add prediction job id
+
+Revision ID: e2c6a8d4f913
+Revises: b84e0f6a2c19
+Create Date: 2026-10-19 19:12:27.406381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c6a8d4f913'
+down_revision = 'b84e0f6a2c19'
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_predictions_job_id_compound_id"
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "predictions" not in inspector.get_table_names():
+        return
+    if "job_id" not in {c["name"] for c in inspector.get_columns("predictions")}:
+        with op.batch_alter_table("predictions") as batch_op:
+            batch_op.add_column(sa.Column("job_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key("fk_predictions_job_id", "jobs", ["job_id"], ["id"])
+    # Existing rows have no job, so the unique index only constrains new
+    # batch predictions; built concurrently as the table may be large
+    if INDEX not in {i["name"] for i in inspector.get_indexes("predictions")}:
+        with op.get_context().autocommit_block():
+            op.create_index(INDEX, "predictions", ["job_id", "compound_id"], unique=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="predictions", postgresql_concurrently=True)
+    # Tables from create_all carry the dialect's default constraint names
+    foreign_keys = [
+        fk["name"] for fk in sa.inspect(bind).get_foreign_keys("predictions")
+        if fk["name"] and fk["referred_table"] == "jobs"
+    ]
+    with op.batch_alter_table("predictions") as batch_op:
+        for name in foreign_keys:
+            batch_op.drop_constraint(name, type_="foreignkey")
+        batch_op.drop_column("job_id")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1 import auth, compounds, predictions, experiments, reports
+from app.api.v1 import auth, compounds, predictions, experiments, reports, jobs, screening
 
 api_router = APIRouter()
 
@@ -8,3 +8,5 @@ api_router.include_router(compounds.router, prefix="/compounds", tags=["compound
 api_router.include_router(predictions.router, prefix="/predictions", tags=["predictions"])
 api_router.include_router(experiments.router, prefix="/experiments", tags=["experiments"])
 api_router.include_router(reports.router, prefix="/reports", tags=["reports"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(screening.router, prefix="/screening", tags=["screening"])
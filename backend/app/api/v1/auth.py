@@ -1,9 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token
+from typing import Optional
+from app.core.database import get_async_db
+from app.core.security import (
+    PasswordHashingBusy,
+    create_access_token,
+    get_password_hash_async,
+    verify_password_async,
+)
 from app.core.config import settings
 from app.core.dependencies import get_current_active_user
 from app.models.user import User, UserRole
@@ -12,11 +19,27 @@ from app.schemas.user import UserCreate, UserResponse, Token
 router = APIRouter()
 
 
+def _too_many_requests() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many concurrent authentication requests",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).filter(User.email == email))
+    user = result.scalars().first()
+    # Hand the connection back to the pool before the slow bcrypt step
+    await db.close()
+    return user
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user_data.email).first()
+    db_user = await _get_user_by_email(db, user_data.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -24,7 +47,10 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await get_password_hash_async(user_data.password)
+    except PasswordHashingBusy:
+        raise _too_many_requests()
     db_user = User(
         email=user_data.email,
         hashed_password=hashed_password,
@@ -32,19 +58,25 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         role=user_data.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Login and get access token"""
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await _get_user_by_email(db, form_data.username)
+    try:
+        password_valid = user is not None and await verify_password_async(
+            form_data.password, user.hashed_password
+        )
+    except PasswordHashingBusy:
+        raise _too_many_requests()
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
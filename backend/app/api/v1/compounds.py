@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.core.database import get_db
+from datetime import datetime
+from app.core.database import get_async_db
 from app.core.dependencies import get_current_active_user
+from app.core.http_cache import etag_matches, make_etag, not_modified, set_etag
 from app.models.user import User
 from app.models.compound import Compound
 from app.schemas.compound import (
@@ -12,202 +16,359 @@ from app.schemas.compound import (
     CompoundResponse,
     CompoundSearch,
     CompoundVersionResponse,
+    ChemblBulkImportRequest,
 )
+from app.schemas.job import JobResponse
 from app.services.versioning_service import (
     create_compound_version,
     get_compound_versions,
+    get_compounds_as_of,
     rollback_compound,
 )
-from app.services.chembl_service import search_chembl_compound, get_chembl_compound_by_id
+from app.services.compound_cache import compound_details, compound_lists, compound_version_pages
+from app.services.chembl_service import (
+    ChemblUnavailableError,
+    get_chembl_compound_by_id,
+    search_chembl_compound,
+)
+from app.services.chembl_import_service import (
+    create_chembl_import_job,
+    normalize_chembl_ids,
+)
 from app.services.ml_service import validate_smiles, calculate_molecular_properties
 
 router = APIRouter()
 
+# Columns a list response can be projected to with fields=
+COMPOUND_LIST_FIELDS = tuple(CompoundResponse.model_fields)
+
+
+def _compound_etag(compound_id: int, version: int) -> str:
+    return make_etag("compound", compound_id, version)
+
+
+async def _list_etag(db: AsyncSession, conditions: list, *params) -> str:
+    """
+    ETag for a filtered compound listing: row count, latest change time
+    and version sum of the matching rows (the sum catches updates landing
+    within the timestamp resolution), plus the request parameters.
+    """
+    count, last_changed, version_sum = (await db.execute(
+        select(
+            func.count(Compound.id),
+            func.max(func.coalesce(Compound.updated_at, Compound.created_at)),
+            func.sum(Compound.version),
+        ).filter(*conditions)
+    )).one()
+    return make_etag("compounds", count, last_changed, version_sum, *params)
+
+
+async def _load_compound(db: AsyncSession, compound_id: int) -> Optional[dict]:
+    compound = await db.get(Compound, compound_id)
+    if compound is None:
+        return None
+    return CompoundResponse.model_validate(compound).model_dump(mode="json")
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Columns requested with fields=, defaulting to the full CompoundResponse"""
+    if fields is None:
+        return list(COMPOUND_LIST_FIELDS)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in COMPOUND_LIST_FIELDS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields requested"
+        )
+    return names
+
+
+async def _fetch_list_rows(db: AsyncSession, conditions: list, columns: List[str], skip: int, limit: int) -> List[dict]:
+    result = await db.execute(
+        select(*(Compound.__table__.c[name] for name in columns)).filter(*conditions).order_by(
+            Compound.created_at.desc()
+        ).offset(skip).limit(limit)
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def _load_list_page(db: AsyncSession, conditions: list, columns: List[str], skip: int, limit: int, *params) -> dict:
+    etag = await _list_etag(db, conditions, *params)
+    return {"etag": etag, "items": await _fetch_list_rows(db, conditions, columns, skip, limit)}
+
+
+async def _load_version_page(db: AsyncSession, compound_id: int, skip: int, limit: int) -> list:
+    versions = await db.run_sync(get_compound_versions, compound_id, skip, limit)
+    return [CompoundVersionResponse.model_validate(v).model_dump(mode="json") for v in versions]
+
 
 @router.post("/", response_model=CompoundResponse, status_code=status.HTTP_201_CREATED)
-def create_compound(
+async def create_compound(
     compound: CompoundCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new compound"""
     # Validate SMILES
-    if not validate_smiles(compound.smiles):
+    if not await run_in_threadpool(validate_smiles, compound.smiles):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid SMILES string"
         )
-    
+
     # Calculate properties if not provided
     if not compound.properties:
-        compound.properties = calculate_molecular_properties(compound.smiles)
+        compound.properties = await run_in_threadpool(calculate_molecular_properties, compound.smiles)
         if compound.properties:
             compound.molecular_weight = compound.properties.get("molecular_weight")
-    
+
     # Check for duplicates by SMILES
-    existing = db.query(Compound).filter(Compound.smiles == compound.smiles).first()
+    existing = await db.scalar(select(Compound.id).filter(Compound.smiles == compound.smiles))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Compound with this SMILES already exists"
         )
-    
+    if compound.external_id is not None:
+        existing = await db.scalar(select(Compound.id).filter(
+            Compound.external_source == compound.external_source,
+            Compound.external_id == compound.external_id
+        ))
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Compound with this external ID already exists"
+            )
+
     db_compound = Compound(
         **compound.dict(),
         created_by=current_user.id
     )
+    # The initial "create" version is written in the same flush
     db.add(db_compound)
-    db.commit()
-    db.refresh(db_compound)
-    
-    # Create initial version
-    create_compound_version(db, db_compound, current_user.id, "create")
-    
+    await db.commit()
+    await db.refresh(db_compound)
+
     return db_compound
 
 
 @router.get("/", response_model=List[CompoundResponse])
-def list_compounds(
+async def list_compounds(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = None,
     min_mw: Optional[float] = None,
     max_mw: Optional[float] = None,
-    db: Session = Depends(get_db),
+    as_of: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. id,name,smiles"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """List compounds with optional filtering"""
-    query = db.query(Compound)
-    
+    """
+    List compounds with optional filtering, or the library as it was at as_of.
+    Rows are read as plain column tuples (no ORM objects) and rendered with
+    orjson; fields= limits both the selected columns and the payload.
+    """
+    columns = _parse_fields(fields)
+    conditions = []
+
+    if as_of is not None:
+        if search or min_mw is not None or max_mw is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Filters cannot be combined with as_of"
+            )
+        conditions.append(Compound.created_at <= as_of)
+
     if search:
-        query = query.filter(
+        conditions.append(
             or_(
                 Compound.name.ilike(f"%{search}%"),
                 Compound.smiles.ilike(f"%{search}%"),
                 Compound.molecular_formula.ilike(f"%{search}%")
             )
         )
-    
+
     if min_mw is not None:
-        query = query.filter(Compound.molecular_weight >= min_mw)
-    
+        conditions.append(Compound.molecular_weight >= min_mw)
+
     if max_mw is not None:
-        query = query.filter(Compound.molecular_weight <= max_mw)
-    
-    compounds = query.order_by(Compound.created_at.desc()).offset(skip).limit(limit).all()
-    return compounds
+        conditions.append(Compound.molecular_weight <= max_mw)
+
+    params = (skip, limit, search, min_mw, max_mw, as_of, ",".join(columns))
+
+    if not search and as_of is None:
+        # Plain and molecular-weight-filtered pages are served from the cache
+        page = await compound_lists.get_or_load(
+            f"{skip}:{limit}:{min_mw}:{max_mw}:{params[-1]}",
+            lambda: _load_list_page(db, conditions, columns, skip, limit, *params)
+        )
+        etag, items = page["etag"], page["items"]
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    else:
+        # Free-text searches and snapshots vary too much to be worth caching
+        etag = await _list_etag(db, conditions, *params)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        if as_of is not None:
+            result = await db.execute(
+                select(Compound).filter(*conditions).order_by(
+                    Compound.created_at.desc(), Compound.id.desc()
+                ).offset(skip).limit(limit)
+            )
+            snapshots = await db.run_sync(get_compounds_as_of, result.scalars().all(), as_of)
+            items = [{name: snapshot[name] for name in columns} for snapshot in snapshots]
+        else:
+            items = await _fetch_list_rows(db, conditions, columns, skip, limit)
+
+    response = ORJSONResponse(items)
+    set_etag(response, etag)
+    return response
 
 
 @router.get("/{compound_id}", response_model=CompoundResponse)
-def get_compound(
+async def get_compound(
     compound_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get a compound by ID"""
-    compound = db.query(Compound).filter(Compound.id == compound_id).first()
+    compound = await compound_details.get(compound_id)
+    if compound is None:
+        if request.headers.get("if-none-match"):
+            # Revalidate against the version column before loading the full row
+            version = await db.scalar(select(Compound.version).filter(Compound.id == compound_id))
+            if version is not None and etag_matches(request, _compound_etag(compound_id, version)):
+                return not_modified(_compound_etag(compound_id, version))
+        compound = await compound_details.get_or_load(compound_id, lambda: _load_compound(db, compound_id))
+
     if not compound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found"
         )
+    etag = _compound_etag(compound_id, compound["version"])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return compound
 
 
 @router.put("/{compound_id}", response_model=CompoundResponse)
-def update_compound(
+async def update_compound(
     compound_id: int,
     compound_update: CompoundUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Update a compound"""
-    compound = db.query(Compound).filter(Compound.id == compound_id).first()
+    compound = await db.get(Compound, compound_id)
     if not compound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found"
         )
-    
+
     # Create version before update
-    create_compound_version(db, compound, current_user.id, "update")
-    
+    await db.run_sync(create_compound_version, compound, current_user.id, "update")
+
     # Update fields
     update_data = compound_update.dict(exclude_unset=True)
     if "smiles" in update_data:
-        if not validate_smiles(update_data["smiles"]):
+        if not await run_in_threadpool(validate_smiles, update_data["smiles"]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid SMILES string"
             )
         # Recalculate properties if SMILES changed
-        new_properties = calculate_molecular_properties(update_data["smiles"])
+        new_properties = await run_in_threadpool(calculate_molecular_properties, update_data["smiles"])
         if new_properties:
             update_data["properties"] = new_properties
             update_data["molecular_weight"] = new_properties.get("molecular_weight")
-    
+
     for field, value in update_data.items():
         setattr(compound, field, value)
-    
+
     compound.version += 1
-    db.commit()
-    db.refresh(compound)
-    
+    await db.commit()
+    await db.refresh(compound)
+
     return compound
 
 
 @router.delete("/{compound_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_compound(
+async def delete_compound(
     compound_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Delete a compound"""
-    compound = db.query(Compound).filter(Compound.id == compound_id).first()
+    compound = await db.get(Compound, compound_id)
     if not compound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found"
         )
-    
+
     # Create version for deletion
-    create_compound_version(db, compound, current_user.id, "delete")
-    
-    db.delete(compound)
-    db.commit()
+    await db.run_sync(create_compound_version, compound, current_user.id, "delete")
+
+    await db.delete(compound)
+    await db.commit()
     return None
 
 
 @router.get("/{compound_id}/versions", response_model=List[CompoundVersionResponse])
-def get_compound_version_history(
+async def get_compound_version_history(
     compound_id: int,
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get version history for a compound"""
-    compound = db.query(Compound).filter(Compound.id == compound_id).first()
-    if not compound:
+    cached = await compound_details.get(compound_id)
+    if cached is not None:
+        version = cached["version"]
+    else:
+        version = await db.scalar(select(Compound.version).filter(Compound.id == compound_id))
+    if version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found"
         )
-    
-    versions = get_compound_versions(db, compound_id, skip, limit)
-    return versions
+
+    # Every change that adds a version row also bumps Compound.version
+    etag = make_etag("compound-versions", compound_id, version, skip, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    return await compound_version_pages.get_or_load(
+        f"{compound_id}:{version}:{skip}:{limit}",
+        lambda: _load_version_page(db, compound_id, skip, limit)
+    )
 
 
 @router.post("/{compound_id}/rollback/{version}", response_model=CompoundResponse)
-def rollback_compound_version(
+async def rollback_compound_version(
     compound_id: int,
     version: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Rollback a compound to a previous version"""
     try:
-        compound = rollback_compound(db, compound_id, version, current_user.id)
+        compound = await db.run_sync(rollback_compound, compound_id, version, current_user.id)
+        await db.commit()
+        await db.refresh(compound)
         return compound
     except ValueError as e:
         raise HTTPException(
@@ -216,28 +377,60 @@ def rollback_compound_version(
         )
 
 
+@router.post("/import/chembl/bulk", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def bulk_import_chembl_compounds(
+    request: ChemblBulkImportRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Import many compounds from ChEMBL in the background. Poll the returned
+    job at /jobs/{id} for progress.
+    """
+    chembl_ids = normalize_chembl_ids(request.chembl_ids)
+    if not chembl_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No ChEMBL IDs given"
+        )
+    job = await create_chembl_import_job(db, chembl_ids, current_user.id)
+    # Runs on a Celery worker, so it survives API restarts (the task module
+    # pulls in celery, so it is imported on first use)
+    from app.tasks.import_tasks import queue_chembl_import
+    background_tasks.add_task(queue_chembl_import, job.id)
+    return job
+
+
 @router.post("/import/chembl/{chembl_id}", response_model=CompoundResponse)
 async def import_chembl_compound(
     chembl_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Import a compound from ChEMBL"""
-    chembl_data = await get_chembl_compound_by_id(chembl_id)
+    try:
+        chembl_data = await get_chembl_compound_by_id(chembl_id)
+    except ChemblUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     if not chembl_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found in ChEMBL"
         )
-    
+
     # Check if already exists
-    existing = db.query(Compound).filter(
+    result = await db.execute(select(Compound).filter(
         Compound.external_id == chembl_id,
         Compound.external_source == "chembl"
-    ).first()
+    ))
+    existing = result.scalars().first()
     if existing:
         return existing
-    
+
     # Create compound
     compound = Compound(
         name=chembl_data["name"],
@@ -247,17 +440,15 @@ async def import_chembl_compound(
         properties=chembl_data.get("properties", {}),
         created_by=current_user.id
     )
-    
+
     if compound.smiles:
-        props = calculate_molecular_properties(compound.smiles)
+        props = await run_in_threadpool(calculate_molecular_properties, compound.smiles)
         if props:
             compound.properties = {**(compound.properties or {}), **props}
             compound.molecular_weight = props.get("molecular_weight")
-    
+
     db.add(compound)
-    db.commit()
-    db.refresh(compound)
-    
-    create_compound_version(db, compound, current_user.id, "create")
-    
+    await db.commit()
+    await db.refresh(compound)
+
     return compound
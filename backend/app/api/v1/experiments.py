@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import datetime
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
 from app.models.experiment import Experiment
@@ -17,9 +20,9 @@ router = APIRouter()
 
 
 @router.post("/", response_model=ExperimentResponse, status_code=status.HTTP_201_CREATED)
-def create_experiment(
+async def create_experiment(
     experiment: ExperimentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new experiment"""
@@ -29,41 +32,41 @@ def create_experiment(
         status="running"
     )
     db.add(db_experiment)
-    db.commit()
-    db.refresh(db_experiment)
+    await db.commit()
+    await db.refresh(db_experiment)
     
     return db_experiment
 
 
-@router.get("/", response_model=List[ExperimentResponse])
-def list_experiments(
+@router.get("/", response_model=List[ExperimentResponse], response_class=ORJSONResponse)
+async def list_experiments(
     skip: int = 0,
     limit: int = 100,
     model_type: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """List experiments"""
-    query = db.query(Experiment).filter(Experiment.user_id == current_user.id)
+    query = select(Experiment).filter(Experiment.user_id == current_user.id)
     
     if model_type:
         query = query.filter(Experiment.model_type == model_type)
     
-    experiments = query.order_by(Experiment.created_at.desc()).offset(skip).limit(limit).all()
-    return experiments
+    result = await db.execute(query.order_by(Experiment.created_at.desc()).offset(skip).limit(limit))
+    return result.scalars().all()
 
 
 @router.get("/{experiment_id}", response_model=ExperimentResponse)
-def get_experiment(
+async def get_experiment(
     experiment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get an experiment by ID"""
-    experiment = db.query(Experiment).filter(
+    experiment = await db.scalar(select(Experiment).filter(
         Experiment.id == experiment_id,
         Experiment.user_id == current_user.id
-    ).first()
+    ))
     if not experiment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -73,17 +76,17 @@ def get_experiment(
 
 
 @router.put("/{experiment_id}", response_model=ExperimentResponse)
-def update_experiment(
+async def update_experiment(
     experiment_id: int,
     experiment_update: ExperimentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Update an experiment"""
-    experiment = db.query(Experiment).filter(
+    experiment = await db.scalar(select(Experiment).filter(
         Experiment.id == experiment_id,
         Experiment.user_id == current_user.id
-    ).first()
+    ))
     if not experiment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -97,22 +100,22 @@ def update_experiment(
     if experiment_update.status == "completed":
         experiment.completed_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(experiment)
+    await db.commit()
+    await db.refresh(experiment)
     return experiment
 
 
 @router.post("/{experiment_id}/log-to-mlflow", response_model=ExperimentResponse)
-def log_experiment_to_mlflow(
+async def log_experiment_to_mlflow(
     experiment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Log experiment to MLflow"""
-    experiment = db.query(Experiment).filter(
+    experiment = await db.scalar(select(Experiment).filter(
         Experiment.id == experiment_id,
         Experiment.user_id == current_user.id
-    ).first()
+    ))
     if not experiment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -124,9 +127,10 @@ def log_experiment_to_mlflow(
     
     # Get predictions for this experiment
     from app.models.experiment import Prediction
-    predictions = db.query(Prediction).filter(
+    result = await db.execute(select(Prediction).filter(
         Prediction.experiment_id == experiment_id
-    ).all()
+    ))
+    predictions = result.scalars().all()
     
     # Prepare data for MLflow
     predictions_data = [{
@@ -136,7 +140,8 @@ def log_experiment_to_mlflow(
     } for p in predictions]
     
     # Log to MLflow
-    run_id = log_prediction_to_mlflow(
+    run_id = await run_in_threadpool(
+        log_prediction_to_mlflow,
         run_name=experiment.name,
         model_type=experiment.model_type,
         parameters=experiment.parameters or {},
@@ -145,7 +150,7 @@ def log_experiment_to_mlflow(
     )
     
     experiment.mlflow_run_id = run_id
-    db.commit()
-    db.refresh(experiment)
+    await db.commit()
+    await db.refresh(experiment)
     
     return experiment
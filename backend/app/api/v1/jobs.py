@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.dependencies import get_current_active_user
+from app.models.user import User
+from app.models.job import Job
+from app.schemas.job import JobResponse
+from app.services.chembl_import_service import JOB_TYPE as CHEMBL_IMPORT_JOB_TYPE
+from app.services.prediction_service import BATCH_JOB_TYPE
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[JobResponse])
+async def list_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """List the current user's jobs, newest first"""
+    result = await db.execute(
+        select(Job).filter(Job.user_id == current_user.id)
+        .order_by(Job.id.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get a job and its progress"""
+    job = await db.scalar(select(Job).filter(
+        Job.id == job_id,
+        Job.user_id == current_user.id
+    ))
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.post("/{job_id}/resume", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def resume_job(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Continue an unfinished batch prediction or ChEMBL import job from its
+    last checkpoint, after it failed or made no progress for
+    JOB_STALE_SECONDS (e.g. its worker went away). A job that is still
+    running is not resumed, as a second run would overlap it. Batch
+    prediction jobs are queued again when the user is within their batch
+    job quota.
+    """
+    job = await db.scalar(select(Job).filter(
+        Job.id == job_id,
+        Job.user_id == current_user.id
+    ))
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    if job.job_type not in (BATCH_JOB_TYPE, CHEMBL_IMPORT_JOB_TYPE):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only batch prediction and ChEMBL import jobs can be resumed"
+        )
+    if job.status == "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Job already completed"
+        )
+
+    # Conditional, so concurrent resumes (or progress made since the read)
+    # cannot start a second run
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    resumed = await db.execute(
+        update(Job).where(
+            Job.id == job.id,
+            or_(
+                Job.status == "failed",
+                and_(
+                    Job.status.in_(("pending", "queued", "running")),
+                    func.coalesce(Job.updated_at, Job.created_at) < stale_before
+                )
+            )
+        ).values(status="pending", error=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if resumed.rowcount == 0:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Job is still running"
+        )
+    await db.refresh(job)
+    if job.job_type == BATCH_JOB_TYPE:
+        from app.tasks.prediction_tasks import dispatch_batch_jobs
+        background_tasks.add_task(dispatch_batch_jobs, current_user.id)
+    else:
+        from app.tasks.import_tasks import queue_chembl_import
+        background_tasks.add_task(queue_chembl_import, job.id)
+    return job
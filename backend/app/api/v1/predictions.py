@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.core.database import get_async_db
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
 from app.models.compound import Compound
-from app.models.experiment import Prediction
+from app.models.experiment import Experiment, Prediction
 from app.schemas.prediction import (
     PredictionCreate,
     PredictionResponse,
+    LatestPredictionResponse,
+    TopCompoundResponse,
     BatchPredictionRequest,
     PredictionResult,
 )
@@ -18,33 +23,58 @@ from app.services.ml_service import (
     predict_drug_target_interaction,
     validate_smiles,
 )
-from app.tasks.prediction_tasks import run_batch_prediction_task
+from app.services.experiment_stats_service import record_experiment_predictions
+from app.services.prediction_service import (
+    WITH_DETAILS,
+    create_batch_prediction_job,
+    decode_latest_cursor,
+    encode_latest_cursor,
+    latest_predictions_query,
+    parse_descriptor_range,
+    parse_objective,
+    record_latest_predictions,
+    top_compounds,
+    user_predictions_query,
+)
 
 router = APIRouter()
 
 
 @router.post("/", response_model=PredictionResponse, status_code=status.HTTP_201_CREATED)
-def create_prediction(
+async def create_prediction(
     prediction: PredictionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a single prediction"""
     # Verify compound exists
-    compound = db.query(Compound).filter(Compound.id == prediction.compound_id).first()
+    compound = await db.get(Compound, prediction.compound_id)
     if not compound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found"
         )
-    
+
+    if prediction.experiment_id:
+        experiment = await db.scalar(select(Experiment.id).filter(
+            Experiment.id == prediction.experiment_id,
+            Experiment.user_id == current_user.id
+        ))
+        if not experiment:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Experiment not found"
+            )
+
     # Run prediction based on model type
     if prediction.model_type == "solubility":
-        result = predict_solubility(compound.smiles, prediction.model_name)
+        result = await run_in_threadpool(predict_solubility, compound.smiles, prediction.model_name)
     elif prediction.model_type == "toxicity":
-        result = predict_toxicity(compound.smiles, prediction.model_name)
+        result = await run_in_threadpool(predict_toxicity, compound.smiles, prediction.model_name)
     elif prediction.model_type == "dti":
-        result = predict_drug_target_interaction(compound.smiles, model_name=prediction.model_name)
+        result = await run_in_threadpool(
+            predict_drug_target_interaction, compound.smiles, model_name=prediction.model_name
+        )
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -69,78 +99,153 @@ def create_prediction(
         prediction_details=result.get("prediction_details", {})
     )
     db.add(db_prediction)
-    db.commit()
-    db.refresh(db_prediction)
+    await db.run_sync(record_latest_predictions, [db_prediction])
+    if prediction.experiment_id:
+        await db.run_sync(
+            record_experiment_predictions, prediction.experiment_id, [db_prediction.prediction_value]
+        )
+    await db.commit()
+    await db.refresh(db_prediction)
     
     return db_prediction
 
 
 @router.post("/batch", status_code=status.HTTP_202_ACCEPTED)
-def create_batch_prediction(
+async def create_batch_prediction(
     request: BatchPredictionRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create batch predictions (async)"""
     # Verify all compounds exist
-    compounds = db.query(Compound).filter(Compound.id.in_(request.compound_ids)).all()
-    if len(compounds) != len(request.compound_ids):
+    result = await db.execute(select(Compound.id).filter(Compound.id.in_(request.compound_ids)))
+    if len(result.scalars().all()) != len(set(request.compound_ids)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Some compounds not found"
         )
     
-    # Queue background task
-    task_id = f"batch_pred_{current_user.id}_{len(request.compound_ids)}"
-    background_tasks.add_task(
-        run_batch_prediction_task,
-        compound_ids=request.compound_ids,
-        model_type=request.model_type,
+    if request.experiment_id:
+        experiment = await db.scalar(select(Experiment.id).filter(
+            Experiment.id == request.experiment_id,
+            Experiment.user_id == current_user.id
+        ))
+        if not experiment:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Experiment not found"
+            )
+    
+    job = await create_batch_prediction_job(
+        db,
+        request.compound_ids,
+        request.model_type,
+        current_user.id,
         model_name=request.model_name,
-        user_id=current_user.id
+        experiment_id=request.experiment_id
     )
+
+    # Queue the job, subject to the user's quota (the task module pulls in
+    # celery, so it is imported on first use)
+    from app.tasks.prediction_tasks import dispatch_batch_jobs
+    task_id = f"batch_pred_{current_user.id}_{len(request.compound_ids)}"
+    background_tasks.add_task(dispatch_batch_jobs, current_user.id)
     
     return {
         "message": "Batch prediction task queued",
         "task_id": task_id,
+        "job_id": job.id,
         "compound_count": len(request.compound_ids)
     }
 
 
-@router.get("/", response_model=List[PredictionResponse])
-def list_predictions(
+@router.get("/", response_model=List[PredictionResponse], response_class=ORJSONResponse)
+async def list_predictions(
     skip: int = 0,
     limit: int = 100,
     model_type: str = None,
     compound_id: int = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """List predictions"""
-    query = db.query(Prediction).filter(Prediction.user_id == current_user.id)
-    
-    if model_type:
-        query = query.filter(Prediction.model_type == model_type)
-    
-    if compound_id:
-        query = query.filter(Prediction.compound_id == compound_id)
-    
-    predictions = query.order_by(Prediction.created_at.desc()).offset(skip).limit(limit).all()
-    return predictions
+    query = user_predictions_query(current_user.id, model_type=model_type, compound_id=compound_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+@router.get("/latest", response_model=List[LatestPredictionResponse], response_class=ORJSONResponse)
+async def list_latest_predictions(
+    response: Response,
+    model_type: Optional[str] = None,
+    model_name: Optional[str] = None,
+    compound_id: Optional[List[int]] = Query(None),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Current prediction per compound and model. Pages in keyset order; pass
+    the X-Next-Cursor header of a page as cursor to get the next one.
+    """
+    try:
+        after = decode_latest_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    query = latest_predictions_query(
+        current_user.id, model_type=model_type, model_name=model_name, compound_ids=compound_id, after=after
+    )
+    rows = (await db.scalars(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_latest_cursor(rows[-1])
+    return rows
+
+
+@router.get("/top", response_model=List[TopCompoundResponse], response_class=ORJSONResponse)
+async def list_top_compounds(
+    objective: List[str] = Query(...),
+    experiment_id: Optional[int] = None,
+    descriptor: Optional[List[str]] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Compounds ranked by their latest predictions.
+
+    objective is "model_type[/model_name][:weight]" and may be repeated;
+    compounds are scored by the weighted sum of their values, and need a
+    prediction for every objective. Negative weights prefer low values,
+    e.g. objective=solubility&objective=toxicity:-1 for soluble, non-toxic
+    compounds. descriptor is "name:min:max" (either bound may be empty),
+    e.g. descriptor=molecular_weight::500.
+    """
+    try:
+        objectives = [parse_objective(spec) for spec in objective]
+        ranges = [parse_descriptor_range(spec) for spec in descriptor or []]
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if len(objectives) > 10:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At most 10 objectives")
+    return await top_compounds(
+        db, current_user.id, objectives, experiment_id=experiment_id, descriptor_ranges=ranges, limit=limit
+    )
 
 
 @router.get("/{prediction_id}", response_model=PredictionResponse)
-def get_prediction(
+async def get_prediction(
     prediction_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get a prediction by ID"""
-    prediction = db.query(Prediction).filter(
+    prediction = await db.scalar(select(Prediction).options(*WITH_DETAILS).filter(
         Prediction.id == prediction_id,
         Prediction.user_id == current_user.id
-    ).first()
+    ))
     if not prediction:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -149,23 +254,20 @@ def get_prediction(
     return prediction
 
 
-@router.get("/compound/{compound_id}", response_model=List[PredictionResponse])
-def get_compound_predictions(
+@router.get("/compound/{compound_id}", response_model=List[PredictionResponse], response_class=ORJSONResponse)
+async def get_compound_predictions(
     compound_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all predictions for a compound"""
-    compound = db.query(Compound).filter(Compound.id == compound_id).first()
+    compound = await db.scalar(select(Compound.id).filter(Compound.id == compound_id))
     if not compound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Compound not found"
         )
     
-    predictions = db.query(Prediction).filter(
-        Prediction.compound_id == compound_id,
-        Prediction.user_id == current_user.id
-    ).order_by(Prediction.created_at.desc()).all()
+    result = await db.execute(user_predictions_query(current_user.id, compound_id=compound_id))
     
-    return predictions
+    return result.scalars().all()
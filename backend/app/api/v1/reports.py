@@ -1,36 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
-from io import BytesIO
+from io import BytesIO, StringIO
 import csv
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.dependencies import get_current_active_user
+from app.core.query_stats import query_budget
 from app.models.user import User
 from app.models.compound import Compound
 from app.models.experiment import Prediction
 from app.models.experiment import Experiment
+from app.services.prediction_service import NEWEST_FIRST, experiment_predictions_query
+from app.services.versioning_service import get_compounds_as_of
 
 router = APIRouter()
 
+# Compounds reconstructed per query when exporting a historical snapshot
+AS_OF_CHUNK_SIZE = 1000
+
+
+async def _iter_compounds_as_of(db: AsyncSession, query, as_of: datetime):
+    """Yield compound snapshots as of a timestamp, one id range at a time"""
+    query = query.filter(Compound.created_at <= as_of).order_by(Compound.id)
+    last_id = 0
+    while True:
+        result = await db.execute(query.filter(Compound.id > last_id).limit(AS_OF_CHUNK_SIZE))
+        chunk = result.scalars().all()
+        if not chunk:
+            return
+        for snapshot in await db.run_sync(get_compounds_as_of, chunk, as_of):
+            yield snapshot
+        last_id = chunk[-1].id
+
 
 @router.get("/compounds/csv")
-def export_compounds_csv(
-    compound_ids: Optional[List[int]] = None,
-    db: Session = Depends(get_db),
+async def export_compounds_csv(
+    compound_ids: Optional[List[int]] = Query(None),
+    as_of: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Export compounds to CSV"""
+    """Export compounds to CSV, optionally as the library was at as_of"""
+    query = select(Compound)
     if compound_ids:
-        compounds = db.query(Compound).filter(Compound.id.in_(compound_ids)).all()
+        query = query.filter(Compound.id.in_(compound_ids))
+    
+    if as_of is not None:
+        compounds = [c async for c in _iter_compounds_as_of(db, query, as_of)]
     else:
-        compounds = db.query(Compound).all()
+        result = await db.execute(query)
+        compounds = [
+            {column.name: getattr(c, column.name) for column in Compound.__table__.columns}
+            for c in result.scalars().all()
+        ]
     
-    output = BytesIO()
+    output = StringIO()
     writer = csv.writer(output)
     
     # Write header
@@ -42,14 +69,14 @@ def export_compounds_csv(
     # Write data
     for compound in compounds:
         writer.writerow([
-            compound.id,
-            compound.name,
-            compound.smiles,
-            compound.molecular_formula or "",
-            compound.molecular_weight or "",
-            compound.external_id or "",
-            compound.external_source or "",
-            compound.created_at.isoformat() if compound.created_at else ""
+            compound["id"],
+            compound["name"],
+            compound["smiles"],
+            compound["molecular_formula"] or "",
+            compound["molecular_weight"] or "",
+            compound["external_id"] or "",
+            compound["external_source"] or "",
+            compound["created_at"].isoformat() if compound["created_at"] else ""
         ])
     
     output.seek(0)
@@ -60,24 +87,26 @@ def export_compounds_csv(
     )
 
 
-@router.get("/predictions/csv")
-def export_predictions_csv(
+@router.get("/predictions/csv", dependencies=[Depends(query_budget(5))])
+async def export_predictions_csv(
     experiment_id: Optional[int] = None,
     compound_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Export predictions to CSV"""
-    query = db.query(Prediction).filter(Prediction.user_id == current_user.id)
+    query = select(Prediction, Compound.name).outerjoin(
+        Compound, Compound.id == Prediction.compound_id
+    ).filter(Prediction.user_id == current_user.id)
     
     if experiment_id:
         query = query.filter(Prediction.experiment_id == experiment_id)
     if compound_id:
         query = query.filter(Prediction.compound_id == compound_id)
     
-    predictions = query.all()
+    result = await db.execute(query.order_by(*NEWEST_FIRST))
     
-    output = BytesIO()
+    output = StringIO()
     writer = csv.writer(output)
     
     # Write header
@@ -87,12 +116,11 @@ def export_predictions_csv(
     ])
     
     # Write data
-    for pred in predictions:
-        compound = db.query(Compound).filter(Compound.id == pred.compound_id).first()
+    for pred, compound_name in result.all():
         writer.writerow([
             pred.id,
             pred.compound_id,
-            compound.name if compound else "",
+            compound_name or "",
             pred.model_type,
             pred.model_name or "",
             pred.prediction_value or "",
@@ -108,17 +136,23 @@ def export_predictions_csv(
     )
 
 
-@router.get("/experiment/{experiment_id}/pdf")
-def generate_experiment_pdf(
+@router.get("/experiment/{experiment_id}/pdf", dependencies=[Depends(query_budget(5))])
+async def generate_experiment_pdf(
     experiment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Generate PDF report for an experiment"""
-    experiment = db.query(Experiment).filter(
+    # reportlab is only needed here; importing it lazily keeps startup fast
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    experiment = await db.scalar(select(Experiment).filter(
         Experiment.id == experiment_id,
         Experiment.user_id == current_user.id
-    ).first()
+    ))
     if not experiment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -126,9 +160,8 @@ def generate_experiment_pdf(
         )
     
     # Get predictions
-    predictions = db.query(Prediction).filter(
-        Prediction.experiment_id == experiment_id
-    ).all()
+    result = await db.execute(experiment_predictions_query(experiment_id))
+    predictions = result.all()
     
     # Create PDF
     buffer = BytesIO()
@@ -172,11 +205,10 @@ def generate_experiment_pdf(
     story.append(Paragraph(f"Predictions ({len(predictions)})", styles['Heading2']))
     if predictions:
         pred_data = [["Compound ID", "Compound Name", "Value", "Confidence"]]
-        for pred in predictions[:50]:  # Limit to 50 for PDF
-            compound = db.query(Compound).filter(Compound.id == pred.compound_id).first()
+        for pred, compound_name in predictions[:50]:  # Limit to 50 for PDF
             pred_data.append([
                 str(pred.compound_id),
-                compound.name if compound else "N/A",
+                compound_name or "N/A",
                 f"{pred.prediction_value:.4f}" if pred.prediction_value else "N/A",
                 f"{pred.prediction_confidence:.2f}" if pred.prediction_confidence else "N/A"
             ])
@@ -196,7 +228,7 @@ def generate_experiment_pdf(
     else:
         story.append(Paragraph("No predictions found.", styles['Normal']))
     
-    doc.build(story)
+    await run_in_threadpool(doc.build, story)
     buffer.seek(0)
     
     return Response(
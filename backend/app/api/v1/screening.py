@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from app.core.dependencies import get_current_active_user
+from app.models.user import User
+from app.services.ml_service import MODEL_SCORERS
+from app.services.prediction_service import Objective, parse_objective
+from app.services.screening_service import screen_stream
+
+router = APIRouter()
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse for endpoints that read the request body while
+    responding. StreamingResponse also listens for client disconnects by
+    calling receive(), which swallows body messages the endpoint is still
+    waiting for; here a disconnect surfaces as a failed send instead, and
+    the body iterator is closed so it can release its work.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        finally:
+            await self.body_iterator.aclose()
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/")
+async def screen_smiles(
+    request: Request,
+    model: List[str] = Query(["solubility"]),
+    rule_of_five: bool = True,
+    max_ro5_violations: int = Query(1, ge=0, le=3),
+    include_descriptors: bool = False,
+    top_k: Optional[int] = Query(None, ge=1, le=10000),
+    objective: Optional[List[str]] = Query(None),
+    persist: bool = False,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Virtual screening of unsaved SMILES.
+
+    The request body is plain text, one "SMILES [id]" per line, and may be
+    streamed; the response is NDJSON, written while the upload is still
+    being scored. Molecules are parsed, optionally filtered by Lipinski's
+    rule of five (more than max_ro5_violations violations fails) and scored
+    by every requested model. Without top_k there is one line per input
+    molecule. With top_k only progress lines are sent until the end, then
+    the top_k molecules ranked by objective ("model_type[:weight]", may be
+    repeated; defaults to the single requested model). Nothing is stored
+    unless persist is set, which saves the top_k hits as compounds with
+    predictions. The last line is a summary.
+    """
+    unknown = [m for m in model if m not in MODEL_SCORERS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown model type: {', '.join(unknown)}"
+        )
+    model_types = list(dict.fromkeys(model))
+
+    objectives = None
+    if top_k:
+        try:
+            objectives = [parse_objective(spec) for spec in objective or []]
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if not objectives:
+            if len(model_types) > 1:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="objective is required to rank by more than one model"
+                )
+            objectives = [Objective(model_types[0], None, 1.0)]
+        if any(o.model_type not in model_types or o.model_name for o in objectives):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Objectives must name a requested model type, without a model name"
+            )
+    elif persist:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="persist requires top_k")
+
+    return UploadStreamingResponse(
+        screen_stream(
+            request.stream(),
+            current_user.id,
+            model_types,
+            max_violations=max_ro5_violations if rule_of_five else None,
+            include_descriptors=include_descriptors,
+            top_k=top_k,
+            objectives=objectives,
+            persist=persist,
+        ),
+        media_type="application/x-ndjson",
+    )
@@ -0,0 +1,140 @@
+import logging
+import threading
+from typing import Optional, Tuple
+import orjson
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache, get_redis, local_ttl, redis_write
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.models.user import User
+from app.schemas.user import UserPrincipal
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "auth:principal:"
+# Per-subject invalidation counter shared by every process. Cached
+# principals record the counter they were read under and are only used
+# while it is unchanged, so an invalidation reaches all workers at once.
+REDIS_GENERATION_PREFIX = "auth:generation:"
+
+# subject -> (principal, shared generation)
+_local_cache = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=local_ttl(settings.AUTH_CACHE_TTL_SECONDS),
+)
+
+# Bumped on every invalidation so a lookup that raced with one cannot
+# re-populate the cache with the state it read before the change
+_generations = {}
+_generations_lock = threading.Lock()
+
+# (in-process generation, shared generation or None without Redis)
+Generation = Tuple[int, Optional[int]]
+
+
+async def get_cached_principal(subject: str) -> Tuple[Optional[UserPrincipal], Optional[Generation]]:
+    """
+    Look up a principal in the in-process tier, then in Redis. Returns the
+    principal, or None, and the generation to pass to cache_principal()
+    after loading it (None when it must not be cached).
+    """
+    local_generation = _generations.get(subject, 0)
+    entry = _local_cache.get(subject)
+    redis = get_redis()
+    if redis is None:
+        if entry is not None:
+            CACHE_REQUESTS.labels(cache="auth", result="local_hit").inc()
+            return entry[0], (local_generation, None)
+        CACHE_REQUESTS.labels(cache="auth", result="miss").inc()
+        return None, (local_generation, None)
+
+    # Every lookup checks the shared generation, in the same round trip
+    # that fetches the shared entry
+    try:
+        generation, data = await redis.mget(REDIS_GENERATION_PREFIX + subject, REDIS_KEY_PREFIX + subject)
+    except Exception as e:
+        logger.warning("Auth cache lookup in Redis failed: %s", e)
+        CACHE_REQUESTS.labels(cache="auth", result="error").inc()
+        return None, None
+    generation = int(generation or 0)
+    if entry is not None and entry[1] == generation:
+        CACHE_REQUESTS.labels(cache="auth", result="local_hit").inc()
+        return entry[0], (local_generation, generation)
+    if data is not None:
+        cached = orjson.loads(data)
+        if cached["generation"] == generation:
+            CACHE_REQUESTS.labels(cache="auth", result="redis_hit").inc()
+            principal = UserPrincipal.model_validate(cached["principal"])
+            _local_cache.set(subject, (principal, generation))
+            return principal, (local_generation, generation)
+    CACHE_REQUESTS.labels(cache="auth", result="miss").inc()
+    return None, (local_generation, generation)
+
+
+async def cache_principal(principal: UserPrincipal, generation: Optional[Generation]) -> None:
+    """Store a principal unless its subject was invalidated since generation"""
+    if settings.AUTH_CACHE_TTL_SECONDS <= 0 or generation is None:
+        return
+    local_generation, shared_generation = generation
+    if _generations.get(principal.email, 0) != local_generation:
+        return
+    _local_cache.set(principal.email, (principal, shared_generation))
+    redis = get_redis()
+    if redis is None or shared_generation is None:
+        return
+    try:
+        # An invalidation in another process since the lookup has bumped
+        # the shared generation, so readers will ignore this entry
+        await redis.set(
+            REDIS_KEY_PREFIX + principal.email,
+            orjson.dumps({"generation": shared_generation, "principal": principal.model_dump(mode="json")}),
+            ex=settings.AUTH_CACHE_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.warning("Auth cache write to Redis failed: %s", e)
+
+
+def invalidate_principal(subject: str) -> None:
+    """Drop a cached principal from every tier, in every process"""
+    with _generations_lock:
+        _generations[subject] = _generations.get(subject, 0) + 1
+    _local_cache.delete(subject)
+    redis_write(
+        lambda redis: redis.pipeline()
+        .incr(REDIS_GENERATION_PREFIX + subject)
+        .delete(REDIS_KEY_PREFIX + subject)
+        .execute(),
+        "Auth cache invalidation",
+    )
+
+
+def _pending_subjects(session: Session) -> set:
+    return session.info.setdefault("auth_cache_invalidations", set())
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    """Remember users whose cached principal must go once the change commits"""
+    session = Session.object_session(target)
+    if session is None:
+        return
+    changed = {email for email in inspect(target).attrs.email.history.deleted if email}
+    changed.add(target.email)
+    _pending_subjects(session).update(changed)
+    # Invalidate at flush time as well; the commit hook then drops anything
+    # re-cached from the pre-commit state in between
+    for subject in changed:
+        invalidate_principal(subject)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for subject in session.info.pop("auth_cache_invalidations", ()):
+        invalidate_principal(subject)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_users(session, previous_transaction):
+    session.info.pop("auth_cache_invalidations", None)
@@ -0,0 +1,393 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+import orjson
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Async clients are bound to the event loop that opened their connections,
+# so there is one per loop; code outside an event loop (Celery tasks,
+# scripts) uses the sync client
+_redis_clients = weakref.WeakKeyDictionary()
+_sync_redis_client = None
+
+# Redis writes scheduled from synchronous code on an event loop thread;
+# referenced until done so they are not garbage collected mid-flight
+_background_writes = set()
+
+
+def _connect(async_client: bool):
+    if async_client:
+        import redis.asyncio as redis
+    else:
+        import redis
+    return redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_timeout=0.5,
+        socket_connect_timeout=0.5,
+    )
+
+
+def get_redis():
+    """
+    Async Redis client for cache tiers on the running event loop, or None
+    when Redis caching is disabled or the redis package is unavailable.
+    """
+    if not settings.CACHE_REDIS_ENABLED:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _redis_clients.get(loop)
+    if client is None:
+        try:
+            client = _redis_clients[loop] = _connect(async_client=True)
+        except ImportError:
+            logger.warning("CACHE_REDIS_ENABLED is set but redis is not installed")
+            return None
+    return client
+
+
+def get_sync_redis():
+    """Like get_redis(), for code that does not run on an event loop"""
+    global _sync_redis_client
+    if not settings.CACHE_REDIS_ENABLED:
+        return None
+    if _sync_redis_client is None:
+        try:
+            _sync_redis_client = _connect(async_client=False)
+        except ImportError:
+            logger.warning("CACHE_REDIS_ENABLED is set but redis is not installed")
+            return None
+    return _sync_redis_client
+
+
+def redis_write(operation: Callable[[Any], Any], description: str) -> None:
+    """
+    Apply operation(client) to Redis from synchronous code such as commit
+    hooks. On an event loop thread it is scheduled on the loop with the
+    async client rather than blocking it; elsewhere it runs on the sync
+    client. Failures are logged, not raised.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None:
+        redis = get_sync_redis()
+        if redis is None:
+            return
+        try:
+            operation(redis)
+        except Exception as e:
+            logger.warning("%s in Redis failed: %s", description, e)
+        return
+
+    redis = get_redis()
+    if redis is None:
+        return
+
+    async def write():
+        try:
+            await operation(redis)
+        except Exception as e:
+            logger.warning("%s in Redis failed: %s", description, e)
+
+    task = loop.create_task(write())
+    _background_writes.add(task)
+    task.add_done_callback(_background_writes.discard)
+
+
+async def wait_for_redis_writes() -> None:
+    """
+    Wait for the writes redis_write() scheduled on the running loop, for
+    code that closes its loop afterwards (asyncio.run in a Celery task)
+    """
+    loop = asyncio.get_running_loop()
+    pending = [task for task in _background_writes if task.get_loop() is loop]
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def local_ttl(ttl: float) -> float:
+    """
+    TTL for an in-process tier. The local copy is kept short whether or
+    not a Redis tier is enabled: invalidations only reach this process's
+    copy, so this bounds how long other processes (API workers, Celery,
+    scripts) can serve stale entries after a write.
+    """
+    return min(ttl, settings.CACHE_LOCAL_TTL_SECONDS)
+
+
+class ReadThroughCache:
+    """
+    Read-through cache of JSON-serializable values: an in-process TTLCache
+    in front of the shared Redis tier.
+
+    Loads are single-flight per key within a process, and guarded by a
+    short Redis lock across processes, so a cold key triggers one load
+    rather than one per concurrent request. Generation counters keep a
+    load that raced an invalidation from storing what it read before it.
+
+    With grouped=True all entries live in one Redis hash and carry a
+    shared generation that clear() bumps, so a clear in any process drops
+    the cached entries of every process at once (used for result lists
+    that any write may change).
+    """
+
+    LOCK_TTL_MS = 5000
+    LOCK_WAIT_SECONDS = 2.0
+    LOCK_POLL_SECONDS = 0.02
+
+    def __init__(self, namespace: str, ttl: int, maxsize: int = 1024, grouped: bool = False):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.grouped = grouped
+        # key -> (value, shared generation it was read under)
+        self._local = TTLCache(maxsize=maxsize, ttl=local_ttl(ttl))
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    # Redis tier
+
+    def _redis_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    @property
+    def _generation_key(self) -> str:
+        return f"{self.namespace}:generation"
+
+    async def _redis_lookup(self, redis, key: Hashable) -> Tuple[Optional[int], Any]:
+        """The shared generation (grouped caches only) and the value, or None"""
+        if not self.grouped:
+            data = await redis.get(self._redis_key(key))
+            return None, None if data is None else orjson.loads(data)
+        pipe = redis.pipeline()
+        pipe.get(self._generation_key)
+        pipe.hget(self.namespace, str(key))
+        generation, data = await pipe.execute()
+        generation = int(generation or 0)
+        if data is None:
+            return generation, None
+        entry = orjson.loads(data)
+        # Stored by a load that started before the last clear
+        if entry["generation"] != generation:
+            return generation, None
+        return generation, entry["value"]
+
+    async def _redis_set(self, redis, key: Hashable, value: Any, generation: Optional[int]) -> None:
+        if self.grouped:
+            pipe = redis.pipeline()
+            pipe.hset(
+                self.namespace, str(key), orjson.dumps({"generation": generation, "value": value}, default=str)
+            )
+            pipe.expire(self.namespace, self.ttl)
+            await pipe.execute()
+        else:
+            await redis.set(self._redis_key(key), orjson.dumps(value, default=str), ex=self.ttl)
+
+    # Lookup and storage
+
+    def _local_generation(self, key: Hashable) -> tuple:
+        return self._epoch, self._generations.get(key, 0)
+
+    async def _generation(self, key: Hashable, redis) -> tuple:
+        """Taken before reading a value, to pass to set() with it"""
+        local = self._local_generation(key)
+        shared = None
+        if redis is not None and self.grouped:
+            try:
+                shared = int(await redis.get(self._generation_key) or 0)
+            except Exception as e:
+                logger.warning("Cache generation lookup in Redis failed (%s): %s", self.namespace, e)
+        return local + (shared,)
+
+    async def get(self, key: Hashable) -> Any:
+        """
+        Look up key in the in-process tier, then in Redis. Local entries of
+        grouped caches are only used while the shared generation is unchanged.
+        """
+        entry = self._local.get(key)
+        redis = get_redis()
+        if entry is not None and (redis is None or not self.grouped):
+            CACHE_REQUESTS.labels(cache=self.namespace, result="local_hit").inc()
+            return entry[0]
+        if redis is None:
+            CACHE_REQUESTS.labels(cache=self.namespace, result="miss").inc()
+            return None
+        try:
+            generation, value = await self._redis_lookup(redis, key)
+        except Exception as e:
+            logger.warning("Cache lookup in Redis failed (%s): %s", self.namespace, e)
+            CACHE_REQUESTS.labels(cache=self.namespace, result="error").inc()
+            return None
+        if entry is not None and entry[1] == generation:
+            CACHE_REQUESTS.labels(cache=self.namespace, result="local_hit").inc()
+            return entry[0]
+        if value is None:
+            CACHE_REQUESTS.labels(cache=self.namespace, result="miss").inc()
+            return None
+        CACHE_REQUESTS.labels(cache=self.namespace, result="redis_hit").inc()
+        self._local.set(key, (value, generation))
+        return value
+
+    async def set(self, key: Hashable, value: Any, generation: Optional[tuple] = None) -> None:
+        """Store value unless key was invalidated since generation"""
+        if self.ttl <= 0:
+            return
+        redis = get_redis()
+        if generation is None:
+            generation = await self._generation(key, redis)
+        elif self._local_generation(key) != generation[:2]:
+            return
+        shared = generation[2]
+        self._local.set(key, (value, shared))
+        if redis is None or (self.grouped and shared is None):
+            return
+        try:
+            await self._redis_set(redis, key, value, shared)
+        except Exception as e:
+            logger.warning("Cache write to Redis failed (%s): %s", self.namespace, e)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one entry from every tier"""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self._local.delete(key)
+        if self.grouped:
+            redis_write(lambda redis: redis.hdel(self.namespace, str(key)), f"Cache invalidation ({self.namespace})")
+        else:
+            redis_write(lambda redis: redis.delete(self._redis_key(key)), f"Cache invalidation ({self.namespace})")
+
+    def clear(self) -> None:
+        """
+        Drop every entry. For grouped caches this reaches every process,
+        through the shared generation; others only clear this process.
+        """
+        with self._lock:
+            self._epoch += 1
+        self._local.clear()
+        if self.grouped:
+            redis_write(
+                lambda redis: redis.pipeline().incr(self._generation_key).delete(self.namespace).execute(),
+                f"Cache clear ({self.namespace})",
+            )
+
+    # Read-through
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, or await loader() once and cache
+        its result. None results are returned but not cached.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is loop:
+            return await asyncio.shield(inflight)
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, loader)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here; waiters re-raise it
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        redis = get_redis()
+        generation = await self._generation(key, redis)
+        lock_key = None
+        if redis is not None:
+            try:
+                if await redis.set(f"{self.namespace}:lock:{key}", "1", nx=True, px=self.LOCK_TTL_MS):
+                    lock_key = f"{self.namespace}:lock:{key}"
+                else:
+                    # Another process is loading this key; give it a moment
+                    # to publish before loading ourselves
+                    deadline = time.monotonic() + self.LOCK_WAIT_SECONDS
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(self.LOCK_POLL_SECONDS)
+                        shared, value = await self._redis_lookup(redis, key)
+                        if value is not None:
+                            self._local.set(key, (value, shared))
+                            return value
+            except Exception as e:
+                logger.warning("Cache lock in Redis failed (%s): %s", self.namespace, e)
+
+        try:
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, generation)
+            return value
+        finally:
+            if lock_key is not None:
+                try:
+                    await redis.delete(lock_key)
+                except Exception as e:
+                    logger.warning("Cache unlock in Redis failed (%s): %s", self.namespace, e)
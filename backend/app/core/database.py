@@ -1,10 +1,15 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.core.config import settings
+from app.core.query_stats import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
 
+# Sync engine: Celery tasks, scripts and migrations
 engine = create_engine(
     settings.DATABASE_URL,
+    poolclass=TimedQueuePool,
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20
@@ -12,9 +17,58 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL onto the matching asyncio driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL)
+
+# Async engine: API routers. SQLite connections are cheap to open and
+# aiosqlite connections cannot be shared between event loops, so they are
+# not pooled.
+if settings.ASYNC_DB_NULL_POOL or ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=TimedAsyncQueuePool,
+        pool_pre_ping=True,
+        pool_size=10,
+        max_overflow=20
+    )
+
+# Per-request query counts and timings (see QueryStatsMiddleware) and pool metrics
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
+# Objects stay usable after commit; lazy loads are not possible under asyncio
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
+def reset_connection_pools() -> None:
+    """
+    Drop pooled connections inherited from the parent in a forked worker.
+    The parent's sockets are left open for the parent; the worker opens
+    its own on first use.
+    """
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
@@ -22,3 +76,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,17 +1,20 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth_cache import cache_principal, get_cached_principal
+from app.core.database import get_async_db
 from app.core.security import decode_access_token
 from app.models.user import User, UserRole
+from app.schemas.user import UserPrincipal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> UserPrincipal:
     """Get current authenticated user"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,17 +27,24 @@ async def get_current_user(
     email: str = payload.get("sub")
     if email is None:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
+    
+    # Resolve the token subject from cache; the database is only hit on a miss
+    user, generation = await get_cached_principal(email)
     if user is None:
-        raise credentials_exception
+        result = await db.execute(select(User).filter(User.email == email))
+        db_user = result.scalars().first()
+        if db_user is None:
+            raise credentials_exception
+        user = UserPrincipal.model_validate(db_user)
+        await cache_principal(user, generation)
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -42,8 +52,8 @@ async def get_current_active_user(
 
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_active_user)
+) -> UserPrincipal:
     """Get current admin user"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -0,0 +1,155 @@
+"""
+Prometheus metrics.
+
+Metrics are module-level and shared by the API and Celery workers. When
+several processes run (multiple Uvicorn/Gunicorn workers, Celery prefork
+children), point PROMETHEUS_MULTIPROC_DIR at an empty directory shared by
+all of them before they start; every process then writes its samples there
+and /metrics on any API process reports the aggregate.
+"""
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# RDKit and descriptor calls are sub-millisecond to tens of milliseconds
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+# Remote calls (ChEMBL, MLflow)
+REMOTE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+RDKIT_PARSE_SECONDS = Histogram(
+    "rdkit_parse_seconds",
+    "Time to parse a SMILES string with RDKit",
+    buckets=FAST_BUCKETS,
+)
+DESCRIPTOR_SECONDS = Histogram(
+    "descriptor_calculation_seconds",
+    "Time to calculate the molecular descriptor set for one molecule",
+    buckets=FAST_BUCKETS,
+)
+MODEL_INFERENCE_SECONDS = Histogram(
+    "model_inference_seconds",
+    "Time for one model prediction, including featurization",
+    ["model"],
+    buckets=FAST_BUCKETS,
+)
+BATCH_PREDICTIONS = Counter(
+    "batch_predictions_total",
+    "Compounds processed by batch prediction jobs",
+    ["model", "outcome"],
+)
+BATCH_JOB_SECONDS = Histogram(
+    "batch_job_duration_seconds",
+    "Wall time of batch prediction job runs (bulk jobs run once per slice)",
+    ["model"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+BATCH_QUEUE_WAIT_SECONDS = Histogram(
+    "batch_queue_wait_seconds",
+    "Time batch prediction jobs (and bulk job slices) wait in their queue",
+    ["queue"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+SCREENED_MOLECULES = Counter(
+    "screened_molecules_total",
+    "SMILES processed by screening requests",
+    ["outcome"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache, tier and result",
+    ["cache", "result"],
+)
+MLFLOW_REQUEST_SECONDS = Histogram(
+    "mlflow_request_seconds",
+    "Latency of MLflow tracking calls",
+    ["operation"],
+    buckets=REMOTE_BUCKETS,
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "model_load_seconds",
+    "Time to download and load a registered model version",
+    ["model_type"],
+    buckets=REMOTE_BUCKETS + (30.0, 60.0),
+)
+MODEL_CACHE_EVENTS = Counter(
+    "model_cache_events_total",
+    "Model cache lookups, evictions and version swaps",
+    ["event"],
+)
+MODEL_CACHE_BYTES = Gauge(
+    "model_cache_bytes",
+    "Artifact size of the model versions loaded in memory",
+    multiprocess_mode="livesum",
+)
+CHEMBL_REQUEST_SECONDS = Histogram(
+    "chembl_request_seconds",
+    "Latency of ChEMBL API calls",
+    ["endpoint"],
+    buckets=REMOTE_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a database connection",
+    ["engine"],
+    buckets=FAST_BUCKETS + (0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured connections (pool size plus max overflow)",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+
+
+def render_metrics():
+    """Return the exposition payload and its content type"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop live gauges of an exited worker process (multiprocess mode only)"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Records request latency labelled by route template, not raw path"""
+
+    async def dispatch(self, request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method=request.method,
+                route=route.path if route is not None else "unmatched",
+                status=str(status),
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_SECONDS, DB_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class RequestQueryStats:
+    """Database work done on behalf of a single request"""
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.count = 0
+        self.duration = 0.0
+        self.pool_wait = 0.0
+        self.statements = Counter()
+
+    def record_query(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least threshold times, most repeated first"""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries", '
+            f"db-pool;dur={self.pool_wait * 1000:.1f}"
+        )
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def get_request_stats() -> Optional[RequestQueryStats]:
+    return _current_stats.get()
+
+
+def query_budget(max_queries: int):
+    """
+    Route dependency overriding DB_QUERY_BUDGET for one endpoint:
+
+        @router.get("/", dependencies=[Depends(query_budget(5))])
+    """
+    async def _set_query_budget():
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.budget = max_queries
+    return _set_query_budget
+
+
+# Engine hooks
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record_query(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def instrument_engine(engine: Engine, label: str) -> None:
+    """Attach per-request query counting and pool gauges to a (sync) engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        DB_POOL_SIZE.labels(engine=label).set(pool.size() + max(pool._max_overflow, 0))
+    checked_out = DB_POOL_CHECKED_OUT.labels(engine=label)
+    event.listen(engine, "checkout", lambda *args: checked_out.inc())
+    event.listen(engine, "checkin", lambda *args: checked_out.dec())
+
+
+# Connection pool checkout timing
+
+_pool_lock = threading.Lock()
+
+
+class _TimedCheckoutMixin:
+    """Measures time spent waiting for a pooled connection (or opening one)"""
+
+    checkouts = 0
+    checkout_wait = 0.0
+    max_checkout_wait = 0.0
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            with _pool_lock:
+                self.checkouts += 1
+                self.checkout_wait += elapsed
+                self.max_checkout_wait = max(self.max_checkout_wait, elapsed)
+            DB_POOL_CHECKOUT_SECONDS.labels(engine=self.metrics_label).observe(elapsed)
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.pool_wait += elapsed
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def get_pool_stats(engine: Engine) -> Dict[str, float]:
+    """Size, usage and checkout wait of an engine's connection pool"""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            saturation=round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+        )
+    if isinstance(pool, _TimedCheckoutMixin):
+        stats.update(
+            checkouts=pool.checkouts,
+            checkout_wait_ms=round(pool.checkout_wait * 1000, 1),
+            max_checkout_wait_ms=round(pool.max_checkout_wait * 1000, 1),
+        )
+    return stats
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Counts queries and database time per request, reports them in a
+    Server-Timing header and the log, and flags statements repeated often
+    enough to suggest an N+1 pattern. Requests over their query budget are
+    logged, or answered with a 500 when DB_QUERY_BUDGET_ENFORCE is set.
+    """
+
+    async def dispatch(self, request, call_next):
+        stats = RequestQueryStats(budget=settings.DB_QUERY_BUDGET)
+        token = _current_stats.set(stats)
+        try:
+            response = await call_next(request)
+        finally:
+            _current_stats.reset(token)
+
+        endpoint = f"{request.method} {request.url.path}"
+        for statement, repeats in stats.repeated_statements(settings.DB_N_PLUS_ONE_THRESHOLD):
+            logger.warning(
+                "Possible N+1 in %s: statement ran %d times: %s",
+                endpoint, repeats, " ".join(statement.split())[:200]
+            )
+
+        if stats.budget is not None and stats.count > stats.budget:
+            message = f"{endpoint} ran {stats.count} queries (budget {stats.budget})"
+            if settings.DB_QUERY_BUDGET_ENFORCE:
+                logger.error("Query budget exceeded: %s", message)
+                response = JSONResponse(
+                    status_code=500,
+                    content={"detail": f"Query budget exceeded: {message}"}
+                )
+            else:
+                logger.warning("Query budget exceeded: %s", message)
+
+        logger.info(
+            "%s %s: %d queries, %.1f ms db, %.1f ms pool wait",
+            endpoint, response.status_code, stats.count,
+            stats.duration * 1000, stats.pool_wait * 1000
+        )
+        response.headers["Server-Timing"] = stats.server_timing()
+        return response
@@ -1,11 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, async_engine, Base
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.query_stats import QueryStatsMiddleware, get_pool_stats
 from app.api.v1 import api_router
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from app.services.chembl_service import close_chembl_client
+from app.services.model_registry import preload_models
+from app.services.screening_service import shutdown_screening_pool
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -23,10 +25,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request query counting, Server-Timing and N+1 detection
+app.add_middleware(QueryStatsMiddleware)
+
+# Prometheus request latency by route
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
+@app.on_event("startup")
+def create_tables():
+    """Create missing tables once the server starts, not on import"""
+    if settings.DB_CREATE_TABLES_ON_STARTUP:
+        Base.metadata.create_all(bind=engine)
+
+
+@app.on_event("startup")
+def load_models():
+    """Load the MODEL_PRELOAD models before serving predictions"""
+    preload_models()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close pooled connections to external APIs and stop screening workers"""
+    await close_chembl_client()
+    shutdown_screening_pool()
+
+
 @app.get("/")
 def root():
     """Root endpoint"""
@@ -41,3 +69,19 @@ def root():
 def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+
+@app.get("/health/db")
+def database_health():
+    """Connection pool usage and checkout wait for both engines"""
+    return {
+        "sync": get_pool_stats(engine),
+        "async": get_pool_stats(async_engine.sync_engine),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics, aggregated across worker processes when configured"""
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
@@ -1,6 +1,7 @@
 from app.models.user import User, UserRole
 from app.models.compound import Compound, CompoundVersion
-from app.models.experiment import Experiment, Prediction
+from app.models.experiment import Experiment, Prediction, ModelVersion, DescriptorSet, LatestPrediction
+from app.models.job import Job
 from app.core.database import Base
 
 __all__ = [
@@ -11,4 +12,8 @@ __all__ = [
     "CompoundVersion",
     "Experiment",
     "Prediction",
+    "ModelVersion",
+    "DescriptorSet",
+    "LatestPrediction",
+    "Job",
 ]
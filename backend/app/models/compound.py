@@ -1,11 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+import copy
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, JSON, Index, event
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 
 class Compound(Base):
     __tablename__ = "compounds"
+    __table_args__ = (
+        Index("ix_compounds_external_source_external_id", "external_source", "external_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
@@ -30,13 +34,21 @@ class Compound(Base):
 
 class CompoundVersion(Base):
     __tablename__ = "compound_versions"
+    __table_args__ = (
+        Index("ix_compound_versions_compound_id_id", "compound_id", "id"),
+        Index("ix_compound_versions_compound_id_created_at", "compound_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     compound_id = Column(Integer, ForeignKey("compounds.id"), nullable=False)
     version = Column(Integer, nullable=False)
-    name = Column(String, nullable=False)
-    smiles = Column(String, nullable=False)
+    # name/smiles/properties are only stored on checkpoint rows; delta rows
+    # hold a JSON patch against their checkpoint (base_id) instead
+    name = Column(String, nullable=True)
+    smiles = Column(String, nullable=True)
     properties = Column(JSON, nullable=True)
+    base_id = Column(Integer, ForeignKey("compound_versions.id"), nullable=True)
+    delta = Column(JSON, nullable=True)
     changed_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     change_type = Column(String, nullable=False)  # "create", "update", "delete"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -44,3 +56,22 @@ class CompoundVersion(Base):
     # Relationships
     compound = relationship("Compound", back_populates="versions")
     changed_by_user = relationship("User")
+
+
+@event.listens_for(Session, "before_flush")
+def _version_new_compounds(session, flush_context, instances):
+    """Record the initial "create" version of new compounds in the same flush"""
+    for obj in list(session.new):
+        if not isinstance(obj, Compound) or obj.versions:
+            continue
+        if obj.version is None:
+            obj.version = 1
+        session.add(CompoundVersion(
+            compound=obj,
+            version=obj.version,
+            name=obj.name,
+            smiles=obj.smiles,
+            properties=copy.deepcopy(obj.properties),
+            changed_by=obj.created_by,
+            change_type="create"
+        ))
@@ -1,8 +1,20 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Text
-from sqlalchemy.orm import relationship
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Text, Index, event, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
 
+# prediction_details keys that describe the model rather than the
+# prediction; stored once per ModelVersion
+MODEL_METADATA_KEYS = ("model_type", "model_name", "model_version", "units")
+# prediction_details key holding the descriptor inputs; stored once per
+# distinct descriptor set (in practice, once per structure)
+DESCRIPTORS_KEY = "properties_used"
+
 
 class Experiment(Base):
     __tablename__ = "experiments"
@@ -15,6 +27,7 @@ class Experiment(Base):
     model_name = Column(String, nullable=True)
     parameters = Column(JSON, nullable=True)  # Model parameters
     metrics = Column(JSON, nullable=True)  # Model metrics
+    prediction_stats = Column(JSON, nullable=True)  # Mergeable running aggregates of predictions
     status = Column(String, default="running")  # "running", "completed", "failed"
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -25,6 +38,27 @@ class Experiment(Base):
     predictions = relationship("Prediction", back_populates="experiment")
 
 
+class ModelVersion(Base):
+    """Model metadata shared by every prediction a model version made"""
+    __tablename__ = "model_versions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_type = Column(String, nullable=False)
+    model_name = Column(String, nullable=True)
+    details = Column(JSON, nullable=False)
+    content_hash = Column(String(64), nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DescriptorSet(Base):
+    """Descriptor inputs shared by every prediction made on one structure"""
+    __tablename__ = "descriptor_sets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    descriptors = Column(JSON, nullable=False)
+    content_hash = Column(String(64), nullable=False, unique=True)
+
+
 class Prediction(Base):
     __tablename__ = "predictions"
 
@@ -32,14 +66,171 @@ class Prediction(Base):
     compound_id = Column(Integer, ForeignKey("compounds.id"), nullable=False)
     experiment_id = Column(Integer, ForeignKey("experiments.id"), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=True)  # Batch job that made it
     model_type = Column(String, nullable=False)  # "solubility", "toxicity", "dti"
     model_name = Column(String, nullable=True)
     prediction_value = Column(Float, nullable=True)
     prediction_confidence = Column(Float, nullable=True)
-    prediction_details = Column(JSON, nullable=True)  # Additional prediction data
+    # Model metadata and descriptor inputs are referenced rather than
+    # repeated in every row; the column only keeps model-specific extras.
+    # prediction_details rebuilds the full dict on read.
+    model_version_id = Column(Integer, ForeignKey("model_versions.id"), nullable=True)
+    descriptor_set_id = Column(Integer, ForeignKey("descriptor_sets.id"), nullable=True)
+    details_extra = Column("prediction_details", JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Listings filter by user (and model type or compound) and page newest
+    # first; exports and reports read whole experiments. A batch job makes
+    # at most one prediction per compound, which keeps re-runs idempotent.
+    __table_args__ = (
+        Index("ix_predictions_user_id_created_at", user_id, created_at.desc(), id.desc()),
+        Index("ix_predictions_user_id_model_type_created_at", user_id, model_type, created_at.desc(), id.desc()),
+        Index("ix_predictions_compound_id_user_id_created_at", compound_id, user_id, created_at.desc(), id.desc()),
+        Index("ix_predictions_experiment_id_compound_id", experiment_id, compound_id),
+        Index("ix_predictions_job_id_compound_id", job_id, compound_id, unique=True),
+    )
+
     # Relationships
     compound = relationship("Compound", back_populates="predictions")
     experiment = relationship("Experiment", back_populates="predictions")
     user = relationship("User", back_populates="predictions")
+    model_version = relationship("ModelVersion")
+    descriptor_set = relationship("DescriptorSet")
+
+    @property
+    def prediction_details(self) -> Optional[Dict[str, Any]]:
+        """Full prediction details, as they were passed in"""
+        if "_details" in self.__dict__:
+            return self._details
+        if self.model_version_id is None and self.descriptor_set_id is None:
+            return self.details_extra
+        details = dict(self.model_version.details) if self.model_version_id else {}
+        if self.descriptor_set_id:
+            details[DESCRIPTORS_KEY] = self.descriptor_set.descriptors
+        details.update(self.details_extra or {})
+        return details
+
+    @prediction_details.setter
+    def prediction_details(self, value: Optional[Dict[str, Any]]) -> None:
+        # Stored whole for now, which also marks the row dirty; the flush
+        # splits it into references and extras
+        self._details = value
+        self._details_split = False
+        self.details_extra = value
+
+
+class LatestPrediction(Base):
+    """
+    The most recent prediction per user, compound and model, maintained by
+    the prediction write paths so dashboards never scan the append-only
+    predictions table
+    """
+    __tablename__ = "latest_predictions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    compound_id = Column(Integer, ForeignKey("compounds.id"), primary_key=True)
+    model_type = Column(String, primary_key=True)
+    # "" for predictions without a model name, as key columns cannot be NULL
+    model_key = Column("model_name", String, primary_key=True, default="")
+    prediction_id = Column(Integer, ForeignKey("predictions.id"), nullable=False)
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), nullable=True)
+    prediction_value = Column(Float, nullable=True)
+    prediction_confidence = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Listings page by (compound_id, model_type, model_name) within a user,
+    # optionally for one model type; top-k rankings walk one model type's
+    # values from either end
+    __table_args__ = (
+        Index("ix_latest_predictions_user_id_model_type_compound_id", user_id, model_type, compound_id, model_key),
+        Index("ix_latest_predictions_user_id_model_type_value", user_id, model_type, prediction_value, compound_id),
+    )
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.model_key or None
+
+
+def details_hash(value: Any) -> str:
+    """Stable hash of a JSON-serializable value"""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def split_prediction_details(
+    model_type: str,
+    details: Optional[Dict[str, Any]]
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Split prediction details into (model version row, descriptor set row,
+    extras). Either row is None when the details carry nothing for it;
+    details without either are kept whole as extras.
+    """
+    if not details:
+        return None, None, details
+    metadata = {k: details[k] for k in MODEL_METADATA_KEYS if k in details}
+    descriptors = details.get(DESCRIPTORS_KEY)
+    extras = {k: v for k, v in details.items() if k not in metadata and k != DESCRIPTORS_KEY}
+    model_version = descriptor_set = None
+    if metadata:
+        model_version = {
+            "model_type": model_type,
+            "model_name": metadata.get("model_name"),
+            "details": metadata,
+            "content_hash": details_hash([model_type, metadata]),
+        }
+    if isinstance(descriptors, dict):
+        descriptor_set = {"descriptors": descriptors, "content_hash": details_hash(descriptors)}
+    elif DESCRIPTORS_KEY in details:
+        extras[DESCRIPTORS_KEY] = descriptors
+    if model_version is None and descriptor_set is None:
+        return None, None, details
+    return model_version, descriptor_set, extras or None
+
+
+def ensure_reference_rows(connection, model, rows: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Get or create ModelVersion/DescriptorSet rows by content hash and
+    return {hash: id}. Concurrent writers of the same row are resolved by
+    the unique hash (INSERT ... ON CONFLICT DO NOTHING, then re-read).
+    """
+    if not rows:
+        return {}
+    table = model.__table__
+    lookup = select(table.c.content_hash, table.c.id)
+    ids = dict(connection.execute(lookup.where(table.c.content_hash.in_(list(rows)))).all())
+    missing = [row for key, row in rows.items() if key not in ids]
+    if missing:
+        dialect = connection.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            connection.execute(insert(table).on_conflict_do_nothing(index_elements=["content_hash"]), missing)
+        else:
+            connection.execute(table.insert(), missing)
+        keys = [row["content_hash"] for row in missing]
+        ids.update(connection.execute(lookup.where(table.c.content_hash.in_(keys))).all())
+    return ids
+
+
+@event.listens_for(Session, "before_flush")
+def _compact_prediction_details(session, flush_context, instances):
+    """Store new prediction details as references plus extras"""
+    predictions = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Prediction) and obj.__dict__.get("_details_split") is False
+    ]
+    if not predictions:
+        return
+    splits = [split_prediction_details(p.model_type, p._details) for p in predictions]
+    connection = session.connection()
+    model_versions = ensure_reference_rows(
+        connection, ModelVersion, {mv["content_hash"]: mv for mv, _, _ in splits if mv}
+    )
+    descriptor_sets = ensure_reference_rows(
+        connection, DescriptorSet, {ds["content_hash"]: ds for _, ds, _ in splits if ds}
+    )
+    for prediction, (model_version, descriptor_set, extras) in zip(predictions, splits):
+        prediction.model_version_id = model_versions[model_version["content_hash"]] if model_version else None
+        prediction.descriptor_set_id = descriptor_sets[descriptor_set["content_hash"]] if descriptor_set else None
+        prediction.details_extra = extras
+        prediction._details_split = True
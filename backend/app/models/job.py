@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class Job(Base):
+    """A long-running background operation and its progress"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False, index=True)  # "chembl_import", "batch_prediction"
+    status = Column(String, nullable=False, default="pending")  # "pending", "queued", "running", "completed", "failed"
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    parameters = Column(JSON, nullable=True)  # Job input
+    total = Column(Integer, nullable=False, default=0)  # Items to process
+    # Items done, whatever their outcome; jobs over an ordered list of items
+    # also use it as the cursor they resume from
+    processed = Column(Integer, nullable=False, default=0)
+    result = Column(JSON, nullable=True)  # Outcome counts and details
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    user = relationship("User")
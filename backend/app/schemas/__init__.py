@@ -5,6 +5,7 @@ from app.schemas.compound import (
     CompoundResponse,
     CompoundSearch,
     CompoundVersionResponse,
+    ChemblBulkImportRequest,
 )
 from app.schemas.prediction import (
     PredictionCreate,
@@ -17,3 +18,4 @@ from app.schemas.experiment import (
     ExperimentUpdate,
     ExperimentResponse,
 )
+from app.schemas.job import JobResponse
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 
@@ -57,3 +57,7 @@ class CompoundSearch(BaseModel):
     external_source: Optional[str] = None
     skip: int = 0
     limit: int = 100
+
+
+class ChemblBulkImportRequest(BaseModel):
+    chembl_ids: List[str] = Field(..., min_length=1, max_length=10000)
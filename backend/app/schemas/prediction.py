@@ -27,10 +27,33 @@ class PredictionResponse(PredictionBase):
         from_attributes = True
 
 
+class LatestPredictionResponse(BaseModel):
+    compound_id: int
+    model_type: str
+    model_name: Optional[str]
+    prediction_id: int
+    experiment_id: Optional[int]
+    prediction_value: Optional[float]
+    prediction_confidence: Optional[float]
+    created_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class TopCompoundResponse(BaseModel):
+    compound_id: int
+    compound_name: Optional[str]
+    smiles: Optional[str]
+    score: float
+    predictions: Dict[str, float]  # Objective -> latest prediction value
+
+
 class BatchPredictionRequest(BaseModel):
     compound_ids: List[int]
     model_type: str
     model_name: Optional[str] = None
+    experiment_id: Optional[int] = None
 
 
 class PredictionResult(BaseModel):
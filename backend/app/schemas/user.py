@@ -33,6 +33,11 @@ class UserResponse(UserInDB):
     pass
 
 
+class UserPrincipal(UserInDB):
+    """Authenticated user as resolved from an access token"""
+    pass
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
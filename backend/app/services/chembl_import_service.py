@@ -0,0 +1,177 @@
+import asyncio
+import copy
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.compound import Compound, CompoundVersion
+from app.models.job import Job
+from app.services.compound_cache import invalidate_compounds
+from app.services.chembl_service import ChemblUnavailableError, get_chembl_compounds_by_ids
+from app.services.ml_service import calculate_molecular_properties
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = "chembl_import"
+
+
+def normalize_chembl_ids(chembl_ids: Iterable[str]) -> List[str]:
+    """Upper-cased, stripped IDs in request order without duplicates"""
+    return list(dict.fromkeys(i.strip().upper() for i in chembl_ids if i and i.strip()))
+
+
+async def create_chembl_import_job(db: AsyncSession, chembl_ids: List[str], user_id: int) -> Job:
+    """Record a pending import job for run_chembl_import to pick up"""
+    job = Job(
+        job_type=JOB_TYPE,
+        status="pending",
+        user_id=user_id,
+        parameters={"chembl_ids": chembl_ids},
+        total=len(chembl_ids),
+        processed=0,
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+def _compound_rows(records: List[Dict[str, Any]], user_id: int) -> List[Dict[str, Any]]:
+    """Compound rows for fetched ChEMBL records, with RDKit properties (CPU-bound)"""
+    rows = []
+    for record in records:
+        smiles = record.get("smiles") or ""
+        properties = record.get("properties") or {}
+        molecular_weight = None
+        if smiles:
+            props = calculate_molecular_properties(smiles)
+            if props:
+                properties = {**properties, **props}
+                molecular_weight = props.get("molecular_weight")
+        rows.append({
+            "name": record["name"],
+            "smiles": smiles,
+            "external_id": record["external_id"],
+            "external_source": record["external_source"],
+            "properties": properties,
+            "molecular_weight": molecular_weight,
+            "created_by": user_id,
+            "version": 1,
+        })
+    return rows
+
+
+async def _insert_compounds(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insert compounds and their "create" versions with one multi-row INSERT
+    each. Unit-of-work flushes fall back to a statement per row on some
+    drivers, which dominates large imports. Compounds another run imported
+    meanwhile are skipped by the unique (external_source, external_id)
+    index; only the IDs of inserted compounds are returned.
+    """
+    if not rows:
+        return []
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    statement = insert(Compound).on_conflict_do_nothing(
+        index_elements=[Compound.external_source, Compound.external_id]
+    )
+    inserted = (await db.execute(
+        statement.returning(Compound.id, Compound.external_id), rows
+    )).all()
+    ids = {external_id: compound_id for compound_id, external_id in inserted}
+    if ids:
+        await db.execute(insert(CompoundVersion), [
+            {
+                "compound_id": ids[row["external_id"]],
+                "version": row["version"],
+                "name": row["name"],
+                "smiles": row["smiles"],
+                "properties": copy.deepcopy(row["properties"]),
+                "changed_by": row["created_by"],
+                "change_type": "create",
+            }
+            for row in rows if row["external_id"] in ids
+        ])
+    return list(ids.values())
+
+
+async def run_chembl_import(job_id: int) -> None:
+    """
+    Import the job's ChEMBL IDs. IDs already imported are skipped with one
+    query up front; the rest are fetched in list queries of
+    CHEMBL_BULK_BATCH_SIZE, at most CHEMBL_BULK_CONCURRENCY at a time.
+    Each fetched batch is inserted, together with the job's progress, in
+    one transaction, so progress is visible while the job runs. A resumed
+    job continues where it stopped, with the earlier imports counted as
+    existing.
+    """
+    async with AsyncSessionLocal() as db:
+        # Claim the job, so a redelivered or resumed message for a job that
+        # is already running (or finished) does not start a second run
+        claimed = await db.execute(
+            update(Job).where(Job.id == job_id, Job.status.in_(("pending", "queued")))
+            .values(status="running")
+        )
+        await db.commit()
+        if claimed.rowcount == 0:
+            return
+        job = await db.get(Job, job_id)
+        chembl_ids = job.parameters["chembl_ids"]
+        summary = {"imported": 0, "existing": 0, "not_found": [], "failed": []}
+        try:
+            existing = set((await db.scalars(select(Compound.external_id).filter(
+                Compound.external_source == "chembl",
+                Compound.external_id.in_(chembl_ids)
+            ))).all())
+            pending = [i for i in chembl_ids if i not in existing]
+            summary["existing"] = len(existing)
+            job.processed = len(existing)
+            job.result = copy.deepcopy(summary)
+            await db.commit()
+
+            semaphore = asyncio.Semaphore(settings.CHEMBL_BULK_CONCURRENCY)
+
+            async def fetch(batch):
+                async with semaphore:
+                    try:
+                        return batch, await get_chembl_compounds_by_ids(batch), None
+                    except ChemblUnavailableError as e:
+                        return batch, None, e
+
+            size = settings.CHEMBL_BULK_BATCH_SIZE
+            batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+            for fetched in asyncio.as_completed([fetch(batch) for batch in batches]):
+                batch, records, error = await fetched
+                new_ids = []
+                if error is not None:
+                    summary["failed"].extend(batch)
+                    job.error = str(error)
+                else:
+                    summary["not_found"].extend(i for i in batch if records.get(i) is None)
+                    found = [records[i] for i in batch if records.get(i) is not None]
+                    rows = await run_in_threadpool(_compound_rows, found, job.user_id)
+                    new_ids = await _insert_compounds(db, rows)
+                    summary["imported"] += len(new_ids)
+                    summary["existing"] += len(rows) - len(new_ids)
+                job.processed += len(batch)
+                job.result = copy.deepcopy(summary)
+                await db.commit()
+                # Bulk inserts skip the mapper events behind cache invalidation
+                invalidate_compounds(new_ids)
+
+            job.status = "completed"
+            job.completed_at = datetime.utcnow()
+            await db.commit()
+        except Exception as e:
+            logger.exception("ChEMBL import job %d failed", job_id)
+            await db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            job.completed_at = datetime.utcnow()
+            await db.commit()
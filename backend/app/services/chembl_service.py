@@ -1,54 +1,167 @@
+import asyncio
+import logging
+import weakref
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import quote
 import httpx
-from typing import Optional, Dict, Any
+from app.core.cache import ReadThroughCache
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
 from app.core.config import settings
+from app.core.metrics import CHEMBL_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class ChemblUnavailableError(Exception):
+    """ChEMBL could not be reached, failed, or its circuit is open"""
+
+
+# Normalized lookups; {} records that ChEMBL has no match, so misses are
+# cached too. Identical lookups in flight share one request.
+chembl_lookups = ReadThroughCache(
+    "chembl",
+    ttl=settings.CHEMBL_CACHE_TTL_SECONDS,
+    maxsize=settings.CHEMBL_CACHE_MAX_ENTRIES,
+)
+
+chembl_breaker = CircuitBreaker(
+    "chembl",
+    failure_threshold=settings.CHEMBL_BREAKER_FAILURES,
+    reset_timeout=settings.CHEMBL_BREAKER_RESET_SECONDS,
+)
+
+# One long-lived client, and so one keep-alive pool, per event loop: httpx
+# connections are bound to the loop that opened them
+_clients = weakref.WeakKeyDictionary()
+
+
+def _get_client() -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = httpx.AsyncClient(
+            base_url=settings.CHEMBL_API_URL,
+            headers={"Accept": "application/json"},
+            timeout=httpx.Timeout(settings.CHEMBL_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.CHEMBL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CHEMBL_MAX_CONNECTIONS,
+                keepalive_expiry=30.0,
+            ),
+        )
+        entry = (client, asyncio.Semaphore(settings.CHEMBL_MAX_CONCURRENCY))
+        _clients[loop] = entry
+    return entry
+
+
+async def close_chembl_client() -> None:
+    """Close the current event loop's client and its pooled connections"""
+    entry = _clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[0].aclose()
+
+
+async def _get_json(endpoint: str, path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    GET a ChEMBL resource. Returns None when ChEMBL has no such resource
+    and raises ChemblUnavailableError on transport errors, 429 and 5xx.
+    """
+    try:
+        chembl_breaker.before_call()
+    except CircuitOpenError as e:
+        raise ChemblUnavailableError(str(e)) from e
+
+    client, semaphore = _get_client()
+    try:
+        async with semaphore:
+            with CHEMBL_REQUEST_SECONDS.labels(endpoint=endpoint).time():
+                response = await client.get(path, params=params)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        data = response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError) as e:
+        chembl_breaker.record_failure()
+        logger.warning("ChEMBL %s request failed: %s", endpoint, e)
+        raise ChemblUnavailableError(f"ChEMBL {endpoint} request failed: {e}") from e
+
+    chembl_breaker.record_success()
+    if data is None:
+        logger.info("ChEMBL %s request returned %d for %s", endpoint, response.status_code, path)
+    return data
 
 
 async def search_chembl_compound(smiles: str) -> Optional[Dict[str, Any]]:
     """Search for compound in ChEMBL by SMILES"""
-    try:
-        async with httpx.AsyncClient() as client:
-            # ChEMBL API endpoint for similarity search
-            url = f"{settings.CHEMBL_API_URL}/similarity/{smiles}/100"
-            response = await client.get(url, timeout=10.0)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("molecules"):
-                    # Return first match
-                    molecule = data["molecules"][0]
-                    return {
-                        "external_id": molecule.get("molecule_chembl_id"),
-                        "external_source": "chembl",
-                        "name": molecule.get("pref_name") or molecule.get("molecule_chembl_id"),
-                        "properties": {
-                            "alogp": molecule.get("alogp"),
-                            "molecular_weight": molecule.get("molecular_weight"),
-                            "num_ro5_violations": molecule.get("num_ro5_violations"),
-                        }
-                    }
-    except Exception as e:
-        print(f"Error searching ChEMBL: {e}")
-    return None
+    async def load():
+        # ChEMBL API endpoint for similarity search
+        data = await _get_json("similarity", f"similarity/{quote(smiles, safe='')}/100")
+        if not data or not data.get("molecules"):
+            return {}
+        # Return first match
+        molecule = data["molecules"][0]
+        return {
+            "external_id": molecule.get("molecule_chembl_id"),
+            "external_source": "chembl",
+            "name": molecule.get("pref_name") or molecule.get("molecule_chembl_id"),
+            "properties": {
+                "alogp": molecule.get("alogp"),
+                "molecular_weight": molecule.get("molecular_weight"),
+                "num_ro5_violations": molecule.get("num_ro5_violations"),
+            }
+        }
+
+    return await chembl_lookups.get_or_load(f"similarity:{smiles}", load) or None
+
+
+def _molecule_record(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "external_id": data.get("molecule_chembl_id"),
+        "external_source": "chembl",
+        "name": data.get("pref_name") or data.get("molecule_chembl_id"),
+        "smiles": (data.get("molecule_structures") or {}).get("canonical_smiles"),
+        "properties": {
+            "alogp": data.get("alogp"),
+            "molecular_weight": data.get("molecular_weight"),
+            "num_ro5_violations": data.get("num_ro5_violations"),
+        }
+    }
 
 
 async def get_chembl_compound_by_id(chembl_id: str) -> Optional[Dict[str, Any]]:
     """Get compound details from ChEMBL by ID"""
-    try:
-        async with httpx.AsyncClient() as client:
-            url = f"{settings.CHEMBL_API_URL}/molecule/{chembl_id}"
-            response = await client.get(url, timeout=10.0)
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "external_id": data.get("molecule_chembl_id"),
-                    "external_source": "chembl",
-                    "name": data.get("pref_name") or data.get("molecule_chembl_id"),
-                    "smiles": data.get("molecule_structures", {}).get("canonical_smiles"),
-                    "properties": {
-                        "alogp": data.get("alogp"),
-                        "molecular_weight": data.get("molecular_weight"),
-                        "num_ro5_violations": data.get("num_ro5_violations"),
-                    }
-                }
-    except Exception as e:
-        print(f"Error fetching ChEMBL compound: {e}")
-    return None
+    async def load():
+        data = await _get_json("molecule", f"molecule/{quote(chembl_id, safe='')}")
+        return _molecule_record(data) if data else {}
+
+    return await chembl_lookups.get_or_load(f"molecule:{chembl_id}", load) or None
+
+
+async def get_chembl_compounds_by_ids(chembl_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Get several compounds with one molecule_chembl_id__in list query.
+    Returns a record, or None when ChEMBL has no such molecule, per ID.
+    Cached IDs are not requested again, and fetched ones are cached.
+    """
+    records = {}
+    missing = []
+    for chembl_id in dict.fromkeys(chembl_ids):
+        cached = await chembl_lookups.get(f"molecule:{chembl_id}")
+        if cached is None:
+            missing.append(chembl_id)
+        else:
+            records[chembl_id] = cached or None
+
+    if missing:
+        data = await _get_json("molecule_list", "molecule", params={
+            "molecule_chembl_id__in": ",".join(missing),
+            "limit": len(missing),
+        })
+        found = {
+            molecule.get("molecule_chembl_id"): molecule
+            for molecule in (data or {}).get("molecules", [])
+        }
+        for chembl_id in missing:
+            record = _molecule_record(found[chembl_id]) if chembl_id in found else {}
+            await chembl_lookups.set(f"molecule:{chembl_id}", record)
+            records[chembl_id] = record or None
+    return records
@@ -0,0 +1,62 @@
+from typing import Iterable
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.cache import ReadThroughCache
+from app.core.config import settings
+from app.models.compound import Compound
+
+# Serialized CompoundResponse by compound id
+compound_details = ReadThroughCache(
+    "compound:detail",
+    ttl=settings.COMPOUND_CACHE_TTL_SECONDS,
+    maxsize=settings.COMPOUND_CACHE_MAX_ENTRIES,
+)
+
+# Version history pages keyed by (compound id, compound version, skip,
+# limit); a change bumps the version, so entries never need invalidating
+compound_version_pages = ReadThroughCache(
+    "compound:versions",
+    ttl=settings.COMPOUND_CACHE_TTL_SECONDS,
+    maxsize=settings.COMPOUND_CACHE_MAX_ENTRIES,
+)
+
+# Unsearched list pages with their ETag; any compound write may change them
+compound_lists = ReadThroughCache(
+    "compound:lists",
+    ttl=settings.COMPOUND_CACHE_TTL_SECONDS,
+    maxsize=1024,
+    grouped=True,
+)
+
+
+def invalidate_compounds(compound_ids: Iterable[int]) -> None:
+    """Drop cached reads affected by changes to the given compounds"""
+    for compound_id in compound_ids:
+        compound_details.invalidate(compound_id)
+    compound_lists.clear()
+
+
+def _pending_compounds(session: Session) -> set:
+    return session.info.setdefault("compound_cache_invalidations", set())
+
+
+@event.listens_for(Compound, "after_insert")
+@event.listens_for(Compound, "after_update")
+@event.listens_for(Compound, "after_delete")
+def _collect_changed_compound(mapper, connection, target):
+    """Remember compounds whose cached reads must go once the change commits"""
+    session = Session.object_session(target)
+    if session is not None:
+        _pending_compounds(session).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_compounds(session):
+    changed = session.info.pop("compound_cache_invalidations", None)
+    if changed:
+        invalidate_compounds(changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_compounds(session, previous_transaction):
+    session.info.pop("compound_cache_invalidations", None)
@@ -0,0 +1,243 @@
+import math
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+from app.models.experiment import Experiment
+
+# Prefix used for the aggregate keys written into Experiment.metrics
+METRIC_PREFIX = "prediction_"
+
+# Quantiles published into Experiment.metrics
+SUMMARY_QUANTILES = {"p05": 0.05, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p95": 0.95}
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch).
+    Values are counted in logarithmically sized buckets, so two sketches
+    built on different shards merge exactly by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.positive.values()) + sum(self.negative.values())
+
+    def _index(self, value: float) -> int:
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Add a value to the sketch"""
+        if value > 0:
+            store = self.positive
+        elif value < 0:
+            store = self.negative
+            value = -value
+        else:
+            self.zero_count += count
+            return
+        index = self._index(value)
+        store[index] = store.get(index, 0) + count
+        self._collapse(store)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Merge another sketch into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.positive.items():
+            self.positive[index] = self.positive.get(index, 0) + count
+        for index, count in other.negative.items():
+            self.negative[index] = self.negative.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self._collapse(self.positive)
+        self._collapse(self.negative)
+
+    def _collapse(self, store: Dict[int, int]) -> None:
+        # Fold the smallest-magnitude buckets together once the store grows
+        # past its limit; accuracy is only lost for values close to zero.
+        while len(store) > self.max_buckets:
+            lowest, second = sorted(store)[:2]
+            store[second] += store.pop(lowest)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1)"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "positive": {str(k): v for k, v in self.positive.items()},
+            "negative": {str(k): v for k, v in self.negative.items()},
+            "zero_count": self.zero_count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data.get("relative_accuracy", 0.01), data.get("max_buckets", 2048))
+        sketch.positive = {int(k): v for k, v in data.get("positive", {}).items()}
+        sketch.negative = {int(k): v for k, v in data.get("negative", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        return sketch
+
+
+class RunningStats:
+    """
+    Running count/mean/variance (Welford), min/max and a quantile sketch.
+    Partial results from independent shards combine with merge() using
+    Chan's parallel update, so the order of merging does not matter.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float) -> None:
+        """Add a single observation"""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def update(self, values: Iterable[Optional[float]]) -> "RunningStats":
+        """Add several observations, skipping missing values"""
+        for value in values:
+            if value is not None:
+                self.add(value)
+        return self
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """Merge another set of running statistics into this one"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+        else:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self.m2 += other.m2 + delta * delta * self.count * other.count / total
+            self.count = total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Sample variance"""
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    def summary(self) -> Dict[str, Any]:
+        """Flat, numeric summary suitable for Experiment.metrics"""
+        if self.count == 0:
+            return {f"{METRIC_PREFIX}count": 0}
+        variance = self.variance
+        summary = {
+            f"{METRIC_PREFIX}count": self.count,
+            f"{METRIC_PREFIX}mean": self.mean,
+            f"{METRIC_PREFIX}variance": variance if variance is not None else 0.0,
+            f"{METRIC_PREFIX}std": math.sqrt(variance) if variance is not None else 0.0,
+            f"{METRIC_PREFIX}min": self.min,
+            f"{METRIC_PREFIX}max": self.max,
+        }
+        for name, q in SUMMARY_QUANTILES.items():
+            # Sketch estimates may overshoot slightly; keep them within range
+            value = self.sketch.quantile(q)
+            summary[f"{METRIC_PREFIX}{name}"] = min(max(value, self.min), self.max)
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "RunningStats":
+        stats = cls()
+        if not data:
+            return stats
+        stats.count = data.get("count", 0)
+        stats.mean = data.get("mean", 0.0)
+        stats.m2 = data.get("m2", 0.0)
+        stats.min = data.get("min")
+        stats.max = data.get("max")
+        if data.get("sketch"):
+            stats.sketch = QuantileSketch.from_dict(data["sketch"])
+        return stats
+
+
+def merge_experiment_stats(
+    db: Session,
+    experiment_id: int,
+    stats: RunningStats
+) -> Optional[Experiment]:
+    """
+    Merge partial prediction statistics into an experiment.
+    The experiment row is locked so concurrent shards cannot lose updates.
+    Does not commit: callers merge within the transaction that inserts the
+    predictions.
+    """
+    if stats.count == 0:
+        return None
+    experiment = db.query(Experiment).filter(
+        Experiment.id == experiment_id
+    ).populate_existing().with_for_update().first()
+    if not experiment:
+        return None
+
+    merged = RunningStats.from_dict(experiment.prediction_stats).merge(stats)
+    # Assign new objects so SQLAlchemy detects the JSON changes
+    experiment.prediction_stats = merged.to_dict()
+    experiment.metrics = {**(experiment.metrics or {}), **merged.summary()}
+    return experiment
+
+
+def record_experiment_predictions(
+    db: Session,
+    experiment_id: int,
+    values: Iterable[Optional[float]]
+) -> Optional[Experiment]:
+    """Fold newly attached prediction values into an experiment's statistics"""
+    return merge_experiment_stats(db, experiment_id, RunningStats().update(values))
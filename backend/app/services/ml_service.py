@@ -1,9 +1,14 @@
-import mlflow
-import numpy as np
 from typing import Dict, Any, List, Optional
-from rdkit import Chem
-from rdkit.Chem import Descriptors
 from app.core.config import settings
+from app.core.metrics import (
+    DESCRIPTOR_SECONDS,
+    MLFLOW_REQUEST_SECONDS,
+    MODEL_INFERENCE_SECONDS,
+    RDKIT_PARSE_SECONDS,
+)
+
+# mlflow, rdkit and numpy take over a second to import between them, so
+# they are imported on first use rather than with the API.
 
 # MLflow will be initialized lazily when needed
 _mlflow_initialized = False
@@ -13,69 +18,142 @@ def _ensure_mlflow_initialized():
     global _mlflow_initialized
     if not _mlflow_initialized:
         try:
+            import mlflow
             mlflow.set_tracking_uri(settings.MLFLOW_TRACKING_URI)
-            mlflow.set_experiment(settings.MLFLOW_EXPERIMENT_NAME)
+            with MLFLOW_REQUEST_SECONDS.labels(operation="set_experiment").time():
+                mlflow.set_experiment(settings.MLFLOW_EXPERIMENT_NAME)
             _mlflow_initialized = True
         except Exception:
             # MLflow not available, continue without it
             pass
 
 
+def _parse_smiles(smiles: str):
+    from rdkit import Chem
+    with RDKIT_PARSE_SECONDS.time():
+        return Chem.MolFromSmiles(smiles)
+
+
 def validate_smiles(smiles: str) -> bool:
     """Validate SMILES string"""
     try:
-        mol = Chem.MolFromSmiles(smiles)
+        mol = _parse_smiles(smiles)
         return mol is not None
     except:
         return False
 
 
+# Keys of the descriptor dict returned by molecular_properties
+DESCRIPTOR_NAMES = (
+    "molecular_weight", "logp", "num_atoms", "num_bonds", "num_rings", "num_aromatic_rings",
+    "num_rotatable_bonds", "tpsa", "hbd", "hba",
+)
+
+
+def molecular_properties(mol) -> Dict[str, Any]:
+    """Basic molecular properties of a parsed RDKit molecule"""
+    from rdkit.Chem import Descriptors
+    return {
+        "molecular_weight": Descriptors.MolWt(mol),
+        "logp": Descriptors.MolLogP(mol),
+        "num_atoms": mol.GetNumAtoms(),
+        "num_bonds": mol.GetNumBonds(),
+        "num_rings": Descriptors.RingCount(mol),
+        "num_aromatic_rings": Descriptors.NumAromaticRings(mol),
+        "num_rotatable_bonds": Descriptors.NumRotatableBonds(mol),
+        "tpsa": Descriptors.TPSA(mol),  # Topological Polar Surface Area
+        "hbd": Descriptors.NumHDonors(mol),  # Hydrogen Bond Donors
+        "hba": Descriptors.NumHAcceptors(mol),  # Hydrogen Bond Acceptors
+    }
+
+
 def calculate_molecular_properties(smiles: str) -> Dict[str, Any]:
     """Calculate basic molecular properties from SMILES"""
     try:
-        mol = Chem.MolFromSmiles(smiles)
+        mol = _parse_smiles(smiles)
         if mol is None:
             return {}
         
-        return {
-            "molecular_weight": Descriptors.MolWt(mol),
-            "logp": Descriptors.MolLogP(mol),
-            "num_atoms": mol.GetNumAtoms(),
-            "num_bonds": mol.GetNumBonds(),
-            "num_rings": Descriptors.RingCount(mol),
-            "num_aromatic_rings": Descriptors.NumAromaticRings(mol),
-            "num_rotatable_bonds": Descriptors.NumRotatableBonds(mol),
-            "tpsa": Descriptors.TPSA(mol),  # Topological Polar Surface Area
-            "hbd": Descriptors.NumHDonors(mol),  # Hydrogen Bond Donors
-            "hba": Descriptors.NumHAcceptors(mol),  # Hydrogen Bond Acceptors
-        }
+        with DESCRIPTOR_SECONDS.time():
+            return molecular_properties(mol)
     except Exception as e:
         print(f"Error calculating properties: {e}")
         return {}
 
 
+# The model heuristics below are written with numpy operations, so the same
+# code scores one molecule or arrays of descriptors (screening)
+
+def solubility_mg_ml(logp, mw):
+    """Solubility heuristic (not a real model, just for demonstration)"""
+    import numpy as np
+    # Higher logP and molecular weight typically reduce solubility
+    solubility_score = 1.0 / (1.0 + np.exp((logp - 2.0) / 2.0)) * (1.0 / (1.0 + mw / 500.0))
+    return solubility_score * 100  # Convert to mg/mL
+
+
+def toxicity_score(mw, num_rings):
+    """Toxicity heuristic (not a real model, just for demonstration)"""
+    import numpy as np
+    # Higher molecular weight and certain structural features increase toxicity risk
+    return np.minimum(1.0, (mw / 1000.0) * 0.3 + (num_rings / 10.0) * 0.2)
+
+
+def interaction_score(logp, mw):
+    """Drug-target interaction heuristic (not a real model)"""
+    import numpy as np
+    return 1.0 / (1.0 + np.exp(-(logp - 1.0))) * (1.0 / (1.0 + np.abs(mw - 300) / 100))
+
+
+# model type -> (score function, descriptor inputs, placeholder confidence)
+MODEL_SCORERS = {
+    "solubility": (solubility_mg_ml, ("logp", "molecular_weight"), 0.75),
+    "toxicity": (toxicity_score, ("molecular_weight", "num_rings"), 0.70),
+    "dti": (interaction_score, ("logp", "molecular_weight"), 0.65),
+}
+
+
+def predict_values(model_type: str, descriptors: Dict[str, Any]):
+    """Prediction values for descriptor arrays (name -> numpy array) in one vectorized pass"""
+    score, inputs, _ = MODEL_SCORERS[model_type]
+    return score(*(descriptors[name] for name in inputs))
+
+
+def _registered_value(model_type: str, model_name: Optional[str], properties: Dict[str, Any]):
+    """
+    (value, version) from the model registered under model_name, or None
+    when there is no registry or no such model and the heuristic applies
+    """
+    from app.services.model_registry import get_registered_model
+    model = get_registered_model(model_type, model_name)
+    if model is None:
+        return None
+    return model.predict([properties])[0], model.version
+
+
+@MODEL_INFERENCE_SECONDS.labels(model="solubility").time()
 def predict_solubility(smiles: str, model_name: str = "solubility_model") -> Dict[str, Any]:
     """
-    Predict solubility using a simple QSAR model
-    In production, this would load a trained model from MLflow
+    Predict solubility with the model registered as model_name, or a
+    simple QSAR heuristic when there is none
     """
     try:
         properties = calculate_molecular_properties(smiles)
         if not properties:
             return {"error": "Invalid SMILES"}
         
-        # Simple rule-based prediction (replace with actual ML model)
-        # Higher logP and molecular weight typically reduce solubility
-        logp = properties.get("logp", 0)
-        mw = properties.get("molecular_weight", 0)
+        registered = _registered_value("solubility", model_name, properties)
+        if registered:
+            value, version = registered
+        else:
+            # Simple rule-based prediction
+            logp = properties.get("logp", 0)
+            mw = properties.get("molecular_weight", 0)
+            value, version = float(solubility_mg_ml(logp, mw)), None
         
-        # Simple heuristic (not a real model, just for demonstration)
-        solubility_score = 1.0 / (1.0 + np.exp((logp - 2.0) / 2.0)) * (1.0 / (1.0 + mw / 500.0))
-        solubility_mg_ml = solubility_score * 100  # Convert to mg/mL
-        
-        return {
-            "prediction_value": float(solubility_mg_ml),
-            "prediction_confidence": 0.75,  # Placeholder
+        result = {
+            "prediction_value": value,
+            "prediction_confidence": MODEL_SCORERS["solubility"][2],  # Placeholder
             "prediction_details": {
                 "model_type": "qsar",
                 "model_name": model_name,
@@ -83,32 +161,37 @@ def predict_solubility(smiles: str, model_name: str = "solubility_model") -> Dic
                 "units": "mg/mL"
             }
         }
+        if version:
+            result["prediction_details"]["model_version"] = version
+        return result
     except Exception as e:
         return {"error": str(e)}
 
 
+@MODEL_INFERENCE_SECONDS.labels(model="toxicity").time()
 def predict_toxicity(smiles: str, model_name: str = "toxicity_model") -> Dict[str, Any]:
     """
-    Predict toxicity using a simple QSAR model
-    In production, this would load a trained model from MLflow
+    Predict toxicity with the model registered as model_name, or a simple
+    QSAR heuristic when there is none
     """
     try:
         properties = calculate_molecular_properties(smiles)
         if not properties:
             return {"error": "Invalid SMILES"}
         
-        # Simple rule-based prediction (replace with actual ML model)
-        # Higher molecular weight and certain structural features increase toxicity risk
-        mw = properties.get("molecular_weight", 0)
-        num_rings = properties.get("num_rings", 0)
-        
-        # Simple heuristic (not a real model, just for demonstration)
-        toxicity_score = min(1.0, (mw / 1000.0) * 0.3 + (num_rings / 10.0) * 0.2)
-        is_toxic = toxicity_score > 0.5
+        registered = _registered_value("toxicity", model_name, properties)
+        if registered:
+            score, version = registered
+        else:
+            # Simple rule-based prediction
+            mw = properties.get("molecular_weight", 0)
+            num_rings = properties.get("num_rings", 0)
+            score, version = float(toxicity_score(mw, num_rings)), None
+        is_toxic = score > 0.5
         
-        return {
-            "prediction_value": float(toxicity_score),
-            "prediction_confidence": 0.70,  # Placeholder
+        result = {
+            "prediction_value": score,
+            "prediction_confidence": MODEL_SCORERS["toxicity"][2],  # Placeholder
             "prediction_details": {
                 "model_type": "toxicity",
                 "model_name": model_name,
@@ -117,43 +200,52 @@ def predict_toxicity(smiles: str, model_name: str = "toxicity_model") -> Dict[st
                 "risk_level": "high" if is_toxic else "low"
             }
         }
+        if version:
+            result["prediction_details"]["model_version"] = version
+        return result
     except Exception as e:
         return {"error": str(e)}
 
 
+@MODEL_INFERENCE_SECONDS.labels(model="dti").time()
 def predict_drug_target_interaction(
     smiles: str,
     target_id: Optional[str] = None,
     model_name: str = "dti_model"
 ) -> Dict[str, Any]:
     """
-    Predict drug-target interaction
-    In production, this would use a GNN or other advanced model
+    Predict drug-target interaction with the model registered as
+    model_name, or a simple heuristic when there is none
     """
     try:
         properties = calculate_molecular_properties(smiles)
         if not properties:
             return {"error": "Invalid SMILES"}
         
-        # Simple rule-based prediction (replace with actual GNN model)
-        # This is a placeholder - real DTI models are much more complex
-        mw = properties.get("molecular_weight", 0)
-        logp = properties.get("logp", 0)
-        
-        # Simple heuristic (not a real model)
-        interaction_score = 1.0 / (1.0 + np.exp(-(logp - 1.0))) * (1.0 / (1.0 + abs(mw - 300) / 100))
+        registered = _registered_value("dti", model_name, properties)
+        if registered:
+            score, version = registered
+        else:
+            # Simple rule-based prediction
+            # This is a placeholder - real DTI models are much more complex
+            mw = properties.get("molecular_weight", 0)
+            logp = properties.get("logp", 0)
+            score, version = float(interaction_score(logp, mw)), None
         
-        return {
-            "prediction_value": float(interaction_score),
-            "prediction_confidence": 0.65,  # Placeholder
+        result = {
+            "prediction_value": score,
+            "prediction_confidence": MODEL_SCORERS["dti"][2],  # Placeholder
             "prediction_details": {
                 "model_type": "dti",
                 "model_name": model_name,
                 "target_id": target_id or "unknown",
                 "properties_used": properties,
-                "interaction_probability": float(interaction_score)
+                "interaction_probability": score
             }
         }
+        if version:
+            result["prediction_details"]["model_version"] = version
+        return result
     except Exception as e:
         return {"error": str(e)}
 
@@ -168,7 +260,8 @@ def log_prediction_to_mlflow(
     """Log prediction run to MLflow"""
     _ensure_mlflow_initialized()
     try:
-        with mlflow.start_run(run_name=run_name):
+        import mlflow
+        with MLFLOW_REQUEST_SECONDS.labels(operation="log_run").time(), mlflow.start_run(run_name=run_name):
             mlflow.log_params(parameters)
             mlflow.log_metrics(metrics)
             mlflow.log_dict(predictions, "predictions.json")
@@ -0,0 +1,341 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import MODEL_CACHE_BYTES, MODEL_CACHE_EVENTS, MODEL_LOAD_SECONDS
+from app.services.ml_service import DESCRIPTOR_NAMES
+
+logger = logging.getLogger(__name__)
+
+# mlflow, pandas and the model flavours are imported on first load, not
+# with the API
+
+# (model type, registered model name, stage or version number)
+ModelRef = Tuple[str, str, str]
+
+
+class ModelRegistryError(Exception):
+    """Raised when a registered model cannot be used for a model type"""
+    pass
+
+
+class LoadedModel(NamedTuple):
+    """A registered model version held in memory"""
+    model_type: str
+    name: str
+    version: str
+    model: Any  # mlflow.pyfunc.PyFuncModel
+    size_bytes: int
+
+    def predict(self, descriptors: List[Dict[str, Any]]) -> List[float]:
+        """One value per descriptor dict (see molecular_properties)"""
+        import numpy as np
+        import pandas as pd
+        frame = pd.DataFrame(descriptors, columns=list(DESCRIPTOR_NAMES))
+        return np.asarray(self.model.predict(frame), dtype=float).ravel().tolist()
+
+
+def parse_model_name(model_name: str) -> Tuple[str, str]:
+    """Split "name", "name/Staging" or "name/3" into (name, stage or version)"""
+    name, _, selector = model_name.partition("/")
+    return name, selector or settings.MODEL_DEFAULT_STAGE
+
+
+def _is_registry_failure(error: Exception) -> bool:
+    """Whether error means the registry (or its artifact store) failed, not the caller"""
+    import requests
+    from mlflow.exceptions import MlflowException
+    return isinstance(error, (MlflowException, requests.RequestException, OSError))
+
+
+def _directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class ModelRegistry:
+    """
+    Resolves (model type, model name, stage or version) to a model loaded
+    from the MLflow model registry.
+
+    Loaded versions live in an LRU cache bounded by max_bytes, using the
+    artifact size as the estimate of their memory. Each reference points at
+    a loaded version through an alias table; refresh() re-resolves stages,
+    loads any new version first and only then swaps the alias, so requests
+    never wait on a load after the first and in-flight ones finish on the
+    version they started with. Names that are not registered resolve to
+    None (callers use the built-in heuristics) until the next refresh.
+    When the registry cannot be reached or fails, a reference resolves to
+    None for retry_seconds before it is looked up again.
+    """
+
+    def __init__(self, registry_uri: str, max_bytes: int, retry_seconds: float = 30.0):
+        self.registry_uri = registry_uri
+        self.max_bytes = max_bytes
+        self.retry_seconds = retry_seconds
+        self._models: "OrderedDict[Tuple[str, str], LoadedModel]" = OrderedDict()
+        self._aliases: Dict[ModelRef, Optional[LoadedModel]] = {}
+        # Reference -> monotonic time until which its lookup is not retried
+        self._unavailable: Dict[ModelRef, float] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Any, threading.Lock] = {}
+        self._client = None
+        self._refresher_pid: Optional[int] = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from mlflow.tracking import MlflowClient
+            self._client = MlflowClient(tracking_uri=self.registry_uri, registry_uri=self.registry_uri)
+        return self._client
+
+    @property
+    def cached_bytes(self) -> int:
+        return sum(model.size_bytes for model in self._models.values())
+
+    def get(self, model_type: str, model_name: str) -> Optional[LoadedModel]:
+        """The model a reference currently points at, loading it on first use"""
+        self._start_refresher()
+        name, selector = parse_model_name(model_name)
+        ref = (model_type, name, selector)
+        with self._lock:
+            if ref in self._aliases:
+                return self._hit(ref)
+            if self._unavailable.get(ref, 0) > time.monotonic():
+                return None
+        with self._load_lock(ref):
+            # Another thread may have resolved it (or failed to) while we waited
+            with self._lock:
+                if ref in self._aliases:
+                    return self._hit(ref)
+                if self._unavailable.get(ref, 0) > time.monotonic():
+                    return None
+            MODEL_CACHE_EVENTS.labels(event="miss").inc()
+            try:
+                model = self._resolve(ref)
+            except ModelRegistryError:
+                raise
+            except Exception as e:
+                if not _is_registry_failure(e):
+                    raise
+                logger.warning(
+                    "Model registry lookup of %s/%s failed, using the heuristic for %ss: %s",
+                    name, selector, self.retry_seconds, e,
+                )
+                MODEL_CACHE_EVENTS.labels(event="error").inc()
+                with self._lock:
+                    self._unavailable[ref] = time.monotonic() + self.retry_seconds
+                return None
+            with self._lock:
+                self._aliases[ref] = model
+                self._unavailable.pop(ref, None)
+        return model
+
+    def refresh(self) -> int:
+        """
+        Re-resolve every reference in use and swap in versions that changed.
+        Returns the number of swapped references. A reference whose lookup
+        or load fails keeps its current version.
+        """
+        with self._lock:
+            current = dict(self._aliases)
+        swapped = 0
+        for ref, model in current.items():
+            try:
+                latest = self._resolve(ref)
+            except Exception as e:
+                logger.warning("Could not refresh model %s/%s: %s", ref[1], ref[2], e)
+                continue
+            if (latest and latest.version) != (model and model.version):
+                with self._lock:
+                    self._aliases[ref] = latest
+                MODEL_CACHE_EVENTS.labels(event="swap").inc()
+                logger.info(
+                    "Model %s/%s now serves version %s (was %s)",
+                    ref[1], ref[2], latest and latest.version, model and model.version,
+                )
+                swapped += 1
+        return swapped
+
+    def _hit(self, ref: ModelRef) -> Optional[LoadedModel]:
+        # Called with self._lock held
+        model = self._aliases[ref]
+        if model is not None:
+            if (model.name, model.version) in self._models:
+                self._models.move_to_end((model.name, model.version))
+            MODEL_CACHE_EVENTS.labels(event="hit").inc()
+        return model
+
+    def _load_lock(self, key: Any) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def _resolve(self, ref: ModelRef) -> Optional[LoadedModel]:
+        """Look the reference up in the registry and load that version"""
+        from mlflow.exceptions import MlflowException
+        model_type, name, selector = ref
+        try:
+            if selector.isdigit():
+                version = self.client.get_model_version(name, selector)
+            else:
+                versions = self.client.get_latest_versions(name, stages=[selector])
+                if not versions:
+                    return None
+                version = max(versions, key=lambda v: int(v.version))
+        except MlflowException as e:
+            if e.error_code == "RESOURCE_DOES_NOT_EXIST":
+                return None
+            raise
+        registered_type = version.tags.get("model_type")
+        if registered_type is None:
+            registered_type = self.client.get_registered_model(name).tags.get("model_type")
+        if registered_type and registered_type != model_type:
+            raise ModelRegistryError(f"Registered model {name} is a {registered_type} model, not {model_type}")
+        return self._load(model_type, name, str(version.version))
+
+    def _load(self, model_type: str, name: str, version: str) -> LoadedModel:
+        key = (name, version)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+        with self._load_lock(key):
+            with self._lock:
+                if key in self._models:
+                    return self._models[key]
+            import mlflow
+            start = time.perf_counter()
+            source = self.client.get_model_version_download_uri(name, version)
+            path = mlflow.artifacts.download_artifacts(artifact_uri=source, tracking_uri=self.registry_uri)
+            model = LoadedModel(model_type, name, version, mlflow.pyfunc.load_model(path), _directory_size(path))
+            MODEL_LOAD_SECONDS.labels(model_type=model_type).observe(time.perf_counter() - start)
+            with self._lock:
+                self._models[key] = model
+                self._evict(keep=key)
+                MODEL_CACHE_BYTES.set(self.cached_bytes)
+            return model
+
+    def _evict(self, keep: Tuple[str, str]) -> None:
+        # Called with self._lock held. The newest model always stays, even
+        # if it alone is over the limit
+        while self.cached_bytes > self.max_bytes and len(self._models) > 1:
+            key = next(k for k in self._models if k != keep)
+            evicted = self._models.pop(key)
+            # Drop references to it so the memory is freed once in-flight
+            # requests finish; their next use loads it again
+            for ref in [r for r, model in self._aliases.items() if model is evicted]:
+                del self._aliases[ref]
+            MODEL_CACHE_EVENTS.labels(event="eviction").inc()
+
+    def _after_fork(self) -> None:
+        # Locks may have been held by parent threads that do not exist here
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _start_refresher(self) -> None:
+        # Threads do not survive fork, so each process starts its own
+        pid = os.getpid()
+        if settings.MODEL_REFRESH_SECONDS <= 0 or self._refresher_pid == pid:
+            return
+        with self._lock:
+            if self._refresher_pid == pid:
+                return
+            self._refresher_pid = pid
+        threading.Thread(target=self._refresh_forever, name="model-refresh", daemon=True).start()
+
+    def _refresh_forever(self) -> None:
+        while True:
+            time.sleep(settings.MODEL_REFRESH_SECONDS)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Model refresh failed")
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def _before_fork() -> None:
+    # Fork with the tables unlocked and consistent
+    if _registry is not None:
+        _registry._lock.acquire()
+
+
+def _after_fork_in_parent() -> None:
+    if _registry is not None:
+        _registry._lock.release()
+
+
+def _after_fork_in_child() -> None:
+    if _registry is not None:
+        _registry._after_fork()
+
+
+os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_after_fork_in_child)
+
+
+def get_model_registry() -> Optional[ModelRegistry]:
+    """The process-wide registry, or None when MODEL_REGISTRY_URI is not set"""
+    global _registry
+    if _registry is None and settings.MODEL_REGISTRY_URI:
+        _registry = ModelRegistry(
+            settings.MODEL_REGISTRY_URI, settings.MODEL_CACHE_MAX_BYTES, settings.MODEL_REGISTRY_RETRY_SECONDS
+        )
+    return _registry
+
+
+def get_registered_model(model_type: str, model_name: Optional[str]) -> Optional[LoadedModel]:
+    """The registry model for a prediction, or None to use the built-in heuristic"""
+    registry = get_model_registry()
+    if registry is None or not model_name:
+        return None
+    return registry.get(model_type, model_name)
+
+
+def preload_models(spec: Optional[str] = None) -> List[LoadedModel]:
+    """
+    Load the "model_type:model_name[/stage]" models listed in MODEL_PRELOAD
+    so the first requests a worker serves do not wait for downloads
+    """
+    spec = settings.MODEL_PRELOAD if spec is None else spec
+    loaded = []
+    for entry in filter(None, (item.strip() for item in spec.split(","))):
+        model_type, _, model_name = entry.partition(":")
+        try:
+            model = get_registered_model(model_type, model_name)
+        except Exception as e:
+            logger.warning("Could not preload model %s: %s", entry, e)
+            continue
+        if model is None:
+            logger.warning("Model %s is not in the registry", entry)
+        else:
+            loaded.append(model)
+    return loaded
+
+
+def preload_before_fork() -> List[LoadedModel]:
+    """
+    Load the MODEL_PRELOAD models in a parent process (the Gunicorn master,
+    the Celery main process) before it forks its workers. Workers inherit
+    them and share their pages copy-on-write instead of loading a copy
+    each. Everything allocated so far is moved out of the garbage
+    collector's reach, as a collection in a worker would otherwise write to
+    the object headers and copy the pages they sit on. The parent keeps
+    refreshing, so workers forked later start with the current versions.
+    """
+    # The libraries predictions import on first use, so workers share them too
+    import numpy
+    from rdkit.Chem import Descriptors
+    models = preload_models()
+    gc.collect()
+    gc.freeze()
+    return models
@@ -0,0 +1,383 @@
+import base64
+import heapq
+import json
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import Select, exists, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, joinedload
+from app.core.config import settings
+from app.models.compound import Compound
+from app.models.experiment import LatestPrediction, Prediction
+from app.models.job import Job
+from app.services.ml_service import DESCRIPTOR_NAMES
+
+# Newest first; id breaks ties between predictions stored in one
+# transaction, which share created_at, so pages are stable. Every query
+# here is served by one of the composite indexes on Prediction.
+NEWEST_FIRST = (Prediction.created_at.desc(), Prediction.id.desc())
+
+# Loader options for queries whose rows are returned with
+# prediction_details, which is rebuilt from these references
+WITH_DETAILS = (joinedload(Prediction.model_version), joinedload(Prediction.descriptor_set))
+
+
+def user_predictions_query(
+    user_id: int,
+    model_type: Optional[str] = None,
+    compound_id: Optional[int] = None
+) -> Select:
+    """A user's predictions with details, newest first, optionally for one model type or compound"""
+    query = select(Prediction).options(*WITH_DETAILS).filter(Prediction.user_id == user_id)
+    if model_type:
+        query = query.filter(Prediction.model_type == model_type)
+    if compound_id:
+        query = query.filter(Prediction.compound_id == compound_id)
+    return query.order_by(*NEWEST_FIRST)
+
+
+def experiment_predictions_query(experiment_id: int) -> Select:
+    """An experiment's predictions with compound names, by compound"""
+    return select(Prediction, Compound.name).outerjoin(
+        Compound, Compound.id == Prediction.compound_id
+    ).filter(
+        Prediction.experiment_id == experiment_id
+    ).order_by(Prediction.compound_id, Prediction.id)
+
+
+BATCH_JOB_TYPE = "batch_prediction"
+
+
+async def create_batch_prediction_job(
+    db: AsyncSession,
+    compound_ids: List[int],
+    model_type: str,
+    user_id: int,
+    model_name: Optional[str] = None,
+    experiment_id: Optional[int] = None
+) -> Job:
+    """Record a pending batch prediction job for run_batch_prediction_task to pick up"""
+    # The job's cursor is a position in this list, so it is fixed here
+    compound_ids = list(dict.fromkeys(compound_ids))
+    job = Job(
+        job_type=BATCH_JOB_TYPE,
+        status="pending",
+        user_id=user_id,
+        parameters={
+            "compound_ids": compound_ids,
+            "model_type": model_type,
+            "model_name": model_name,
+            "experiment_id": experiment_id,
+        },
+        total=len(compound_ids),
+        processed=0,
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+# Keyset order of latest-prediction listings
+LATEST_ORDER = (LatestPrediction.compound_id, LatestPrediction.model_type, LatestPrediction.model_key)
+
+
+def record_latest_predictions(db: Session, predictions: Iterable[Prediction]) -> None:
+    """
+    Upsert LatestPrediction rows for new predictions, in the caller's
+    transaction. A row is only replaced by a later prediction (higher id),
+    so concurrent writers settle on the newest one. Costs one statement
+    however many predictions the batch has.
+    """
+    db.flush()
+    latest = {}
+    for prediction in predictions:
+        key = (prediction.user_id, prediction.compound_id, prediction.model_type, prediction.model_name or "")
+        if key not in latest or latest[key].id < prediction.id:
+            latest[key] = prediction
+    if not latest:
+        return
+    source = select(
+        Prediction.user_id,
+        Prediction.compound_id,
+        Prediction.model_type,
+        func.coalesce(Prediction.model_name, ""),
+        Prediction.id,
+        Prediction.experiment_id,
+        Prediction.prediction_value,
+        Prediction.prediction_confidence,
+        Prediction.created_at,
+    ).where(Prediction.id.in_([p.id for p in latest.values()]))
+    table = LatestPrediction.__table__
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    statement = insert(table).from_select([
+        "user_id", "compound_id", "model_type", "model_name", "prediction_id", "experiment_id",
+        "prediction_value", "prediction_confidence", "created_at",
+    ], source)
+    updated = ("prediction_id", "experiment_id", "prediction_value", "prediction_confidence", "created_at")
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key.columns],
+        set_={name: statement.excluded[name] for name in updated},
+        where=table.c.prediction_id < statement.excluded.prediction_id,
+    ))
+
+
+def encode_latest_cursor(row: LatestPrediction) -> str:
+    """Opaque keyset cursor pointing after row"""
+    key = json.dumps([row.compound_id, row.model_type, row.model_key])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_latest_cursor(cursor: str) -> Tuple[int, str, str]:
+    """Inverse of encode_latest_cursor; raises ValueError for malformed cursors"""
+    try:
+        compound_id, model_type, model_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(compound_id, int) or not isinstance(model_type, str) or not isinstance(model_key, str):
+        raise ValueError("Invalid cursor")
+    return compound_id, model_type, model_key
+
+
+def latest_predictions_query(
+    user_id: int,
+    model_type: Optional[str] = None,
+    model_name: Optional[str] = None,
+    compound_ids: Optional[List[int]] = None,
+    after: Optional[Tuple[int, str, str]] = None
+) -> Select:
+    """
+    A user's latest prediction per compound and model, in keyset order,
+    starting after the given key. Served by the primary key, or by the
+    (user_id, model_type, compound_id, model_name) index when filtering
+    by model type.
+    """
+    query = select(LatestPrediction).filter(LatestPrediction.user_id == user_id)
+    if model_type:
+        query = query.filter(LatestPrediction.model_type == model_type)
+    if model_name is not None:
+        query = query.filter(LatestPrediction.model_key == model_name)
+    if compound_ids:
+        query = query.filter(LatestPrediction.compound_id.in_(compound_ids))
+    if after is not None:
+        query = query.filter(tuple_(*LATEST_ORDER) > tuple_(*after))
+    return query.order_by(*LATEST_ORDER)
+
+
+class Objective(NamedTuple):
+    """A ranking term: weight * latest prediction value of a model"""
+    model_type: str
+    model_name: Optional[str]
+    weight: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.model_type}/{self.model_name}" if self.model_name else self.model_type
+
+
+def parse_objective(spec: str) -> Objective:
+    """
+    Parse "model_type[/model_name][:weight]". Positive weights rank high
+    values first, negative weights low values first; the default is 1.
+    """
+    target, _, weight = spec.partition(":")
+    model_type, _, model_name = target.partition("/")
+    try:
+        weight = float(weight) if weight else 1.0
+    except ValueError:
+        raise ValueError(f"Invalid objective weight: {spec}")
+    if not model_type or weight == 0:
+        raise ValueError(f"Invalid objective: {spec}")
+    return Objective(model_type, model_name or None, weight)
+
+
+def parse_descriptor_range(spec: str) -> Tuple[str, Optional[float], Optional[float]]:
+    """Parse "descriptor:min:max"; either bound may be empty"""
+    name, _, bounds = spec.partition(":")
+    low, _, high = bounds.partition(":")
+    if name not in DESCRIPTOR_NAMES:
+        raise ValueError(f"Unknown descriptor: {name}")
+    try:
+        return name, float(low) if low else None, float(high) if high else None
+    except ValueError:
+        raise ValueError(f"Invalid descriptor range: {spec}")
+
+
+def _descriptor_conditions(ranges: List[Tuple[str, Optional[float], Optional[float]]]) -> list:
+    conditions = []
+    for name, low, high in ranges:
+        # molecular_weight has its own column; the rest live in properties
+        column = Compound.molecular_weight if name == "molecular_weight" else Compound.properties[name].as_float()
+        if low is not None:
+            conditions.append(column >= low)
+        if high is not None:
+            conditions.append(column <= high)
+    return conditions
+
+
+def _latest_conditions(user_id: int, experiment_id: Optional[int]) -> list:
+    conditions = [LatestPrediction.user_id == user_id, LatestPrediction.prediction_value.isnot(None)]
+    if experiment_id:
+        conditions.append(LatestPrediction.experiment_id == experiment_id)
+    return conditions
+
+
+def top_single_query(
+    user_id: int,
+    objective: Objective,
+    experiment_id: Optional[int] = None,
+    ranges: Optional[list] = None,
+    limit: int = 100
+) -> Select:
+    """
+    (compound_id, value) of the best latest predictions for one objective:
+    ORDER BY value LIMIT k, walking the (user_id, model_type,
+    prediction_value, compound_id) index from the best end. Without a
+    model name only each compound's newest row counts, as in _score.
+    """
+    direction = (lambda c: c.desc()) if objective.weight > 0 else (lambda c: c.asc())
+    query = select(LatestPrediction.compound_id, LatestPrediction.prediction_value).filter(
+        *_latest_conditions(user_id, experiment_id),
+        LatestPrediction.model_type == objective.model_type,
+    )
+    if objective.model_name:
+        query = query.filter(LatestPrediction.model_key == objective.model_name)
+    else:
+        # Anti-join on the primary key rather than a window, so the scan
+        # still stops after k rows
+        newer = aliased(LatestPrediction)
+        conditions = [
+            newer.user_id == LatestPrediction.user_id,
+            newer.compound_id == LatestPrediction.compound_id,
+            newer.model_type == LatestPrediction.model_type,
+            newer.prediction_id > LatestPrediction.prediction_id,
+            newer.prediction_value.isnot(None),
+        ]
+        if experiment_id:
+            conditions.append(newer.experiment_id == experiment_id)
+        query = query.filter(~exists().where(*conditions))
+    if ranges:
+        query = query.join(Compound, Compound.id == LatestPrediction.compound_id).filter(
+            *_descriptor_conditions(ranges)
+        )
+    return query.order_by(
+        direction(LatestPrediction.prediction_value), direction(LatestPrediction.compound_id)
+    ).limit(limit)
+
+
+def _score(objectives: List[Objective], rows: list) -> Optional[Tuple[float, Dict[str, float]]]:
+    """Weighted score of one compound's rows, or None when an objective is missing"""
+    values = {}
+    for objective in objectives:
+        matching = [
+            row for row in rows
+            if row.model_type == objective.model_type
+            and (objective.model_name is None or row.model_key == objective.model_name)
+        ]
+        if not matching:
+            return None
+        # Several model names without one asked for: the newest prediction
+        values[objective.key] = max(matching, key=lambda row: row.prediction_id).prediction_value
+    return sum(o.weight * values[o.key] for o in objectives), values
+
+
+async def _top_streaming(
+    db: AsyncSession,
+    user_id: int,
+    objectives: List[Objective],
+    experiment_id: Optional[int],
+    ranges: list,
+    limit: int
+) -> List[Tuple[float, int, Dict[str, float]]]:
+    """
+    Scan the user's latest predictions for the objectives' model types in
+    primary key (compound) order, TOP_K_CHUNK_SIZE rows per query, scoring
+    each compound once its rows are complete and keeping the best k in a
+    heap. Memory is bounded by k plus one chunk.
+    """
+    # Plain rows rather than entities, so the session does not keep them
+    query = select(
+        LatestPrediction.compound_id,
+        LatestPrediction.model_type,
+        LatestPrediction.model_key.label("model_key"),
+        LatestPrediction.prediction_id,
+        LatestPrediction.prediction_value,
+    ).filter(
+        *_latest_conditions(user_id, experiment_id),
+        LatestPrediction.model_type.in_({o.model_type for o in objectives}),
+    )
+    if ranges:
+        query = query.join(Compound, Compound.id == LatestPrediction.compound_id).filter(
+            *_descriptor_conditions(ranges)
+        )
+    query = query.order_by(*LATEST_ORDER)
+
+    heap: List[Tuple[float, int, Dict[str, float]]] = []
+
+    def offer(compound_rows):
+        scored = _score(objectives, compound_rows)
+        if scored is None:
+            return
+        # Ties go to the lower compound id
+        entry = (scored[0], -compound_rows[0].compound_id, scored[1])
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    group: list = []
+    after = None
+    while True:
+        chunk_query = query if after is None else query.filter(tuple_(*LATEST_ORDER) > tuple_(*after))
+        chunk = (await db.execute(chunk_query.limit(settings.TOP_K_CHUNK_SIZE))).all()
+        for row in chunk:
+            if group and row.compound_id != group[0].compound_id:
+                offer(group)
+                group = []
+            group.append(row)
+        if len(chunk) < settings.TOP_K_CHUNK_SIZE:
+            break
+        last = chunk[-1]
+        after = (last.compound_id, last.model_type, last.model_key)
+    if group:
+        offer(group)
+    return [(score, -negated_id, values) for score, negated_id, values in sorted(heap, reverse=True)]
+
+
+async def top_compounds(
+    db: AsyncSession,
+    user_id: int,
+    objectives: List[Objective],
+    experiment_id: Optional[int] = None,
+    descriptor_ranges: Optional[list] = None,
+    limit: int = 100
+) -> List[Dict]:
+    """
+    Rank compounds by the weighted sum of their latest predictions. One
+    objective is an index-backed ORDER BY ... LIMIT in SQL; several are
+    combined in a streaming top-k over latest_predictions. Neither loads
+    more than k results (plus one chunk) into memory.
+    """
+    ranges = descriptor_ranges or []
+    if len(objectives) == 1:
+        objective = objectives[0]
+        rows = (await db.execute(top_single_query(user_id, objective, experiment_id, ranges, limit))).all()
+        ranked = [(objective.weight * value, compound_id, {objective.key: value}) for compound_id, value in rows]
+    else:
+        ranked = await _top_streaming(db, user_id, objectives, experiment_id, ranges, limit)
+    compounds = {
+        c.id: c for c in (await db.execute(
+            select(Compound.id, Compound.name, Compound.smiles).filter(Compound.id.in_([r[1] for r in ranked]))
+        )).all()
+    }
+    return [
+        {
+            "compound_id": compound_id,
+            "compound_name": compounds[compound_id].name if compound_id in compounds else None,
+            "smiles": compounds[compound_id].smiles if compound_id in compounds else None,
+            "score": score,
+            "predictions": values,
+        }
+        for score, compound_id, values in ranked
+    ]
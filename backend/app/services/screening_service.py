@@ -0,0 +1,289 @@
+import asyncio
+import heapq
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import SCREENED_MOLECULES
+from app.models.compound import Compound
+from app.models.experiment import Prediction
+from app.services.ml_service import (
+    MODEL_SCORERS,
+    molecular_properties,
+    predict_drug_target_interaction,
+    predict_solubility,
+    predict_toxicity,
+    predict_values,
+)
+from app.services.prediction_service import Objective, record_latest_predictions
+
+PREDICTORS = {
+    "solubility": predict_solubility,
+    "toxicity": predict_toxicity,
+    "dti": predict_drug_target_interaction,
+}
+
+# (line number, SMILES, optional identifier from the second column)
+Record = Tuple[int, str, Optional[str]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+class ScreeningInputError(Exception):
+    """Raised when the uploaded SMILES stream cannot be read"""
+    pass
+
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, int]:
+    """The shared screening process pool, started on first use"""
+    global _pool, _pool_workers
+    if _pool is None:
+        _pool_workers = settings.SCREENING_WORKERS or os.cpu_count() or 1
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=_pool_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool, _pool_workers
+
+
+def shutdown_screening_pool() -> None:
+    """Stop the screening workers"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def rule_of_five_violations(properties: Dict[str, Any]) -> int:
+    """Number of Lipinski rule-of-five criteria a molecule fails"""
+    return sum((
+        properties["molecular_weight"] > 500,
+        properties["logp"] > 5,
+        properties["hbd"] > 5,
+        properties["hba"] > 10,
+    ))
+
+
+def screen_chunk(
+    records: List[Record],
+    model_types: List[str],
+    max_violations: Optional[int],
+    include_descriptors: bool
+) -> List[Dict[str, Any]]:
+    """
+    Parse, pre-filter and score one chunk of SMILES. Runs in a worker
+    process; the models score all molecules that pass in one vectorized
+    call each.
+    """
+    import numpy as np
+    from rdkit import Chem, RDLogger
+    RDLogger.DisableLog("rdApp.*")
+
+    results, passed, descriptors = [], [], []
+    for line, smiles, name in records:
+        result = {"line": line, "smiles": smiles, "id": name}
+        results.append(result)
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            result["error"] = "Invalid SMILES"
+            continue
+        properties = molecular_properties(mol)
+        if include_descriptors:
+            result["descriptors"] = properties
+        if max_violations is not None:
+            result["ro5_violations"] = violations = rule_of_five_violations(properties)
+            if violations > max_violations:
+                result["passed"] = False
+                continue
+        result["passed"] = True
+        passed.append(result)
+        descriptors.append(properties)
+
+    if passed:
+        inputs = {name for model_type in model_types for name in MODEL_SCORERS[model_type][1]}
+        arrays = {name: np.array([d[name] for d in descriptors], dtype=float) for name in inputs}
+        for result in passed:
+            result["predictions"] = {}
+        for model_type in model_types:
+            for result, value in zip(passed, predict_values(model_type, arrays).tolist()):
+                result["predictions"][model_type] = value
+    return results
+
+
+def _parse_line(line_number: int, raw: bytes) -> Optional[Record]:
+    text = raw.decode("utf-8", errors="replace").strip()
+    if not text or text.startswith("#"):
+        return None
+    fields = text.split(None, 1)
+    return line_number, fields[0], fields[1].strip() if len(fields) > 1 else None
+
+
+async def iter_record_chunks(body: AsyncIterator[bytes], size: int) -> AsyncIterator[List[Record]]:
+    """
+    Split a streamed upload of "SMILES [id]" lines into chunks of records.
+    Only the current chunk and one partial line are held in memory.
+    """
+    buffer = b""
+    line_number = 0
+    chunk: List[Record] = []
+    async for data in body:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > settings.SCREENING_MAX_LINE_BYTES:
+            raise ScreeningInputError(f"Line {line_number + len(lines) + 1} is too long")
+        for raw in lines:
+            line_number += 1
+            record = _parse_line(line_number, raw)
+            if record:
+                chunk.append(record)
+        if len(chunk) >= size:
+            for start in range(0, len(chunk) - size + 1, size):
+                yield chunk[start:start + size]
+            chunk = chunk[len(chunk) - len(chunk) % size:]
+    if buffer:
+        record = _parse_line(line_number + 1, buffer)
+        if record:
+            chunk.append(record)
+    if chunk:
+        yield chunk
+
+
+def _ndjson(obj: Any) -> bytes:
+    return orjson.dumps(obj) + b"\n"
+
+
+async def screen_stream(
+    body: AsyncIterator[bytes],
+    user_id: int,
+    model_types: List[str],
+    max_violations: Optional[int] = 1,
+    include_descriptors: bool = False,
+    top_k: Optional[int] = None,
+    objectives: Optional[List[Objective]] = None,
+    persist: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Screen an uploaded SMILES stream, yielding NDJSON.
+
+    Chunks are scored in the process pool, at most two per worker in
+    flight. Results are emitted in input order as soon as the oldest chunk
+    completes, and the upload is only read further once there is room, so
+    a slow client or a slow pool pushes back on the uploader instead of
+    buffering. Without top_k every molecule gets a result line; with top_k
+    each chunk gets a progress line and the best top_k molecules (by the
+    weighted objectives) follow at the end, optionally saved as compounds
+    with predictions. A summary line closes the stream.
+    """
+    loop = asyncio.get_running_loop()
+    pool, workers = _get_pool()
+    in_flight: deque = deque()
+    summary = {"processed": 0, "invalid": 0, "filtered": 0, "scored": 0}
+    heap: List[Tuple[float, int, Dict[str, Any]]] = []
+
+    def collect(results: List[Dict[str, Any]]) -> bytes:
+        for result in results:
+            summary["processed"] += 1
+            if "error" in result:
+                summary["invalid"] += 1
+            elif not result["passed"]:
+                summary["filtered"] += 1
+            else:
+                summary["scored"] += 1
+                if top_k:
+                    score = sum(o.weight * result["predictions"][o.model_type] for o in objectives)
+                    entry = (score, -result["line"], result)
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, entry)
+                    elif entry[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, entry)
+        SCREENED_MOLECULES.labels(outcome="invalid").inc(sum("error" in r for r in results))
+        SCREENED_MOLECULES.labels(outcome="scored").inc(sum(r.get("passed", False) for r in results))
+        SCREENED_MOLECULES.labels(outcome="filtered").inc(sum(r.get("passed") is False for r in results))
+        if top_k:
+            return _ndjson({"progress": dict(summary)})
+        return b"".join(_ndjson(result) for result in results)
+
+    try:
+        try:
+            async for records in iter_record_chunks(body, settings.SCREENING_CHUNK_SIZE):
+                in_flight.append(loop.run_in_executor(
+                    pool, screen_chunk, records, model_types, max_violations, include_descriptors
+                ))
+                if len(in_flight) >= 2 * workers:
+                    yield collect(await in_flight.popleft())
+            while in_flight:
+                yield collect(await in_flight.popleft())
+        except ScreeningInputError as e:
+            yield _ndjson({"error": str(e)})
+            return
+
+        if top_k:
+            ranked = sorted(heap, key=lambda entry: entry[:2], reverse=True)
+            for rank, (score, _, result) in enumerate(ranked, 1):
+                yield _ndjson({"rank": rank, "score": score, **result})
+            hits = [result for _, _, result in ranked]
+            if persist:
+                summary["persisted"] = await persist_screening_hits(user_id, hits, model_types)
+        yield _ndjson({"summary": summary})
+    finally:
+        # The client went away or the upload failed: drop queued chunks
+        for future in in_flight:
+            future.cancel()
+
+
+async def persist_screening_hits(
+    user_id: int,
+    hits: List[Dict[str, Any]],
+    model_types: List[str]
+) -> Dict[str, int]:
+    """
+    Save screening hits as compounds (reusing existing ones with the same
+    SMILES) with a prediction per model. The stored values are the ones
+    the hits were ranked by; details come from the regular single
+    prediction models, with no model name so that they use the same
+    built-in heuristics rather than a registered model.
+    """
+    created = 0
+    async with AsyncSessionLocal() as db:
+        existing = dict((await db.execute(
+            select(Compound.smiles, Compound.id).filter(Compound.smiles.in_([h["smiles"] for h in hits]))
+        )).all())
+        new_predictions = []
+        for hit in hits:
+            results = {
+                m: await run_in_threadpool(PREDICTORS[m], hit["smiles"], model_name=None) for m in model_types
+            }
+            compound_id = existing.get(hit["smiles"])
+            if compound_id is None:
+                properties = next(iter(results.values()))["prediction_details"]["properties_used"]
+                compound = Compound(
+                    name=hit["id"] or hit["smiles"],
+                    smiles=hit["smiles"],
+                    properties=properties,
+                    molecular_weight=properties.get("molecular_weight"),
+                    created_by=user_id,
+                )
+                db.add(compound)
+                await db.flush()
+                existing[hit["smiles"]] = compound_id = compound.id
+                created += 1
+            for model_type, result in results.items():
+                prediction = Prediction(
+                    compound_id=compound_id,
+                    user_id=user_id,
+                    model_type=model_type,
+                    model_name=result["prediction_details"].get("model_name"),
+                    prediction_value=hit["predictions"][model_type],
+                    prediction_confidence=result["prediction_confidence"],
+                    prediction_details=result["prediction_details"],
+                )
+                db.add(prediction)
+                new_predictions.append(prediction)
+        await db.run_sync(record_latest_predictions, new_predictions)
+        await db.commit()
+    return {"compounds_created": created, "predictions": len(new_predictions)}
@@ -1,7 +1,112 @@
+import copy
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.core.config import settings
 from app.models.compound import Compound, CompoundVersion
 from app.models.user import User
 
+# Fields captured in each version snapshot
+VERSIONED_FIELDS = ("name", "smiles", "properties")
+
+
+def _escape_pointer(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape_pointer(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_json_patch(source: Any, target: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    Build a JSON patch (RFC 6902) turning source into target.
+    Objects are diffed key by key; any other changed value is replaced whole.
+    """
+    if isinstance(source, dict) and isinstance(target, dict):
+        patch = []
+        for key in source:
+            if key not in target:
+                patch.append({"op": "remove", "path": f"{path}/{_escape_pointer(key)}"})
+        for key, value in target.items():
+            child = f"{path}/{_escape_pointer(key)}"
+            if key not in source:
+                patch.append({"op": "add", "path": child, "value": value})
+            else:
+                patch.extend(make_json_patch(source[key], value, child))
+        return patch
+    if source == target and type(source) is type(target):
+        return []
+    return [{"op": "replace", "path": path, "value": target}]
+
+
+def apply_json_patch(document: Any, patch: List[Dict[str, Any]]) -> Any:
+    """Apply a JSON patch produced by make_json_patch to a copy of document"""
+    document = copy.deepcopy(document)
+    for operation in patch:
+        tokens = [_unescape_pointer(t) for t in operation["path"].split("/")[1:]]
+        if not tokens:
+            document = copy.deepcopy(operation["value"])
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[token]
+        if operation["op"] == "remove":
+            del parent[tokens[-1]]
+        else:
+            parent[tokens[-1]] = copy.deepcopy(operation["value"])
+    return document
+
+
+def _compound_state(compound: Compound) -> Dict[str, Any]:
+    return {
+        "name": compound.name,
+        "smiles": compound.smiles,
+        "properties": copy.deepcopy(compound.properties),
+    }
+
+
+def _checkpoint_state(version: CompoundVersion) -> Dict[str, Any]:
+    return {field: getattr(version, field) for field in VERSIONED_FIELDS}
+
+
+def encode_version_state(
+    state: Dict[str, Any],
+    checkpoint_state: Optional[Dict[str, Any]],
+    chain_length: int
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Decide how to store a new version: return a JSON patch against the
+    current checkpoint, or None when a new full checkpoint should be written.
+    """
+    if checkpoint_state is None or chain_length >= settings.COMPOUND_VERSION_CHECKPOINT_INTERVAL:
+        return None
+    delta = make_json_patch(checkpoint_state, state)
+    # A patch that is not smaller than the snapshot only slows reconstruction
+    if len(json.dumps(delta, default=str)) >= len(json.dumps(state, default=str)):
+        return None
+    return delta
+
+
+def _latest_checkpoint(db: Session, compound_id: int) -> Tuple[Optional[CompoundVersion], int]:
+    """Return the compound's current checkpoint and the number of deltas on it"""
+    last = db.query(CompoundVersion).filter(
+        CompoundVersion.compound_id == compound_id
+    ).order_by(CompoundVersion.id.desc()).first()
+    if not last:
+        return None, 0
+    if last.base_id is None:
+        return last, 0
+    checkpoint = db.query(CompoundVersion).filter(CompoundVersion.id == last.base_id).first()
+    chain_length = db.query(func.count(CompoundVersion.id)).filter(
+        CompoundVersion.compound_id == compound_id,
+        CompoundVersion.id > checkpoint.id
+    ).scalar()
+    return checkpoint, chain_length
+
 
 def create_compound_version(
     db: Session,
@@ -9,22 +114,69 @@ def create_compound_version(
     user_id: int,
     change_type: str = "update"
 ) -> CompoundVersion:
-    """Create a version snapshot of a compound"""
+    """
+    Create a version snapshot of a compound.
+    The row is flushed but not committed; it becomes durable with the
+    caller's commit, together with the change it records.
+    """
+    state = _compound_state(compound)
     version = CompoundVersion(
-        compound_id=compound.id,
+        compound=compound,
         version=compound.version,
-        name=compound.name,
-        smiles=compound.smiles,
-        properties=compound.properties,
         changed_by=user_id,
         change_type=change_type
     )
+
+    checkpoint, chain_length = (
+        _latest_checkpoint(db, compound.id) if compound.id else (None, 0)
+    )
+    delta = encode_version_state(
+        state,
+        _checkpoint_state(checkpoint) if checkpoint else None,
+        chain_length
+    )
+    if delta is None:
+        version.name = state["name"]
+        version.smiles = state["smiles"]
+        version.properties = state["properties"]
+    else:
+        version.base_id = checkpoint.id
+        version.delta = delta
+
     db.add(version)
-    db.commit()
-    db.refresh(version)
+    db.flush()
+    if delta is not None:
+        materialize_versions(db, [version])
     return version
 
 
+def materialize_versions(db: Session, versions: List[CompoundVersion]) -> List[CompoundVersion]:
+    """
+    Fill in name/smiles/properties on delta rows from their checkpoints.
+    Checkpoints missing from the list are fetched in a single query. Values
+    are set as committed state so the rows are not marked dirty.
+    """
+    by_id = {v.id: v for v in versions}
+    missing = {v.base_id for v in versions if v.base_id is not None and v.base_id not in by_id}
+    if missing:
+        for checkpoint in db.query(CompoundVersion).filter(CompoundVersion.id.in_(missing)).all():
+            by_id[checkpoint.id] = checkpoint
+
+    for version in versions:
+        if version.base_id is None:
+            continue
+        state = apply_json_patch(_checkpoint_state(by_id[version.base_id]), version.delta or [])
+        for field in VERSIONED_FIELDS:
+            set_committed_value(version, field, state.get(field))
+    return versions
+
+
+def get_version_state(db: Session, version: CompoundVersion) -> Dict[str, Any]:
+    """Reconstruct the full name/smiles/properties of a version"""
+    materialize_versions(db, [version])
+    return copy.deepcopy(_checkpoint_state(version))
+
+
 def get_compound_versions(
     db: Session,
     compound_id: int,
@@ -32,11 +184,13 @@ def get_compound_versions(
     limit: int = 100
 ):
     """Get version history for a compound"""
-    return db.query(CompoundVersion).filter(
+    versions = db.query(CompoundVersion).filter(
         CompoundVersion.compound_id == compound_id
     ).order_by(
-        CompoundVersion.version.desc()
+        CompoundVersion.version.desc(),
+        CompoundVersion.id.desc()
     ).offset(skip).limit(limit).all()
+    return materialize_versions(db, versions)
 
 
 def rollback_compound(
@@ -45,31 +199,102 @@ def rollback_compound(
     version: int,
     user_id: int
 ) -> Compound:
-    """Rollback a compound to a previous version"""
+    """Rollback a compound to a previous version (the caller commits)"""
     compound = db.query(Compound).filter(Compound.id == compound_id).first()
     if not compound:
         raise ValueError("Compound not found")
-    
+
     version_data = db.query(CompoundVersion).filter(
         CompoundVersion.compound_id == compound_id,
         CompoundVersion.version == version
     ).first()
-    
+
     if not version_data:
         raise ValueError("Version not found")
-    
+
+    target = get_version_state(db, version_data)
+
     # Create version of current state
     create_compound_version(db, compound, user_id, "rollback_from")
-    
+
     # Restore from version
-    compound.name = version_data.name
-    compound.smiles = version_data.smiles
-    compound.properties = version_data.properties
+    compound.name = target["name"]
+    compound.smiles = target["smiles"]
+    compound.properties = target["properties"]
     compound.version += 1
-    
+
     # Create version for rollback
     create_compound_version(db, compound, user_id, "rollback_to")
-    
-    db.commit()
-    db.refresh(compound)
     return compound
+
+
+def _first_versions_after(
+    db: Session,
+    compound_ids: List[int],
+    as_of: datetime
+) -> Dict[int, CompoundVersion]:
+    """
+    For each compound, find the earliest version row written after as_of.
+    Served by the (compound_id, created_at, id) index: DISTINCT ON on
+    PostgreSQL, a ROW_NUMBER() window elsewhere.
+    """
+    if not compound_ids:
+        return {}
+    conditions = (
+        CompoundVersion.compound_id.in_(compound_ids),
+        CompoundVersion.created_at > as_of,
+    )
+    ordering = (CompoundVersion.created_at, CompoundVersion.id)
+    if db.get_bind().dialect.name == "postgresql":
+        versions = db.query(CompoundVersion).filter(*conditions).distinct(
+            CompoundVersion.compound_id
+        ).order_by(CompoundVersion.compound_id, *ordering).all()
+    else:
+        ranked = select(
+            CompoundVersion.id,
+            func.row_number().over(
+                partition_by=CompoundVersion.compound_id,
+                order_by=ordering
+            ).label("rank")
+        ).where(*conditions).subquery()
+        versions = db.query(CompoundVersion).join(
+            ranked, ranked.c.id == CompoundVersion.id
+        ).filter(ranked.c.rank == 1).all()
+    materialize_versions(db, versions)
+    return {v.compound_id: v for v in versions}
+
+
+def get_compounds_as_of(
+    db: Session,
+    compounds: List[Compound],
+    as_of: datetime
+) -> List[Dict[str, Any]]:
+    """
+    Return the given compounds as they were at as_of.
+
+    Version rows snapshot the state a change replaced, so the first row
+    written after as_of holds the state at as_of; compounds without later
+    rows are unchanged since then. Callers should pass only compounds
+    created at or before as_of.
+    """
+    later = _first_versions_after(db, [c.id for c in compounds], as_of)
+    snapshots = []
+    for compound in compounds:
+        snapshot = {
+            column.name: getattr(compound, column.name)
+            for column in Compound.__table__.columns
+        }
+        version = later.get(compound.id)
+        if version is not None:
+            properties = copy.deepcopy(version.properties)
+            snapshot.update(
+                name=version.name,
+                smiles=version.smiles,
+                properties=properties,
+                version=version.version,
+                updated_at=None,
+            )
+            if properties and properties.get("molecular_weight") is not None:
+                snapshot["molecular_weight"] = properties["molecular_weight"]
+        snapshots.append(snapshot)
+    return snapshots
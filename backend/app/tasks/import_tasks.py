@@ -0,0 +1,45 @@
+import asyncio
+from sqlalchemy import update
+from app.core.cache import wait_for_redis_writes
+from app.core.database import SessionLocal, async_engine
+from app.models.job import Job
+from app.services.chembl_import_service import run_chembl_import
+from app.tasks.prediction_tasks import BULK_QUEUE, celery_app
+
+
+async def _run_chembl_import(job_id: int) -> None:
+    try:
+        await run_chembl_import(job_id)
+        # Cache invalidations are scheduled on the loop, which closes next
+        await wait_for_redis_writes()
+    finally:
+        # Pooled connections belong to this task's event loop
+        await async_engine.dispose()
+
+
+@celery_app.task(name="run_chembl_import")
+def run_chembl_import_task(job_id: int):
+    """
+    Run a ChEMBL import job in a worker rather than the API process, so it
+    survives API restarts; a lost worker's job is redelivered (acks_late)
+    and continues where it stopped
+    """
+    asyncio.run(_run_chembl_import(job_id))
+    return {"job_id": job_id}
+
+
+def queue_chembl_import(job_id: int) -> None:
+    """Send an import job to the bulk queue, failing the job if that is not possible"""
+    try:
+        run_chembl_import_task.apply_async(args=[job_id], queue=BULK_QUEUE)
+    except Exception as e:
+        # A pending job that was never sent would never run; failed jobs
+        # can be resumed
+        db = SessionLocal()
+        try:
+            db.execute(update(Job).where(Job.id == job_id).values(
+                status="failed", error=f"Could not queue job: {e}"
+            ))
+            db.commit()
+        finally:
+            db.close()
@@ -1,20 +1,38 @@
+import math
+import os
+import time
+from datetime import datetime
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from kombu import Queue
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, reset_connection_pools
 from app.core.config import settings
+from app.core.metrics import BATCH_JOB_SECONDS, BATCH_PREDICTIONS, BATCH_QUEUE_WAIT_SECONDS, mark_process_dead
 from app.models.compound import Compound
 from app.models.experiment import Prediction
+from app.models.job import Job
+from app.models.user import User
 from app.services.ml_service import (
     predict_solubility,
     predict_toxicity,
     predict_drug_target_interaction,
 )
+from app.services.model_registry import preload_before_fork, preload_models
+from app.services.experiment_stats_service import RunningStats, merge_experiment_stats
+from app.services.prediction_service import BATCH_JOB_TYPE, record_latest_predictions
+
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
 
 # Initialize Celery
 celery_app = Celery(
     "drug_discovery",
     broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
+    backend=settings.REDIS_URL,
+    include=["app.tasks.import_tasks"],
 )
 
 celery_app.conf.update(
@@ -23,63 +41,276 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    # Small batches have their own queue (and workers), so they never wait
+    # behind bulk work; see batch_queue
+    task_queues=(Queue(INTERACTIVE_QUEUE), Queue(BULK_QUEUE)),
+    task_default_queue=INTERACTIVE_QUEUE,
+    # Tasks are long and CPU-bound: reserve one message at a time, so a
+    # busy worker does not hold messages an idle one could run, and
+    # acknowledge after the task, so a lost worker's job is redelivered
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Redis emulates priorities with a list per step; 0 is served first
+    broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
 )
 
 
+@worker_init.connect
+def _preload_shared_models(**kwargs):
+    # In the main process, before the prefork pool starts its children
+    preload_before_fork()
+
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    reset_connection_pools()
+    # Only loads what the main process could not
+    preload_models()
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+def _predict_chunk(db: Session, job: Job, compound_ids: list) -> dict:
+    """
+    Add predictions for one chunk of a batch job to the session, with the
+    experiment stats and latest predictions they change. Compounds that
+    already have a prediction for the job are skipped.
+    """
+    params = job.parameters
+    model_type, model_name, experiment_id = params["model_type"], params["model_name"], params["experiment_id"]
+    done = set(db.scalars(select(Prediction.compound_id).filter(
+        Prediction.job_id == job.id,
+        Prediction.compound_id.in_(compound_ids)
+    )))
+    compounds = {
+        c.id: c for c in db.query(Compound).filter(Compound.id.in_(set(compound_ids) - done)).all()
+    }
+    outcome = {"created": 0, "existing": len(done), "skipped": 0, "failed": 0}
+    new_predictions = []
+    stats = RunningStats()
+
+    for compound_id in compound_ids:
+        if compound_id in done:
+            continue
+        compound = compounds.get(compound_id)
+        if not compound:
+            outcome["skipped"] += 1
+            continue
+
+        # Run prediction
+        if model_type == "solubility":
+            result = predict_solubility(compound.smiles, model_name)
+        elif model_type == "toxicity":
+            result = predict_toxicity(compound.smiles, model_name)
+        elif model_type == "dti":
+            result = predict_drug_target_interaction(compound.smiles, model_name=model_name)
+        else:
+            outcome["skipped"] += 1
+            continue
+
+        if "error" in result:
+            outcome["failed"] += 1
+            continue
+
+        # Create prediction record
+        prediction = Prediction(
+            compound_id=compound_id,
+            experiment_id=experiment_id,
+            user_id=job.user_id,
+            job_id=job.id,
+            model_type=model_type,
+            model_name=model_name or result.get("prediction_details", {}).get("model_name"),
+            prediction_value=result.get("prediction_value"),
+            prediction_confidence=result.get("prediction_confidence"),
+            prediction_details=result.get("prediction_details", {})
+        )
+        db.add(prediction)
+        new_predictions.append(prediction)
+        outcome["created"] += 1
+        if prediction.prediction_value is not None:
+            stats.add(prediction.prediction_value)
+
+    record_latest_predictions(db, new_predictions)
+
+    # Fold this chunk into the experiment aggregates in the same
+    # transaction as the inserts
+    if experiment_id:
+        merge_experiment_stats(db, experiment_id, stats)
+    return outcome
+
+
+def batch_queue(total: int) -> str:
+    """Queue for a batch job of total compounds"""
+    return INTERACTIVE_QUEUE if total <= settings.BATCH_INTERACTIVE_MAX_COMPOUNDS else BULK_QUEUE
+
+
+def batch_priority(total: int) -> int:
+    """Broker priority for a batch job (0 is served first): a step per factor of ten compounds"""
+    return min(9, int(math.log10(max(total, 1))))
+
+
+def _send_batch_job(job_id: int, total: int) -> None:
+    run_batch_prediction_task.apply_async(
+        args=[job_id],
+        kwargs={"queued_at": time.time()},
+        queue=batch_queue(total),
+        priority=batch_priority(total),
+    )
+
+
+def dispatch_batch_jobs(user_id: int) -> int:
+    """
+    Queue the user's oldest pending batch jobs while they have fewer than
+    BATCH_MAX_ACTIVE_JOBS_PER_USER queued or running. The rest stay pending
+    until one of the user's jobs finishes, so however much one user
+    submits, they hold at most that many places in the queues. Returns the
+    number of jobs queued.
+    """
+    db: Session = SessionLocal()
+    try:
+        # One dispatch per user at a time (a row lock on PostgreSQL; SQLite
+        # serializes writers anyway)
+        db.execute(select(User.id).filter(User.id == user_id).with_for_update())
+        user_jobs = (Job.user_id == user_id, Job.job_type == BATCH_JOB_TYPE)
+        active = db.scalar(select(func.count(Job.id)).filter(*user_jobs, Job.status.in_(("queued", "running"))))
+        free = settings.BATCH_MAX_ACTIVE_JOBS_PER_USER - active
+        jobs = db.scalars(
+            select(Job).filter(*user_jobs, Job.status == "pending").order_by(Job.id).limit(max(free, 0))
+        ).all()
+        for job in jobs:
+            job.status = "queued"
+        queued = [(job.id, job.total) for job in jobs]
+        db.commit()
+    finally:
+        db.close()
+
+    # Sent after the commit, so the task never sees its job still pending
+    for job_id, total in queued:
+        try:
+            _send_batch_job(job_id, total)
+        except Exception as e:
+            # Left queued, the job would never run; failed jobs can be resumed
+            db = SessionLocal()
+            try:
+                db.execute(update(Job).where(Job.id == job_id).values(
+                    status="failed", error=f"Could not queue job: {e}"
+                ))
+                db.commit()
+            finally:
+                db.close()
+    return len(queued)
+
+
 @celery_app.task(name="run_batch_prediction")
-def run_batch_prediction_task(
-    compound_ids: list,
-    model_type: str,
-    model_name: str = None,
-    user_id: int = None
-):
-    """Background task for batch predictions"""
+def run_batch_prediction_task(job_id: int, queued_at: float = None):
+    """
+    Run a batch prediction job from its cursor (Job.processed) to the end.
+
+    Every BATCH_PREDICTION_CHUNK_SIZE compounds are committed together with
+    the advanced cursor, so a crash loses at most the chunk in progress and
+    a redelivered or resumed job skips everything committed. The cursor
+    only advances from the value the chunk started at: if another delivery
+    of the same job committed that chunk first, this one rolls back and
+    moves on, and the unique (job_id, compound_id) index rejects any
+    duplicate prediction that slips through. A chunk that fails to commit
+    BATCH_CHUNK_MAX_ATTEMPTS times while nothing else advances the cursor
+    fails the job, which can be resumed once the cause is fixed.
+
+    Bulk jobs give up their worker after BATCH_SLICE_SECONDS and go to the
+    back of the queue, so bulk jobs of different users take turns. A
+    finished job dispatches its user's next pending one.
+    """
     db: Session = SessionLocal()
+    start = time.perf_counter()
+    user_id = None
     try:
-        predictions_created = []
-        
-        for compound_id in compound_ids:
-            compound = db.query(Compound).filter(Compound.id == compound_id).first()
-            if not compound:
-                continue
-            
-            # Run prediction
-            if model_type == "solubility":
-                result = predict_solubility(compound.smiles, model_name)
-            elif model_type == "toxicity":
-                result = predict_toxicity(compound.smiles, model_name)
-            elif model_type == "dti":
-                result = predict_drug_target_interaction(compound.smiles, model_name=model_name)
+        job = db.get(Job, job_id)
+        if job is None:
+            return {"status": "failed", "error": "Job not found"}
+        # Messages for jobs that are not queued (or running, when
+        # redelivered) are stale: the job finished, failed or was requeued
+        if job.status not in ("queued", "running"):
+            return {"status": job.status, "job_id": job.id}
+        user_id = job.user_id
+        queue = batch_queue(job.total)
+        if queued_at is not None:
+            BATCH_QUEUE_WAIT_SECONDS.labels(queue=queue).observe(max(time.time() - queued_at, 0))
+        compound_ids = job.parameters["compound_ids"]
+        model_type = job.parameters["model_type"]
+        job.status = "running"
+        job.error = None
+        db.commit()
+
+        size = settings.BATCH_PREDICTION_CHUNK_SIZE
+        attempts = 0
+        while job.processed < len(compound_ids):
+            cursor = job.processed
+            chunk = compound_ids[cursor:cursor + size]
+            error = None
+            try:
+                outcome = _predict_chunk(db, job, chunk)
+                totals = dict(job.result or {})
+                for name, count in outcome.items():
+                    totals[name] = totals.get(name, 0) + count
+                advanced = db.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.processed == cursor)
+                    .values(processed=cursor + len(chunk), result=totals)
+                ).rowcount
+            except IntegrityError as e:
+                advanced = 0
+                error = e
+            if advanced:
+                db.commit()
+                attempts = 0
+                for name, count in outcome.items():
+                    BATCH_PREDICTIONS.labels(model=model_type, outcome=name).inc(count)
             else:
-                continue
-            
-            if "error" in result:
-                continue
-            
-            # Create prediction record
-            prediction = Prediction(
-                compound_id=compound_id,
-                user_id=user_id,
-                model_type=model_type,
-                model_name=model_name or result.get("prediction_details", {}).get("model_name"),
-                prediction_value=result.get("prediction_value"),
-                prediction_confidence=result.get("prediction_confidence"),
-                prediction_details=result.get("prediction_details", {})
-            )
-            db.add(prediction)
-            predictions_created.append(compound_id)
-        
+                db.rollback()
+                # Retrying only helps if another delivery committed the chunk
+                attempts = attempts + 1 if job.processed == cursor else 0
+                if attempts >= settings.BATCH_CHUNK_MAX_ATTEMPTS:
+                    raise RuntimeError(
+                        f"Compounds {cursor}-{cursor + len(chunk) - 1} could not be saved "
+                        f"after {attempts} attempts: {error}"
+                    )
+
+            if (queue == BULK_QUEUE and job.processed < len(compound_ids)
+                    and time.perf_counter() - start > settings.BATCH_SLICE_SECONDS):
+                job.status = "queued"
+                db.commit()
+                BATCH_JOB_SECONDS.labels(model=model_type).observe(time.perf_counter() - start)
+                _send_batch_job(job.id, job.total)
+                return {"status": "queued", "job_id": job.id, "processed": job.processed}
+
+        job.status = "completed"
+        job.completed_at = datetime.utcnow()
         db.commit()
-        return {
+        BATCH_JOB_SECONDS.labels(model=model_type).observe(time.perf_counter() - start)
+        result = {
             "status": "completed",
-            "predictions_created": len(predictions_created),
-            "compound_ids": predictions_created
+            "job_id": job.id,
+            "predictions_created": (job.result or {}).get("created", 0)
         }
     except Exception as e:
         db.rollback()
-        return {
+        job = db.get(Job, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e)
+            db.commit()
+        result = {
             "status": "failed",
             "error": str(e)
         }
     finally:
         db.close()
+
+    if user_id is not None:
+        dispatch_batch_jobs(user_id)
+    return result
@@ -0,0 +1,86 @@
+"""
+Benchmark ChEMBL lookups against a local mock server with simulated latency.
+
+Compares a fresh httpx.AsyncClient per lookup (connect per call) with the
+pooled, cached client in app.services.chembl_service. Lookups draw ids
+from a small pool, so repeats exercise the cache and coalescing:
+
+    python benchmarks/bench_chembl_client.py --lookups 500 --ids 100 --concurrency 20
+"""
+import argparse
+import asyncio
+import random
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from app.core.config import settings
+from app.services import chembl_service
+
+mock = FastAPI()
+stats = {"requests": 0}
+
+
+@mock.get("/molecule/{chembl_id}")
+async def molecule(chembl_id: str):
+    stats["requests"] += 1
+    await asyncio.sleep(LATENCY)
+    return {"molecule_chembl_id": chembl_id, "molecule_structures": {"canonical_smiles": "CCO"}}
+
+
+async def per_call_lookup(chembl_id: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{settings.CHEMBL_API_URL}/molecule/{chembl_id}", timeout=10.0)
+        return response.json()
+
+
+async def run_lookups(lookup, ids, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(chembl_id):
+        async with semaphore:
+            await lookup(chembl_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in ids))
+    return time.perf_counter() - start
+
+
+async def main(args) -> None:
+    rng = random.Random(0)
+    ids = [f"CHEMBL{rng.randrange(args.ids)}" for _ in range(args.lookups)]
+    for name, lookup in (("per-call client", per_call_lookup), ("pooled+cached", chembl_service.get_chembl_compound_by_id)):
+        stats["requests"] = 0
+        elapsed = await run_lookups(lookup, ids, args.concurrency)
+        print(
+            f"{name:<16} {elapsed:7.2f} s  {args.lookups / elapsed:8.0f} lookups/s  "
+            f"{stats['requests']:5d} upstream requests"
+        )
+    await chembl_service.close_chembl_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--ids", type=int, default=100, help="Distinct ChEMBL ids looked up")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mock server response delay")
+    args = parser.parse_args()
+    LATENCY = args.latency_ms / 1000
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(mock, log_level="warning"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    settings.CHEMBL_API_URL = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    asyncio.run(main(args))
+    server.should_exit = True
@@ -0,0 +1,100 @@
+"""
+Benchmark importing a ChEMBL id set one id per request vs in one bulk job.
+
+Runs against a local mock ChEMBL with simulated latency and a throwaway
+database; each mode imports its own id range so nothing is deduplicated:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_chembl_import.py --ids 500
+"""
+import argparse
+import asyncio
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.database import Base, engine
+
+mock = FastAPI()
+stats = {"requests": 0}
+SMILES = ["CCO", "c1ccccc1O", "CC(=O)Oc1ccccc1C(=O)O", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C"]
+
+
+def _molecule(chembl_id: str) -> dict:
+    n = int(chembl_id.removeprefix("CHEMBL"))
+    return {
+        "molecule_chembl_id": chembl_id,
+        "pref_name": f"Bench {chembl_id}",
+        "molecule_structures": {"canonical_smiles": SMILES[n % len(SMILES)]},
+    }
+
+
+@mock.get("/molecule")
+async def molecule_list(molecule_chembl_id__in: str = "", limit: int = 20):
+    stats["requests"] += 1
+    await asyncio.sleep(LATENCY)
+    return {"molecules": [_molecule(i) for i in molecule_chembl_id__in.split(",")[:limit]]}
+
+
+@mock.get("/molecule/{chembl_id}")
+async def molecule(chembl_id: str):
+    stats["requests"] += 1
+    await asyncio.sleep(LATENCY)
+    return _molecule(chembl_id)
+
+
+def run(count: int) -> None:
+    from app.main import app
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/api/v1/auth/register", json={"email": email, "password": "benchpassword"})
+    token = client.post(
+        "/api/v1/auth/login", data={"username": email, "password": "benchpassword"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    base = int(time.time()) * 100000
+
+    stats["requests"] = 0
+    start = time.perf_counter()
+    for i in range(count):
+        client.post(f"/api/v1/compounds/import/chembl/CHEMBL{base + i}", headers=headers)
+    serial = time.perf_counter() - start
+    print(f"one id per request  {serial:7.2f} s  {count / serial:7.0f} ids/s  {stats['requests']:5d} ChEMBL requests")
+
+    stats["requests"] = 0
+    ids = [f"CHEMBL{base + count + i}" for i in range(count)]
+    start = time.perf_counter()
+    job = client.post("/api/v1/compounds/import/chembl/bulk", json={"chembl_ids": ids}, headers=headers).json()
+    bulk = time.perf_counter() - start
+    job = client.get(f"/api/v1/jobs/{job['id']}", headers=headers).json()
+    print(
+        f"bulk job            {bulk:7.2f} s  {count / bulk:7.0f} ids/s  {stats['requests']:5d} ChEMBL requests"
+        f"  ({job['status']}, {job['result']['imported']} imported)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ids", type=int, default=500, help="ChEMBL ids imported per mode")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mock server response delay")
+    args = parser.parse_args()
+    LATENCY = args.latency_ms / 1000
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(mock, log_level="warning"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    settings.CHEMBL_API_URL = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    run(args.ids)
+    server.should_exit = True
@@ -0,0 +1,72 @@
+"""
+Benchmark compound write throughput through the API.
+
+Creates, updates and rolls back compounds and reports operations per
+second together with the number of commits each operation issued. Only
+the public API is used, so the script can be run unchanged against older
+revisions for before/after comparisons:
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_compound_writes.py --count 500
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.main import app, create_tables
+
+# Small drug-like molecules so RDKit time does not dominate
+SMILES = ["CCO", "CCN", "CCC(=O)O", "c1ccccc1O", "CC(C)O", "CCOC(=O)C", "c1ccncc1", "CC(=O)N"]
+
+
+def _auth_headers(client: TestClient) -> dict:
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/api/v1/auth/register", json={"email": email, "password": "benchpassword"})
+    response = client.post("/api/v1/auth/login", data={"username": email, "password": "benchpassword"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def run(count: int) -> None:
+    create_tables()
+    client = TestClient(app)
+    headers = _auth_headers(client)
+    commits = []
+    event.listen(Session, "after_commit", lambda session: commits.append(1))
+
+    run_id = uuid.uuid4().hex[:6]
+    compound_ids = []
+    phases = {
+        "create": lambda i: compound_ids.append(client.post(
+            "/api/v1/compounds/",
+            json={"name": f"bench-{run_id}-{i}", "smiles": f"{SMILES[i % len(SMILES)]}.[Na+].{'C' * (i + 1)}"},
+            headers=headers,
+        ).json()["id"]),
+        "update": lambda i: client.put(
+            f"/api/v1/compounds/{compound_ids[i]}", json={"name": f"bench-{run_id}-{i}-v2"}, headers=headers
+        ),
+        "rollback": lambda i: client.post(
+            f"/api/v1/compounds/{compound_ids[i]}/rollback/1", headers=headers
+        ),
+    }
+
+    print(f"{'operation':<10} {'ops/s':>10} {'ms/op':>10} {'commits/op':>12}")
+    for name, operation in phases.items():
+        commits.clear()
+        start = time.perf_counter()
+        for i in range(count):
+            operation(i)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<10} {count / elapsed:>10.1f} {1000 * elapsed / count:>10.2f} {len(commits) / count:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200, help="Compounds per phase")
+    args = parser.parse_args()
+    run(args.count)
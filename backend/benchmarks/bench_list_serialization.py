@@ -0,0 +1,115 @@
+"""
+Benchmark fetching and rendering a 1000-row compound list page.
+
+Compares the previous list path with the projected orjson path:
+
+    orm+pydantic   ORM rows -> CompoundResponse -> jsonable_encoder -> json
+    rows+orjson    column tuples -> dicts -> orjson (all columns)
+    fields+orjson  column tuples for five columns -> orjson
+
+CPU time is process time per page for fetch plus render, and serialize
+counts the rendering step alone. Missing rows are seeded first:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_list_serialization.py --rows 1000
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import func, insert, select
+from app.core.database import Base, SessionLocal, engine
+from app.models.compound import Compound
+from app.models.user import User
+from app.schemas.compound import CompoundResponse
+from app.services.ml_service import calculate_molecular_properties
+
+TABLE_FIELDS = ("id", "name", "smiles", "molecular_weight", "created_at")
+SMILES = ["CCO", "c1ccccc1O", "CC(=O)Oc1ccccc1C(=O)O", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "CC(C)Cc1ccc(cc1)C(C)C(=O)O"]
+
+
+def _seed(db, rows: int) -> None:
+    missing = rows - db.scalar(select(func.count(Compound.id)))
+    if missing <= 0:
+        return
+    user = db.query(User).first()
+    if user is None:
+        user = User(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+    properties = [calculate_molecular_properties(s) for s in SMILES]
+    run_id = uuid.uuid4().hex[:8]
+    db.execute(insert(Compound), [
+        {
+            "name": f"Bench {run_id} {i}",
+            "smiles": f"{SMILES[i % len(SMILES)]}.{run_id}{i}",
+            "molecular_weight": properties[i % len(SMILES)]["molecular_weight"],
+            "properties": properties[i % len(SMILES)],
+            "created_by": user.id,
+            "version": 1,
+        }
+        for i in range(missing)
+    ])
+    db.commit()
+
+
+def orm_pydantic(db, rows):
+    compounds = db.query(Compound).order_by(Compound.created_at.desc()).limit(rows).all()
+    start = time.process_time()
+    body = JSONResponse(jsonable_encoder([CompoundResponse.model_validate(c) for c in compounds])).body
+    return body, time.process_time() - start
+
+
+def _projected(db, rows, columns):
+    result = db.execute(
+        select(*(Compound.__table__.c[name] for name in columns))
+        .order_by(Compound.created_at.desc()).limit(rows)
+    )
+    items = [dict(row) for row in result.mappings()]
+    start = time.process_time()
+    body = ORJSONResponse(items).body
+    return body, time.process_time() - start
+
+
+def rows_orjson(db, rows):
+    return _projected(db, rows, tuple(CompoundResponse.model_fields))
+
+
+def fields_orjson(db, rows):
+    return _projected(db, rows, TABLE_FIELDS)
+
+
+def run(rows: int, repeat: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        _seed(db, rows)
+        print(f"{'path':<15} {'cpu ms/page':>12} {'serialize ms':>13} {'payload KB':>11}")
+        for name, render in (("orm+pydantic", orm_pydantic), ("rows+orjson", rows_orjson), ("fields+orjson", fields_orjson)):
+            render(db, rows)  # warm up
+            cpu, serialize = 0.0, 0.0
+            for _ in range(repeat):
+                db.expunge_all()
+                start = time.process_time()
+                body, serialize_time = render(db, rows)
+                cpu += time.process_time() - start
+                serialize += serialize_time
+            print(
+                f"{name:<15} {1000 * cpu / repeat:>12.1f} {1000 * serialize / repeat:>13.1f} "
+                f"{len(body) / 1024:>11.1f}"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per page")
+    parser.add_argument("--repeat", type=int, default=20, help="Pages rendered per path")
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
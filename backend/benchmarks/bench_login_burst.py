@@ -0,0 +1,86 @@
+"""
+Benchmark latency of non-auth endpoints during a login burst.
+
+Probes GET /health and GET /api/v1/compounds at a steady rate, first on an
+idle app and then while a burst of concurrent logins is in flight, and
+reports p50/p99 probe latency for both phases along with the login status
+codes. Everything runs in-process over ASGI, so no server is needed:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_login_burst.py --logins 300
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from app.main import app, create_tables
+
+PASSWORD = "benchpassword"
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+async def _probe(client, headers, stop, interval):
+    latencies = []
+    while not stop.is_set():
+        for url in ("/health", "/api/v1/compounds/"):
+            start = time.perf_counter()
+            await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def _report(name, client, headers, interval, work=None):
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(client, headers, stop, interval))
+    result = await work if work is not None else await asyncio.sleep(2)
+    stop.set()
+    latencies = await probe
+    print(
+        f"{name:<12} probes={len(latencies):<5} "
+        f"p50={_percentile(latencies, 0.5):8.1f}ms p99={_percentile(latencies, 0.99):8.1f}ms "
+        f"max={max(latencies) * 1000:8.1f}ms"
+    )
+    return result
+
+
+async def run(logins: int, interval: float) -> None:
+    create_tables()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+        await client.post("/api/v1/auth/register", json={"email": email, "password": PASSWORD})
+        response = await client.post("/api/v1/auth/login", data={"username": email, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        await _report("idle", client, headers, interval)
+
+        async def burst():
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.post("/api/v1/auth/login", data={"username": email, "password": PASSWORD})
+                for _ in range(logins)
+            ])
+            return Counter(r.status_code for r in responses), time.perf_counter() - start
+
+        statuses, elapsed = await _report("login burst", client, headers, interval, burst())
+        print(f"{logins} logins in {elapsed:.1f}s, status codes: {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200, help="Concurrent logins in the burst")
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between probes")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.interval))
@@ -0,0 +1,115 @@
+"""
+Prediction latency with registry models: loading the model for every
+request (what a per-request mlflow.pyfunc.load_model costs) against the
+warm ModelRegistry cache, and request latency while a newly promoted
+version is loaded and swapped in.
+
+Registers a random forest of --trees trees in a throwaway file-store
+registry, so no MLflow server is needed:
+
+    python benchmarks/bench_model_registry.py --trees 200 --requests 500
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import mlflow.pyfunc
+import mlflow.sklearn
+import numpy as np
+import pandas as pd
+from mlflow.tracking import MlflowClient
+from sklearn.ensemble import RandomForestRegressor
+
+from app.services.ml_service import DESCRIPTOR_NAMES, calculate_molecular_properties
+from app.services.model_registry import ModelRegistry
+
+NAME = "solubility_forest"
+SMILES = ["CC(=O)Oc1ccccc1C(=O)O", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "c1ccc2ccccc2c1", "CCOC(=O)c1ccccc1N"]
+
+
+def register(client, root, trees, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.uniform(0, 500, size=(2000, len(DESCRIPTOR_NAMES))), columns=list(DESCRIPTOR_NAMES))
+    model = RandomForestRegressor(n_estimators=trees, random_state=seed).fit(X, rng.uniform(0, 100, size=2000))
+    path = Path(root) / f"model-{seed}"
+    mlflow.sklearn.save_model(model, str(path))
+    version = client.create_model_version(NAME, str(path)).version
+    client.transition_model_version_stage(NAME, version, "Production", archive_existing_versions=True)
+    return path
+
+
+def summary(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(
+        f"{name:<22} {len(latencies):6d} {statistics.median(latencies) * 1000:9.2f} "
+        f"{p99 * 1000:9.2f} {latencies[-1] * 1000:9.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trees", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    properties = [calculate_molecular_properties(smiles) for smiles in SMILES]
+    with tempfile.TemporaryDirectory() as root:
+        uri = (Path(root) / "mlruns").as_uri()
+        client = MlflowClient(tracking_uri=uri, registry_uri=uri)
+        client.create_registered_model(NAME, tags={"model_type": "solubility"})
+        path = register(client, root, args.trees, seed=1)
+        registry = ModelRegistry(uri, max_bytes=10**10)
+
+        print(f"{NAME}: {args.trees} trees")
+        print(f"{'':<22} {'requests':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+
+        per_request = []
+        for i in range(min(args.requests, 20)):
+            start = time.perf_counter()
+            model = mlflow.pyfunc.load_model(str(path))
+            model.predict(pd.DataFrame([properties[i % len(properties)]], columns=list(DESCRIPTOR_NAMES)))
+            per_request.append(time.perf_counter() - start)
+        summary("load per request", per_request)
+
+        start = time.perf_counter()
+        registry.get("solubility", NAME).predict([properties[0]])
+        summary("registry, first", [time.perf_counter() - start])
+
+        def serve(latencies, count=None, stop=None):
+            i = 0
+            while (count is None or i < count) and not (stop and stop.is_set()):
+                start = time.perf_counter()
+                registry.get("solubility", NAME).predict([properties[i % len(properties)]])
+                latencies.append(time.perf_counter() - start)
+                i += 1
+
+        warm = []
+        serve(warm, count=args.requests)
+        summary("registry, warm", warm)
+
+        # Promote a new version and serve requests while the refresh loads it
+        register(client, root, args.trees, seed=2)
+        during, stop = [], threading.Event()
+        server = threading.Thread(target=serve, args=(during,), kwargs={"stop": stop})
+        server.start()
+        start = time.perf_counter()
+        swapped = registry.refresh()
+        swap_seconds = time.perf_counter() - start
+        stop.set()
+        server.join()
+        summary("registry, during swap", during)
+        print(
+            f"refresh swapped {swapped} reference(s) to version "
+            f"{registry.get('solubility', NAME).version} in {swap_seconds:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
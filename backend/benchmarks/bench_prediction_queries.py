@@ -0,0 +1,241 @@
+"""
+Check that prediction listings and reports use the composite indexes and
+meet latency targets on a large predictions table.
+
+Seeds --rows predictions (spread over 100 users, 10k compounds and 1k
+experiments) when the table holds fewer, then for each query shape the API
+issues: checks the plan (EXPLAIN on PostgreSQL, EXPLAIN QUERY PLAN on
+SQLite) uses the expected index without a full scan or a sort for paged
+listings, and measures p50/p95 latency. Exits 1 when a check fails:
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_prediction_queries.py --rows 5000000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_prediction_queries.py --rows 2000000
+
+--drop-indexes measures the unindexed baseline and restores the indexes
+afterwards.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select, text
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import *  # noqa: F401,F403 - registers every model
+from app.models.experiment import LatestPrediction, Prediction
+from app.services.prediction_service import (
+    NEWEST_FIRST,
+    experiment_predictions_query,
+    Objective,
+    latest_predictions_query,
+    top_compounds,
+    top_single_query,
+    user_predictions_query,
+)
+
+USERS, COMPOUNDS, EXPERIMENTS = 100, 10000, 1000
+
+# Latest bench prediction per key, computed over the whole history; what
+# dashboards ran before latest_predictions existed
+LATEST_WINDOW_SQL = (
+    "SELECT user_id, compound_id, model_type, model_name, id, experiment_id, "
+    "prediction_value, prediction_confidence, created_at FROM ("
+    "SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id, compound_id, model_type, model_name "
+    "ORDER BY id DESC) AS rank FROM predictions WHERE model_name = 'bench') ranked WHERE rank = 1"
+)
+
+
+def _series(n: int) -> str:
+    """FROM clause producing rows i = 0..n-1"""
+    if engine.dialect.name == "postgresql":
+        return f"generate_series(0, {n - 1}) AS s(i)"
+    return f"(WITH RECURSIVE s(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM s WHERE i < {n - 1}) SELECT i FROM s) AS s"
+
+
+def _seconds_ago(column: str) -> str:
+    if engine.dialect.name == "postgresql":
+        return f"now() - {column} * interval '1 second'"
+    return f"datetime('now', '-' || {column} || ' seconds')"
+
+
+def seed(rows: int) -> dict:
+    """Bench users, compounds and experiments, and predictions up to rows"""
+    with engine.begin() as conn:
+        first_user = conn.execute(text("SELECT min(id) FROM users WHERE email LIKE 'bench-predictions-%'")).scalar()
+        if first_user is None:
+            conn.execute(text(
+                f"INSERT INTO users (email, hashed_password, is_active, role) "
+                f"SELECT 'bench-predictions-' || i || '@example.com', 'x', true, 'USER' FROM {_series(USERS)}"
+            ))
+            first_user = conn.execute(text("SELECT min(id) FROM users WHERE email LIKE 'bench-predictions-%'")).scalar()
+            conn.execute(text(
+                f"INSERT INTO compounds (name, smiles, molecular_weight, created_by, version) "
+                f"SELECT 'bench ' || i, 'C' || i, 100 + i % 400, {first_user}, 1 FROM {_series(COMPOUNDS)}"
+            ))
+            conn.execute(text(
+                f"INSERT INTO experiments (name, model_type, status, user_id) "
+                f"SELECT 'bench ' || i, 'qsar', 'completed', {first_user} + i % {USERS} FROM {_series(EXPERIMENTS)}"
+            ))
+        first_compound = conn.execute(text("SELECT min(id) FROM compounds WHERE name LIKE 'bench %'")).scalar()
+        first_experiment = conn.execute(text("SELECT min(id) FROM experiments WHERE name LIKE 'bench %'")).scalar()
+
+        existing = conn.execute(select(func.count(Prediction.id)).filter(Prediction.model_name == "bench")).scalar()
+        missing = rows - existing
+        if missing > 0:
+            print(f"Seeding {missing} predictions...", flush=True)
+            start = time.perf_counter()
+            conn.execute(text(
+                "INSERT INTO predictions (compound_id, experiment_id, user_id, model_type, model_name, "
+                "prediction_value, prediction_confidence, created_at) "
+                f"SELECT {first_compound} + (i * 7919) % {COMPOUNDS}, "
+                f"CASE WHEN i % 5 = 0 THEN NULL ELSE {first_experiment} + i % {EXPERIMENTS} END, "
+                f"{first_user} + (i * 31) % {USERS}, "
+                "CASE i % 3 WHEN 0 THEN 'solubility' WHEN 1 THEN 'toxicity' ELSE 'dti' END, "
+                f"'bench', (i % 1000) / 10.0, 0.75, {_seconds_ago(f'(i + {existing})')} "
+                f"FROM {_series(missing)}"
+            ))
+            print(f"Seeded in {time.perf_counter() - start:.1f} s", flush=True)
+            conn.execute(text("DELETE FROM latest_predictions WHERE model_name = 'bench'"))
+            conn.execute(text(
+                "INSERT INTO latest_predictions (user_id, compound_id, model_type, model_name, prediction_id, "
+                f"experiment_id, prediction_value, prediction_confidence, created_at) {LATEST_WINDOW_SQL}"
+            ))
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE predictions"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return {"user": first_user, "compound": first_compound, "experiment": first_experiment}
+
+
+# The primary key (named per dialect) or the model type index
+LATEST_INDEXES = {
+    "latest_predictions_pkey",
+    "sqlite_autoindex_latest_predictions_1",
+    "ix_latest_predictions_user_id_model_type_compound_id",
+}
+
+
+def query_shapes(ids: dict) -> list:
+    """(name, statement, indexes that may serve it, paged listing, p95 target ms)"""
+    user, compound, experiment = ids["user"], ids["compound"], ids["experiment"]
+    return [
+        ("list", user_predictions_query(user).limit(100),
+         {"ix_predictions_user_id_created_at"}, True, 10),
+        ("list by model", user_predictions_query(user, model_type="toxicity").limit(100),
+         {"ix_predictions_user_id_model_type_created_at"}, True, 10),
+        ("list page 50", user_predictions_query(user).offset(5000).limit(100),
+         {"ix_predictions_user_id_created_at"}, True, 50),
+        ("compound", user_predictions_query(user, compound_id=compound + 31),
+         {"ix_predictions_compound_id_user_id_created_at"}, True, 10),
+        ("experiment report", experiment_predictions_query(experiment + 1),
+         {"ix_predictions_experiment_id_compound_id"}, False, 100),
+        ("experiment export", select(Prediction).filter(
+            Prediction.user_id == user + 1, Prediction.experiment_id == experiment + 1
+        ).order_by(*NEWEST_FIRST),
+         {"ix_predictions_experiment_id_compound_id", "ix_predictions_user_id_created_at"}, False, 100),
+        ("latest", latest_predictions_query(user).limit(100),
+         LATEST_INDEXES, True, 10),
+        ("latest page 20", latest_predictions_query(user, after=(compound + 2000, "dti", "bench")).limit(100),
+         LATEST_INDEXES, True, 10),
+        ("latest by model", latest_predictions_query(user, model_type="toxicity").limit(100),
+         LATEST_INDEXES, True, 10),
+        ("top soluble", top_single_query(user, Objective("solubility", None, 1.0)),
+         {"ix_latest_predictions_user_id_model_type_value"}, True, 10),
+        ("top least toxic", top_single_query(
+            user, Objective("toxicity", None, -1.0), ranges=[("molecular_weight", None, 300.0)]
+        ), {"ix_latest_predictions_user_id_model_type_value"}, True, 10),
+    ]
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def check_plan(conn, sql: str, indexes: set, paged: bool) -> tuple:
+    """Return (ok, plan summary)"""
+    if engine.dialect.name == "postgresql":
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        nodes = list(_plan_nodes((plan if isinstance(plan, list) else json.loads(plan))[0]["Plan"]))
+        used = {n.get("Index Name") for n in nodes if n.get("Relation Name") == "predictions"} - {None}
+        seq_scan = any(n["Node Type"] == "Seq Scan" and n.get("Relation Name") == "predictions" for n in nodes)
+        sorted_ = any(n["Node Type"] in ("Sort", "Incremental Sort") for n in nodes)
+        summary = ", ".join(f"{n['Node Type']}{' ' + n['Index Name'] if 'Index Name' in n else ''}" for n in nodes)
+    else:
+        details = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        used = {name for name in indexes if any(f"INDEX {name}" in d for d in details)}
+        seq_scan = any(d.startswith("SCAN predictions") and "INDEX" not in d for d in details)
+        sorted_ = any("TEMP B-TREE" in d for d in details)
+        summary = "; ".join(details)
+    ok = bool(used & indexes) and not seq_scan and not (paged and sorted_)
+    return ok, summary
+
+
+async def _time_streaming_top(user: int) -> float:
+    """Milliseconds for a two-objective ranking over one user's latest predictions"""
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        await top_compounds(db, user, [Objective("solubility", None, 1.0), Objective("toxicity", None, -50.0)])
+        return (time.perf_counter() - start) * 1000
+
+
+def run(args) -> bool:
+    Base.metadata.create_all(bind=engine)
+    index_names = [i.name for i in Prediction.__table__.indexes if i.name != "ix_predictions_id"]
+    ids = seed(args.rows)
+    if args.drop_indexes:
+        with engine.begin() as conn:
+            for name in index_names:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    all_ok = True
+    try:
+        with engine.connect() as conn:
+            print(f"{'query':<18} {'plan':<5} {'p50 ms':>8} {'p95 ms':>8} {'target':>7}")
+            for name, statement, indexes, paged, target_ms in query_shapes(ids):
+                sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+                plan_ok, summary = check_plan(conn, sql, indexes, paged)
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    conn.execute(text(sql)).fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                target = target_ms * args.target_scale
+                ok = plan_ok and p95 <= target
+                all_ok &= ok
+                print(f"{name:<18} {'ok' if plan_ok else 'FAIL':<5} {p50:8.2f} {p95:8.2f} {target:7.0f}  {'' if ok else 'FAIL'}")
+                if args.verbose or not plan_ok:
+                    print(f"    {summary}")
+            print(f"soluble and non-toxic (streaming top-100): {asyncio.run(_time_streaming_top(ids['user'])):.0f} ms")
+            start = time.perf_counter()
+            latest = conn.execute(text(LATEST_WINDOW_SQL)).fetchall()
+            print(f"latest per key via a window over predictions: {(time.perf_counter() - start) * 1000:.0f} ms "
+                  f"for {len(latest)} keys (latest_predictions pages are read instead)")
+    finally:
+        if args.drop_indexes:
+            print("Restoring indexes...", flush=True)
+            for index in Prediction.__table__.indexes:
+                if index.name in index_names:
+                    index.create(bind=engine, checkfirst=True)
+    return all_ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000, help="Predictions to seed")
+    parser.add_argument("--repeat", type=int, default=20, help="Executions per query")
+    parser.add_argument("--target-scale", type=float, default=1.0, help="Multiply latency targets (slow hardware)")
+    parser.add_argument("--drop-indexes", action="store_true", help="Measure without the composite indexes")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args()
+    sys.exit(0 if run(args) else 1)
@@ -0,0 +1,150 @@
+"""
+Compare the storage used by predictions with full prediction_details JSON
+in every row against the compact layout (shared model version and
+descriptor set rows plus per-prediction extras).
+
+Predicts every model for --compounds generated structures --repeats times,
+writes the rows in both layouts into scratch tables and reports their size
+(dbstat on SQLite, pg_total_relation_size on PostgreSQL). The scratch
+tables are dropped afterwards:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_prediction_storage.py --compounds 2000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import JSON, Column, DateTime, Float, Integer, MetaData, String, Table, func, text
+from app.core.database import engine
+from app.models.experiment import split_prediction_details
+from app.services.ml_service import predict_drug_target_interaction, predict_solubility, predict_toxicity
+
+MODELS = {"solubility": predict_solubility, "toxicity": predict_toxicity, "dti": predict_drug_target_interaction}
+
+metadata = MetaData()
+
+
+def _prediction_columns():
+    return [
+        Column("id", Integer, primary_key=True),
+        Column("compound_id", Integer, nullable=False),
+        Column("user_id", Integer, nullable=False),
+        Column("model_type", String, nullable=False),
+        Column("model_name", String),
+        Column("prediction_value", Float),
+        Column("prediction_confidence", Float),
+        Column("prediction_details", JSON),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    ]
+
+
+legacy = Table("bench_storage_predictions_full", metadata, *_prediction_columns())
+compact = Table(
+    "bench_storage_predictions_compact", metadata, *_prediction_columns(),
+    Column("model_version_id", Integer), Column("descriptor_set_id", Integer),
+)
+model_versions = Table(
+    "bench_storage_model_versions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("model_type", String, nullable=False),
+    Column("model_name", String),
+    Column("details", JSON, nullable=False),
+    Column("content_hash", String(64), nullable=False, unique=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+descriptor_sets = Table(
+    "bench_storage_descriptor_sets", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("descriptors", JSON, nullable=False),
+    Column("content_hash", String(64), nullable=False, unique=True),
+)
+
+
+def structures(count: int):
+    """Distinct small molecules: substituted chains of varying length"""
+    heads = ["", "O", "N", "Cl", "c1ccccc1", "C(=O)O", "OC", "N#C"]
+    tails = ["O", "N", "C(=O)O", "F", "c1ccncc1", "S", "OC(=O)C", "Br"]
+    for i in range(count):
+        yield heads[i % len(heads)] + "C" * (1 + i // (len(heads) * len(tails))) + tails[(i // len(heads)) % len(tails)]
+
+
+def table_bytes(conn, names) -> int:
+    if conn.dialect.name == "postgresql":
+        return sum(conn.execute(text(f"SELECT pg_total_relation_size('{name}')")).scalar() for name in names)
+    placeholders = ", ".join(f"'{name}'" for name in names)
+    return conn.execute(text(
+        "SELECT sum(pgsize) FROM dbstat WHERE name IN "
+        f"(SELECT name FROM sqlite_master WHERE tbl_name IN ({placeholders}))"
+    )).scalar()
+
+
+def run(compounds: int, repeats: int) -> None:
+    results = []
+    start = time.perf_counter()
+    for compound_id, smiles in enumerate(structures(compounds), 1):
+        for model_type, predict in MODELS.items():
+            result = predict(smiles)
+            if "error" not in result:
+                results.append((compound_id, model_type, result))
+    print(f"{len(results)} predictions on {compounds} structures in {time.perf_counter() - start:.1f} s")
+
+    full_rows, compact_rows, versions, descriptor_rows = [], [], {}, {}
+    for compound_id, model_type, result in results:
+        row = {
+            "compound_id": compound_id,
+            "user_id": 1,
+            "model_type": model_type,
+            "model_name": result["prediction_details"].get("model_name"),
+            "prediction_value": result["prediction_value"],
+            "prediction_confidence": result["prediction_confidence"],
+        }
+        model_version, descriptor_set, extras = split_prediction_details(model_type, result["prediction_details"])
+        version_id = versions.setdefault(model_version["content_hash"], dict(model_version, id=len(versions) + 1))["id"]
+        descriptor_id = descriptor_rows.setdefault(
+            descriptor_set["content_hash"], dict(descriptor_set, id=len(descriptor_rows) + 1)
+        )["id"]
+        for _ in range(repeats):
+            full_rows.append(dict(row, prediction_details=result["prediction_details"]))
+            compact_rows.append(dict(
+                row, prediction_details=extras, model_version_id=version_id, descriptor_set_id=descriptor_id
+            ))
+
+    metadata.drop_all(bind=engine)
+    metadata.create_all(bind=engine)
+    try:
+        with engine.begin() as conn:
+            conn.execute(legacy.insert(), full_rows)
+            conn.execute(compact.insert(), compact_rows)
+            conn.execute(model_versions.insert(), list(versions.values()))
+            conn.execute(descriptor_sets.insert(), list(descriptor_rows.values()))
+        if engine.dialect.name == "postgresql":
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("VACUUM ANALYZE"))
+        with engine.connect() as conn:
+            full = table_bytes(conn, [legacy.name])
+            compacted = table_bytes(conn, [compact.name])
+            references = table_bytes(conn, [model_versions.name, descriptor_sets.name])
+            full_json = conn.execute(text(f"SELECT sum(length(prediction_details)) FROM {legacy.name}")).scalar()
+            extras_json = conn.execute(text(
+                f"SELECT sum(length(coalesce(prediction_details, ''))) FROM {compact.name}"
+            )).scalar()
+    finally:
+        metadata.drop_all(bind=engine)
+
+    rows = len(full_rows)
+    print(f"{'layout':<10} {'rows':>8} {'table MB':>9} {'bytes/row':>10} {'JSON bytes/row':>15}")
+    print(f"{'full':<10} {rows:8d} {full / 1e6:9.2f} {full / rows:10.0f} {full_json / rows:15.0f}")
+    print(f"{'compact':<10} {rows:8d} {compacted / 1e6:9.2f} {compacted / rows:10.0f} {extras_json / rows:15.0f}")
+    print(f"references: {len(versions)} model versions, {len(descriptor_rows)} descriptor sets, {references / 1e6:.2f} MB")
+    print(f"compact total is {(compacted + references) / full:.0%} of full")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compounds", type=int, default=2000, help="Distinct structures predicted")
+    parser.add_argument("--repeats", type=int, default=5, help="Times each prediction is stored (re-runs)")
+    args = parser.parse_args()
+    run(args.compounds, args.repeats)
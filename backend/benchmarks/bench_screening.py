@@ -0,0 +1,97 @@
+"""
+Throughput of the streaming screening pipeline against scoring the same
+SMILES one at a time through the single-molecule models (what a client
+looping over POST /predictions/ pays in model time, before any HTTP or
+database cost).
+
+Generates --molecules structures, streams them through screen_stream in
+64 KB pieces as an upload would arrive, and reports molecules/s, time to
+the first result and peak parent RSS:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_screening.py --molecules 100000
+"""
+import argparse
+import asyncio
+import itertools
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.ml_service import predict_solubility, predict_toxicity
+from app.services.prediction_service import Objective
+from app.services.screening_service import screen_stream, shutdown_screening_pool
+
+MODELS = {"solubility": predict_solubility, "toxicity": predict_toxicity}
+
+
+def structures(count: int):
+    """Drug-sized molecules from a combinatorial library of fragments (repeats after 5120)"""
+    heads = ["", "O", "N", "Cl", "CC(C)", "C(=O)O", "OC", "N#C"]
+    rings = ["c1ccccc1", "c1ccncc1", "C1CCNCC1", "c1ccc2ccccc2c1", "C1CCOC1", "c1cc(F)ccc1",
+             "c1ccc(O)cc1", "C1CC1", "c1cnc(N)nc1", "C1CCN(C)CC1"]
+    tails = ["O", "N", "C(=O)O", "F", "C(=O)N", "S(=O)(=O)N", "OC(=O)C", "Br"]
+    library = [
+        head + "C" * chain + ring + tail
+        for head, chain, ring, tail in itertools.product(heads, range(1, 9), rings, tails)
+    ]
+    return itertools.islice(itertools.cycle(library), count)
+
+
+def scalar(smiles):
+    start = time.perf_counter()
+    for s in smiles:
+        for predict in MODELS.values():
+            predict(s)
+    return time.perf_counter() - start
+
+
+async def streamed(upload: bytes, top_k):
+    async def body():
+        for start in range(0, len(upload), 65536):
+            yield upload[start:start + 65536]
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    first = None
+    lines = 0
+    objectives = [Objective("solubility", None, 1.0)] if top_k else None
+    async for out in screen_stream(body(), 1, list(MODELS), top_k=top_k, objectives=objectives):
+        first = first or time.perf_counter() - start
+        lines += out.count(b"\n")
+    return time.perf_counter() - start, first, lines
+
+
+def run(molecules: int, scalar_molecules: int, top_k) -> None:
+    smiles = list(structures(molecules))
+    upload = "".join(f"{s} mol-{i}\n" for i, s in enumerate(smiles)).encode()
+    workers = settings.SCREENING_WORKERS or "cpu count"
+    print(f"{molecules} molecules ({len(upload) / 1e6:.1f} MB), workers={workers}, chunk={settings.SCREENING_CHUNK_SIZE}")
+
+    sample = smiles[:scalar_molecules]
+    elapsed = scalar(sample)
+    print(f"{'single-molecule models':<24} {len(sample) / elapsed:10.0f} molecules/s")
+
+    try:
+        # Start the pool outside the timing, as a running server would have
+        asyncio.run(streamed(b"C\n", None))
+        elapsed, first, lines = asyncio.run(streamed(upload, top_k))
+    finally:
+        shutdown_screening_pool()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{'streaming pipeline':<24} {molecules / elapsed:10.0f} molecules/s, "
+        f"first output after {first * 1000:.0f} ms, {lines} lines, peak RSS {rss:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--molecules", type=int, default=100000, help="Molecules streamed")
+    parser.add_argument("--scalar-molecules", type=int, default=5000, help="Molecules scored one at a time")
+    parser.add_argument("--top-k", type=int, default=None, help="Rank by solubility and keep this many")
+    args = parser.parse_args()
+    run(args.molecules, args.scalar_molecules, args.top_k)
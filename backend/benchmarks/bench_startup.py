@@ -0,0 +1,81 @@
+"""
+Benchmark cold import time of the API application.
+
+Imports app.main in fresh interpreters under `python -X importtime`, and
+reports the median import time and the slowest modules. It also checks
+that heavy optional modules stay out of the import path. It exits non-zero
+when the median exceeds --budget-ms or a heavy module is imported, so it
+can gate CI:
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Imported on first use; none of these may load with the application
+HEAVY_MODULES = ("mlflow", "rdkit", "numpy", "pandas", "reportlab", "celery", "sklearn")
+
+
+def _import_once(module: str):
+    """Import module in a fresh interpreter; return wall time and importtime rows"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return wall, rows
+
+
+def run(module: str, runs: int, budget_ms: float, top: int) -> int:
+    walls, import_times, rows = [], [], []
+    for _ in range(runs):
+        wall, rows = _import_once(module)
+        walls.append(wall * 1000)
+        import_times.append(next(c for name, _, c in rows if name.strip() == module) / 1000)
+
+    median = statistics.median(import_times)
+    print(f"import {module}: median {median:.0f} ms (min {min(import_times):.0f}), "
+          f"process wall median {statistics.median(walls):.0f} ms over {runs} runs")
+
+    print("\nslowest modules (cumulative, last run):")
+    for name, _, cumulative in sorted(rows, key=lambda r: -r[2])[1:top + 1]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failures = []
+    loaded = sorted({name.strip().split(".")[0] for name, _, _ in rows} & set(HEAVY_MODULES))
+    if loaded:
+        failures.append(f"heavy modules imported at startup: {', '.join(loaded)}")
+    if median > budget_ms:
+        failures.append(f"median import time {median:.0f} ms exceeds budget {budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--budget-ms", type=float, default=2000, help="Fail above this median import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    args = parser.parse_args()
+    sys.exit(run(args.module, args.runs, args.budget_ms, args.top))
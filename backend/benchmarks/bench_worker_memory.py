@@ -0,0 +1,160 @@
+"""
+Memory of forked API/Celery workers serving predictions with a registry
+model, with and without loading the model in the parent before fork.
+
+Registers a random forest of --trees trees in a throwaway file-store
+registry, then for each mode starts a fresh parent that forks --workers
+workers the way the Gunicorn master and the Celery prefork pool do:
+
+- per-worker: each worker imports the prediction libraries and loads the
+  model itself (worker_process_init / per-worker startup)
+- preload: the parent loads them first (preload_models) and workers
+  inherit them
+- preload+freeze: preload_before_fork, which also imports rdkit and numpy
+  in the parent and freezes the GC
+
+Every worker serves --requests predictions and runs a full collection,
+then all of them report /proc/self/smaps_rollup while still alive. USS is
+memory only that worker holds; PSS splits shared pages between the
+processes sharing them, so the total PSS is the memory actually used:
+
+    python benchmarks/bench_worker_memory.py --workers 4 --trees 300
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+NAME = "solubility_forest"
+SMILES = ["CC(=O)Oc1ccccc1C(=O)O", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "c1ccc2ccccc2c1", "CCOC(=O)c1ccccc1N"]
+MODES = ("per-worker", "preload", "preload+freeze")
+
+
+def memory_kb():
+    """Rss, Pss and USS (private pages) of this process, in kB"""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def register(uri, root, trees):
+    import mlflow.sklearn
+    import numpy as np
+    import pandas as pd
+    from mlflow.tracking import MlflowClient
+    from sklearn.ensemble import RandomForestRegressor
+    from app.services.ml_service import DESCRIPTOR_NAMES
+
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 500, size=(5000, len(DESCRIPTOR_NAMES))), columns=list(DESCRIPTOR_NAMES))
+    model = RandomForestRegressor(n_estimators=trees, random_state=0).fit(X, rng.uniform(0, 100, size=5000))
+    path = Path(root) / "model"
+    mlflow.sklearn.save_model(model, str(path))
+    client = MlflowClient(tracking_uri=uri, registry_uri=uri)
+    client.create_registered_model(NAME, tags={"model_type": "solubility"})
+    client.transition_model_version_stage(NAME, client.create_model_version(NAME, str(path)).version, "Production")
+
+
+def worker(mode, requests, barrier, results):
+    from app.services.ml_service import predict_solubility
+    from app.services.model_registry import preload_models
+    if mode == "per-worker":
+        preload_models()
+    for i in range(requests):
+        result = predict_solubility(SMILES[i % len(SMILES)], NAME)
+        assert "model_version" in result["prediction_details"], result
+    # Long-running workers allocate and collect all the time
+    garbage = [{"i": i} for i in range(100_000)]
+    del garbage
+    gc.collect()
+    barrier.wait()  # measure while every worker is alive and sharing
+    results.put(memory_kb())
+    barrier.wait()
+
+
+def run_parent(mode, workers, requests):
+    """One mode in a fresh interpreter: prepare the parent, fork, measure"""
+    import app.main  # the app, as Gunicorn preloads it
+    from app.services.model_registry import preload_before_fork, preload_models
+    if mode == "preload":
+        preload_models()
+    elif mode == "preload+freeze":
+        preload_before_fork()
+
+    context = multiprocessing.get_context("fork")
+    barrier, results = context.Barrier(workers + 1), context.Queue()
+    processes = [context.Process(target=worker, args=(mode, requests, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    measured = [results.get() for _ in processes]
+    parent = memory_kb()
+    barrier.wait()
+    for process in processes:
+        process.join()
+    print(json.dumps({"parent": parent, "workers": measured}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=200, help="Predictions each worker serves")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_parent(args.mode, args.workers, args.requests)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        uri = (Path(root) / "mlruns").as_uri()
+        register(uri, root, args.trees)
+        env = dict(
+            os.environ,
+            MODEL_REGISTRY_URI=uri,
+            MODEL_PRELOAD=f"solubility:{NAME}",
+            MODEL_REFRESH_SECONDS="0",
+        )
+        size = sum(f.stat().st_size for f in (Path(root) / "model").rglob("*") if f.is_file())
+        print(f"{args.workers} workers, {NAME} with {args.trees} trees ({size / 2**20:.0f} MB on disk)")
+        print(
+            f"{'mode':<15} {'worker RSS':>10} {'worker USS':>10} {'worker PSS':>10} "
+            f"{'parent PSS':>10} {'total PSS':>10}  (MB)"
+        )
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--workers", str(args.workers),
+                 "--requests", str(args.requests)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            report = json.loads(output.strip().splitlines()[-1])
+            workers = report["workers"]
+
+            def mean(key):
+                return sum(w[key] for w in workers) / len(workers) / 1024
+
+            total = (report["parent"]["pss"] + sum(w["pss"] for w in workers)) / 1024
+            print(
+                f"{mode:<15} {mean('rss'):10.0f} {mean('uss'):10.0f} {mean('pss'):10.0f} "
+                f"{report['parent']['pss'] / 1024:10.0f} {total:10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Discrete-event simulation of batch prediction scheduling while one user
+runs a very large job.
+
+One user submits --bulk-compounds split into --bulk-jobs jobs at t=0, a
+second user submits a mid-sized bulk job shortly after, and several users
+keep submitting small interactive batches. Two policies are compared with
+the same total number of workers:
+
+- single: every job is one task on one FIFO queue, workers reserve
+  --prefetch messages each (Celery's default multiplier is 4) and run jobs
+  to completion
+- fair: the settings this repo uses - interactive and bulk queues routed
+  by job size (batch_queue), at most BATCH_MAX_ACTIVE_JOBS_PER_USER queued
+  or running jobs per user, prefetch 1 and bulk jobs requeued after
+  BATCH_SLICE_SECONDS
+
+Reports how long jobs wait before they start and when they finish:
+
+    python benchmarks/sim_batch_scheduling.py --workers 4 --interactive-workers 1
+"""
+import argparse
+import heapq
+import random
+import sys
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.tasks.prediction_tasks import BULK_QUEUE, INTERACTIVE_QUEUE, batch_priority, batch_queue
+
+
+class Job:
+    def __init__(self, job_id, user, size, arrival):
+        self.id = job_id
+        self.user = user
+        self.size = size
+        self.remaining = size
+        self.arrival = arrival
+        self.started = None
+        self.finished = None
+
+
+def workload(args):
+    rng = random.Random(args.seed)
+    jobs = []
+    per_job = args.bulk_compounds // args.bulk_jobs
+    for _ in range(args.bulk_jobs):
+        jobs.append(Job(len(jobs), "bulk-user", per_job, 0.0))
+    jobs.append(Job(len(jobs), "second-bulk-user", args.second_bulk_compounds, 10.0))
+    t = 0.0
+    while True:
+        t += rng.expovariate(1 / args.small_interval)
+        if t > args.duration:
+            break
+        jobs.append(Job(len(jobs), f"user-{rng.randrange(args.small_users)}", rng.randint(10, 1000), t))
+    return jobs
+
+
+class Simulation:
+    """Event loop shared by both policies: arrivals and worker slice ends"""
+
+    def __init__(self, jobs, rate):
+        self.rate = rate
+        self.events = [(job.arrival, 0, job.id, "arrive", job) for job in jobs]
+        heapq.heapify(self.events)
+        self.sequence = 0
+        self.now = 0.0
+
+    def at(self, time, kind, payload):
+        self.sequence += 1
+        heapq.heappush(self.events, (time, 1, self.sequence, kind, payload))
+
+    def run(self):
+        while self.events:
+            self.now, _, _, kind, payload = heapq.heappop(self.events)
+            getattr(self, kind)(payload)
+            self.schedule()
+
+    def start(self, worker, job, limit=None):
+        job.started = self.now if job.started is None else job.started
+        work = job.remaining if limit is None else min(job.remaining, limit * self.rate)
+        job.remaining -= work
+        self.at(self.now + work / self.rate, "done", (worker, job))
+
+
+class SingleQueue(Simulation):
+    def __init__(self, jobs, rate, workers, prefetch):
+        super().__init__(jobs, rate)
+        self.broker = deque()
+        self.reserved = [deque() for _ in range(workers)]
+        self.busy = [False] * workers
+        self.prefetch = prefetch
+
+    def arrive(self, job):
+        self.broker.append(job)
+
+    def done(self, payload):
+        worker, job = payload
+        self.busy[worker] = False
+        job.finished = self.now
+
+    def schedule(self):
+        # Workers reserve messages up to their prefetch limit, busy or not
+        for worker, reserved in enumerate(self.reserved):
+            while self.broker and len(reserved) + self.busy[worker] < self.prefetch:
+                reserved.append(self.broker.popleft())
+            if not self.busy[worker] and reserved:
+                self.busy[worker] = True
+                self.start(worker, reserved.popleft())
+
+
+class FairQueues(Simulation):
+    def __init__(self, jobs, rate, workers, interactive_workers):
+        super().__init__(jobs, rate)
+        self.queues = {INTERACTIVE_QUEUE: [], BULK_QUEUE: []}
+        self.pools = {INTERACTIVE_QUEUE: interactive_workers, BULK_QUEUE: workers - interactive_workers}
+        self.running = {INTERACTIVE_QUEUE: 0, BULK_QUEUE: 0}
+        self.active = {}
+        self.pending = {}
+
+    def enqueue(self, job):
+        # Broker priority first, then FIFO
+        self.sequence += 1
+        heapq.heappush(self.queues[batch_queue(job.size)], (batch_priority(job.size), self.sequence, job))
+
+    def arrive(self, job):
+        if self.active.get(job.user, 0) < settings.BATCH_MAX_ACTIVE_JOBS_PER_USER:
+            self.active[job.user] = self.active.get(job.user, 0) + 1
+            self.enqueue(job)
+        else:
+            self.pending.setdefault(job.user, deque()).append(job)
+
+    def done(self, payload):
+        queue, job = payload
+        self.running[queue] -= 1
+        if job.remaining:
+            self.enqueue(job)  # end of a slice: back of the queue
+            return
+        job.finished = self.now
+        self.active[job.user] -= 1
+        waiting = self.pending.get(job.user)
+        if waiting:
+            self.active[job.user] += 1
+            self.enqueue(waiting.popleft())
+
+    def schedule(self):
+        for queue, messages in self.queues.items():
+            while messages and self.running[queue] < self.pools[queue]:
+                _, _, job = heapq.heappop(messages)
+                self.running[queue] += 1
+                limit = settings.BATCH_SLICE_SECONDS if queue == BULK_QUEUE else None
+                self.start(queue, job, limit)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(name, jobs):
+    small = [j for j in jobs if j.user.startswith("user-")]
+    waits = [j.started - j.arrival for j in small]
+    latency = [j.finished - j.arrival for j in small]
+    second = next(j for j in jobs if j.user == "second-bulk-user")
+    bulk_done = max(j.finished for j in jobs if j.user == "bulk-user")
+    print(
+        f"{name:<8} {len(small):6d} {percentile(waits, 0.5):8.1f} {percentile(waits, 0.95):8.1f} "
+        f"{max(waits):8.1f} {percentile(latency, 0.95):9.1f} {second.started - second.arrival:11.1f} "
+        f"{second.finished - second.arrival:11.1f} {bulk_done:10.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes in total")
+    parser.add_argument("--interactive-workers", type=int, default=1, help="Of which serve the interactive queue")
+    parser.add_argument("--rate", type=float, default=750.0, help="Compounds per second per worker")
+    parser.add_argument("--bulk-compounds", type=int, default=1_000_000)
+    parser.add_argument("--bulk-jobs", type=int, default=10, help="Jobs the large submission is split into")
+    parser.add_argument("--second-bulk-compounds", type=int, default=20_000)
+    parser.add_argument("--small-users", type=int, default=5)
+    parser.add_argument("--small-interval", type=float, default=5.0, help="Mean seconds between small jobs")
+    parser.add_argument("--duration", type=float, default=600.0, help="Seconds small jobs keep arriving")
+    parser.add_argument("--prefetch", type=int, default=4, help="Reserved messages per worker, single queue")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        f"{args.workers} workers at {args.rate:.0f} compounds/s; {args.bulk_compounds} compounds in "
+        f"{args.bulk_jobs} jobs at t=0, {args.second_bulk_compounds} at t=10 s, small jobs every "
+        f"{args.small_interval:.0f} s for {args.duration:.0f} s"
+    )
+    print(
+        f"{'policy':<8} {'small':>6} {'p50 wait':>8} {'p95 wait':>8} {'max wait':>8} {'p95 done':>9} "
+        f"{'2nd bulk wait':>11} {'2nd bulk done':>11} {'bulk done':>10}"
+    )
+    jobs = workload(args)
+    SingleQueue(jobs, args.rate, args.workers, args.prefetch).run()
+    report("single", jobs)
+    jobs = workload(args)
+    FairQueues(jobs, args.rate, args.workers, args.interactive_workers).run()
+    report("fair", jobs)
+
+
+if __name__ == "__main__":
+    main()
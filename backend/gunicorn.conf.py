@@ -0,0 +1,49 @@
+"""
+Production API server: Uvicorn workers under Gunicorn, with the app loaded
+in the master so the workers share its memory.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app once in the master, and (when_ready) the prediction
+# libraries and MODEL_PRELOAD models; forked workers share those pages
+# copy-on-write instead of each holding a copy. Code changes need a restart
+# rather than a HUP.
+preload_app = True
+# Replacement workers fork from the master, whose models stay current
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    from app.core.config import settings
+    # Cache invalidations reach other workers only through Redis
+    if server.cfg.workers > 1 and not settings.CACHE_REDIS_ENABLED:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need CACHE_REDIS_ENABLED=true, "
+            "or set WEB_CONCURRENCY=1"
+        )
+
+
+def when_ready(server):
+    from app.main import create_tables
+    from app.services.model_registry import preload_before_fork
+    # Once, rather than every worker racing to create missing tables
+    create_tables()
+    models = preload_before_fork()
+    server.log.info("Loaded %d model(s) to share with workers", len(models))
+
+
+def post_fork(server, worker):
+    from app.core.database import reset_connection_pools
+    reset_connection_pools()
+
+
+def child_exit(server, worker):
+    from app.core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,394 @@
+"""
+Ingest a local ChEMBL chemreps TSV or SDF dump into the compounds table
+
+For networks that cannot reach the ChEMBL API. The dump is streamed in
+chunks through a process pool which parses each structure, standardizes
+it (RDKit cleanup, largest fragment, neutralized), and computes the API's
+descriptor set, InChI and InChIKey. Structures whose InChIKey or ID is
+already in the database, or earlier in the dump, are skipped. New compounds and
+their "create" versions are written in batches, with COPY on PostgreSQL.
+
+A checkpoint is saved after every committed batch, and rerunning the same
+command resumes after the last committed record:
+
+    python scripts/ingest_chembl_dump.py chembl_33_chemreps.txt.gz --user-email admin@example.com
+    python scripts/ingest_chembl_dump.py vendor.sdf.gz --source vendor --id-field catalog_id --user-email admin@example.com
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select, text
+from app.core.database import engine
+from app.models.compound import Compound, CompoundVersion
+from app.models.user import User
+from app.services.compound_cache import compound_lists
+
+COMPOUND_COLUMNS = (
+    "id", "name", "smiles", "inchi", "inchi_key", "molecular_formula", "molecular_weight",
+    "properties", "external_id", "external_source", "created_by", "version",
+)
+VERSION_COLUMNS = ("compound_id", "version", "name", "smiles", "properties", "changed_by", "change_type")
+
+# Some dump fields (large SMILES, InChIs) exceed the csv default of 128 KB
+csv.field_size_limit(sys.maxsize)
+
+
+# Readers: yield (external_id, name, structure) without parsing structures,
+# which is left to the worker processes
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_tsv(path: Path, id_column: str, smiles_column: str, name_column: str = None):
+    with _open_text(path) as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            external_id = row.get(id_column)
+            name = (row.get(name_column) if name_column else None) or external_id
+            yield external_id, name, row.get(smiles_column) or ""
+
+
+def _sdf_record(lines: list, id_field: str, name_field: str = None):
+    end = next((i for i, line in enumerate(lines) if line.startswith("M  END")), len(lines) - 1)
+    fields = {}
+    key = None
+    for line in lines[end + 1:]:
+        if line.startswith(">"):
+            start, stop = line.find("<"), line.rfind(">")
+            key = line[start + 1:stop] if 0 <= start < stop else None
+            if key is not None:
+                fields[key] = []
+        elif key is not None and line.strip():
+            fields[key].append(line.rstrip("\r\n"))
+        else:
+            key = None
+    title = lines[0].strip() if lines else ""
+    external_id = "\n".join(fields.get(id_field, [])) or title
+    name = ("\n".join(fields.get(name_field, [])) if name_field else None) or external_id
+    return external_id, name, "".join(lines[:end + 1])
+
+
+def read_sdf(path: Path, id_field: str, name_field: str = None):
+    with _open_text(path) as f:
+        lines = []
+        for line in f:
+            if line.startswith("$$$$"):
+                yield _sdf_record(lines, id_field, name_field)
+                lines = []
+            else:
+                lines.append(line)
+        if any(line.strip() for line in lines):
+            yield _sdf_record(lines, id_field, name_field)
+
+
+# Worker processes
+
+_standardizers = None
+
+
+def _init_worker() -> None:
+    """
+    Build the standardizers once per worker: rdMolStandardize.Cleanup and
+    FragmentParent construct (and parse) new ones on every call, which
+    costs more than the standardization itself.
+    """
+    global _standardizers
+    from rdkit import RDLogger
+    from rdkit.Chem.MolStandardize import rdMolStandardize
+    RDLogger.DisableLog("rdApp.*")
+    _standardizers = (
+        rdMolStandardize.MetalDisconnector(),
+        rdMolStandardize.Normalizer(),
+        rdMolStandardize.Reionizer(),
+        rdMolStandardize.LargestFragmentChooser(),
+        rdMolStandardize.Uncharger(),
+    )
+
+
+def standardize(mol):
+    """Cleanup, then the neutralized largest fragment, as FragmentParent and Uncharger would"""
+    from rdkit import Chem
+    disconnector, normalizer, reionizer, fragment_chooser, uncharger = _standardizers
+    mol = Chem.RemoveHs(mol)
+    mol = disconnector.Disconnect(mol)
+    mol = normalizer.normalize(mol)
+    mol = reionizer.reionize(mol)
+    Chem.AssignStereochemistry(mol, cleanIt=True, force=True)
+    return uncharger.uncharge(fragment_chooser.choose(mol))
+
+
+def process_chunk(records: list, structure_format: str, standardize_structures: bool) -> list:
+    """Compound rows for a chunk of records; None for unusable structures"""
+    from rdkit import Chem
+    from rdkit.Chem import rdMolDescriptors
+    from app.services.ml_service import molecular_properties
+
+    rows = []
+    for external_id, name, structure in records:
+        try:
+            if structure_format == "smiles":
+                mol = Chem.MolFromSmiles(structure)
+            else:
+                mol = Chem.MolFromMolBlock(structure)
+            if mol is None or mol.GetNumAtoms() == 0:
+                rows.append(None)
+                continue
+            if standardize_structures:
+                mol = standardize(mol)
+            inchi = Chem.MolToInchi(mol) or None
+            properties = molecular_properties(mol)
+            rows.append({
+                "name": name,
+                "smiles": Chem.MolToSmiles(mol),
+                "inchi": inchi,
+                "inchi_key": Chem.InchiToInchiKey(inchi) if inchi else None,
+                "molecular_formula": rdMolDescriptors.CalcMolFormula(mol),
+                "molecular_weight": properties["molecular_weight"],
+                "properties": properties,
+                # Records without an ID are not kept apart by the unique
+                # (external_source, external_id) index
+                "external_id": external_id or None,
+            })
+        except Exception:
+            rows.append(None)
+    return rows
+
+
+# Database writes
+
+def _reserve_ids(conn, count: int) -> list:
+    """Compound ids for a batch, so version rows can reference them"""
+    if conn.dialect.name == "postgresql":
+        return list(conn.execute(
+            text("SELECT nextval(pg_get_serial_sequence('compounds', 'id')) FROM generate_series(1, :n)"),
+            {"n": count}
+        ).scalars())
+    # Single-writer fallback for development databases
+    start = (conn.execute(select(func.max(Compound.id))).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+# COPY reads an unquoted \N as NULL. Every other value is quoted, so empty
+# strings (and a literal \N) stay strings rather than becoming NULL.
+COPY_NULL = r"\N"
+
+
+def _copy_field(value) -> str:
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_line(row: dict, columns: tuple) -> str:
+    return ",".join(_copy_field(row[c]) for c in columns) + "\n"
+
+
+def _copy_rows(conn, table, columns: tuple, rows: list) -> None:
+    if conn.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(_copy_line(row, columns))
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer,
+            )
+        finally:
+            cursor.close()
+    else:
+        conn.execute(table.insert(), [{c: row[c] for c in columns} for row in rows])
+
+
+def write_batch(rows: list, user_id: int, source: str) -> None:
+    """Insert compounds and their "create" versions in one transaction"""
+    with engine.begin() as conn:
+        for row, compound_id in zip(rows, _reserve_ids(conn, len(rows))):
+            row.update(id=compound_id, external_source=source, created_by=user_id, version=1)
+        _copy_rows(conn, Compound.__table__, COMPOUND_COLUMNS, rows)
+        _copy_rows(conn, CompoundVersion.__table__, VERSION_COLUMNS, [
+            {
+                "compound_id": row["id"],
+                "version": 1,
+                "name": row["name"],
+                "smiles": row["smiles"],
+                "properties": row["properties"],
+                "changed_by": user_id,
+                "change_type": "create",
+            }
+            for row in rows
+        ])
+
+
+def existing_inchi_keys() -> set:
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=50000).execute(
+            select(Compound.inchi_key).filter(Compound.inchi_key.isnot(None))
+        )
+        return set(result.scalars())
+
+
+def existing_external_ids(source: str) -> set:
+    """IDs of the source already stored, e.g. by the API's ChEMBL imports, which set no InChIKey"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=50000).execute(
+            select(Compound.external_id).filter(
+                Compound.external_source == source,
+                Compound.external_id.isnot(None)
+            )
+        )
+        return set(result.scalars())
+
+
+# Checkpointing
+
+class Checkpoint:
+    """Records committed so far, saved atomically next to the dump by default"""
+
+    FIELDS = ("records_done", "inserted", "duplicates", "invalid")
+
+    def __init__(self, path: Path, source: Path):
+        self.path = path
+        self.source = {"file": str(source.resolve()), "size": source.stat().st_size}
+        self.records_done = self.inserted = self.duplicates = self.invalid = 0
+        if path.exists():
+            state = json.loads(path.read_text())
+            if state.get("source") != self.source:
+                raise SystemExit(f"Checkpoint {path} belongs to {state.get('source')}; remove it to start over")
+            for field in self.FIELDS:
+                setattr(self, field, state[field])
+
+    def save(self) -> None:
+        state = {"source": self.source, **{field: getattr(self, field) for field in self.FIELDS}}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.path)
+
+
+class Ingestion:
+    def __init__(self, args, user_id: int, checkpoint: Checkpoint):
+        self.args = args
+        self.user_id = user_id
+        self.checkpoint = checkpoint
+        self.seen = existing_inchi_keys()
+        self.seen_ids = existing_external_ids(args.source)
+        self.buffer = []
+        self.handled = checkpoint.records_done
+        self.started = time.perf_counter()
+        self.started_at = checkpoint.records_done
+
+    def handle(self, count: int, rows: list) -> None:
+        """Dedupe a processed chunk into the write buffer"""
+        for row in rows:
+            if row is None:
+                self.checkpoint.invalid += 1
+                continue
+            key = row["inchi_key"] or row["smiles"]
+            if key in self.seen or row["external_id"] in self.seen_ids:
+                self.checkpoint.duplicates += 1
+                continue
+            self.seen.add(key)
+            if row["external_id"] is not None:
+                self.seen_ids.add(row["external_id"])
+            self.buffer.append(row)
+        self.handled += count
+        if len(self.buffer) >= self.args.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            write_batch(self.buffer, self.user_id, self.args.source)
+            self.checkpoint.inserted += len(self.buffer)
+            self.buffer = []
+        self.checkpoint.records_done = self.handled
+        self.checkpoint.save()
+        elapsed = time.perf_counter() - self.started
+        rate = (self.handled - self.started_at) / elapsed if elapsed else 0.0
+        print(
+            f"{self.handled} records ({rate:.0f}/s): {self.checkpoint.inserted} inserted, "
+            f"{self.checkpoint.duplicates} duplicates, {self.checkpoint.invalid} invalid",
+            flush=True,
+        )
+
+    def run(self, records) -> None:
+        structure_format = "molblock" if self.args.format == "sdf" else "smiles"
+        chunks = iter(lambda: list(islice(records, self.args.chunk_size)), [])
+        with ProcessPoolExecutor(self.args.workers, initializer=_init_worker) as pool:
+            # Bounded read-ahead keeps every worker busy without reading the
+            # whole dump into memory; chunks are handled in order so the
+            # checkpoint only ever covers committed records
+            pending = deque()
+            for chunk in chunks:
+                future = pool.submit(process_chunk, chunk, structure_format, not self.args.no_standardize)
+                pending.append((len(chunk), future))
+                if len(pending) >= 2 * self.args.workers:
+                    count, future = pending.popleft()
+                    self.handle(count, future.result())
+            while pending:
+                count, future = pending.popleft()
+                self.handle(count, future.result())
+        self.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("dump", type=Path, help="chemreps TSV or SDF file, optionally gzipped")
+    parser.add_argument("--user-email", required=True, help="User recorded as creator")
+    parser.add_argument("--format", choices=("tsv", "sdf"), help="Default: from the file name")
+    parser.add_argument("--source", default="chembl", help="external_source of ingested compounds")
+    parser.add_argument("--id-column", default="chembl_id", help="TSV column holding the external id")
+    parser.add_argument("--smiles-column", default="canonical_smiles", help="TSV column holding SMILES")
+    parser.add_argument("--id-field", default="chembl_id", help="SDF field holding the external id; the title line if absent")
+    parser.add_argument("--name-field", help="TSV column or SDF field holding the name (default: the id)")
+    parser.add_argument("--no-standardize", action="store_true", help="Keep structures as given")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Records per worker task")
+    parser.add_argument("--batch-size", type=int, default=20000, help="Rows per transaction and checkpoint")
+    parser.add_argument("--checkpoint", type=Path, help="Default: <dump>.checkpoint.json")
+    parser.add_argument("--max-records", type=int, help="Stop after this many records (trial runs)")
+    args = parser.parse_args()
+
+    args.format = args.format or ("sdf" if ".sdf" in args.dump.suffixes else "tsv")
+    checkpoint = Checkpoint(args.checkpoint or args.dump.with_name(args.dump.name + ".checkpoint.json"), args.dump)
+
+    with engine.connect() as conn:
+        user_id = conn.execute(select(User.id).filter(User.email == args.user_email)).scalar()
+    if user_id is None:
+        raise SystemExit(f"No user {args.user_email}")
+
+    if args.format == "sdf":
+        records = read_sdf(args.dump, args.id_field, args.name_field)
+    else:
+        records = read_tsv(args.dump, args.id_column, args.smiles_column, args.name_field)
+    records = islice(records, checkpoint.records_done, None)
+    if args.max_records is not None:
+        records = islice(records, args.max_records)
+    if checkpoint.records_done:
+        print(f"Resuming after record {checkpoint.records_done}", flush=True)
+
+    Ingestion(args, user_id, checkpoint).run(records)
+    # Cached listings predate the new compounds. The rows were written
+    # without the ORM, so no commit hook did this; clearing bumps the shared
+    # generation in Redis, which drops the listings cached by every API process
+    compound_lists.clear()
+
+
+if __name__ == "__main__":
+    main()
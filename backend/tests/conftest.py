@@ -0,0 +1,15 @@
+import os
+import pytest
+
+# Fail requests that exceed their query budget instead of only logging it
+os.environ.setdefault("DB_QUERY_BUDGET_ENFORCE", "true")
+# Batch jobs run in the dispatching thread instead of going through Redis
+os.environ.setdefault("CELERY_TASK_ALWAYS_EAGER", "true")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def create_tables():
+    """Test clients are not started, so create the schema here"""
+    from app.core.database import Base, engine
+    import app.main  # noqa: F401 - registers every model
+    Base.metadata.create_all(bind=engine)
@@ -54,3 +54,103 @@ def test_login_invalid_credentials():
         }
     )
     assert response.status_code == 401
+
+
+def test_deactivated_user_is_rejected():
+    """Test that cached principals are invalidated on deactivation"""
+    from app.core.database import SessionLocal
+    from app.models.user import User
+
+    client.post(
+        "/api/v1/auth/register",
+        json={
+            "email": "deactivate@example.com",
+            "password": "testpassword123",
+            "full_name": "Test User"
+        }
+    )
+    response = client.post(
+        "/api/v1/auth/login",
+        data={
+            "username": "deactivate@example.com",
+            "password": "testpassword123"
+        }
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == "deactivate@example.com").first()
+        user.is_active = False
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.get("/api/v1/auth/me", headers=headers)
+    assert response.status_code == 400
+
+
+def test_invalidation_in_other_process_is_seen(monkeypatch):
+    """Test that every process drops a principal another process invalidated"""
+    import weakref
+    import fakeredis
+    import fakeredis.aioredis
+    from sqlalchemy import update
+    from app.core import auth_cache, cache
+    from app.core.config import settings
+    from app.core.database import SessionLocal
+    from app.models.user import User
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(settings, "CACHE_REDIS_ENABLED", True)
+    monkeypatch.setattr(
+        cache, "_connect",
+        lambda async_client: (fakeredis.aioredis.FakeRedis if async_client else fakeredis.FakeRedis)(server=server)
+    )
+    monkeypatch.setattr(cache, "_redis_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(cache, "_sync_redis_client", None)
+
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": "elsewhere@example.com", "password": "testpassword123"}
+    )
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "elsewhere@example.com", "password": "testpassword123"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+    # Deactivate without this process's ORM hooks seeing it
+    db = SessionLocal()
+    try:
+        db.execute(update(User).where(User.email == "elsewhere@example.com").values(is_active=False))
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200  # still cached
+
+    # The process that made the change bumps the shared generation
+    fakeredis.FakeRedis(server=server).incr(auth_cache.REDIS_GENERATION_PREFIX + "elsewhere@example.com")
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 400
+
+
+def test_login_rejected_when_hashing_queue_full(monkeypatch):
+    """Test 429 backpressure when the password executor is saturated"""
+    import threading
+    from app.core import security
+
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(security, "_password_slots", slots)
+
+    response = client.post(
+        "/api/v1/auth/login",
+        data={
+            "username": "login@example.com",
+            "password": "testpassword123"
+        }
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
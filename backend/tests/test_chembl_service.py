@@ -0,0 +1,338 @@
+"""Tests for the ChEMBL client against a local mock ChEMBL server"""
+import asyncio
+import socket
+import threading
+import time
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+from app.services import chembl_service
+from app.services.chembl_service import (
+    ChemblUnavailableError,
+    chembl_breaker,
+    chembl_lookups,
+    get_chembl_compound_by_id,
+)
+
+client = TestClient(app)
+
+
+class MockChembl:
+    """Serves molecules whose ids start with CHEMBL and records traffic"""
+
+    def __init__(self):
+        self.requests = 0
+        self.list_requests = 0
+        self.client_ports = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0.0
+        self.status = 200
+        self.app = FastAPI()
+        self.app.get("/molecule")(self.molecule_list)
+        self.app.get("/molecule/{chembl_id}")(self.molecule)
+
+    @staticmethod
+    def _molecule(chembl_id: str) -> dict:
+        # A distinct amino acid per id, so imports never clash with other tests
+        chain = "C" * (int(chembl_id.removeprefix("CHEMBL")) % 20)
+        return {
+            "molecule_chembl_id": chembl_id,
+            "pref_name": f"Molecule {chembl_id}",
+            "molecule_structures": {"canonical_smiles": f"NC{chain}C(=O)O"},
+            "alogp": "-0.03",
+            "molecular_weight": "75.07",
+            "num_ro5_violations": 0,
+        }
+
+    async def _respond(self, request: Request):
+        self.client_ports.add(request.client.port)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.status != 200:
+            return JSONResponse(status_code=self.status, content={"error": "unavailable"})
+        return None
+
+    async def molecule(self, chembl_id: str, request: Request):
+        self.requests += 1
+        error = await self._respond(request)
+        if error is not None:
+            return error
+        if not chembl_id.startswith("CHEMBL"):
+            return JSONResponse(status_code=404, content={"error": "not found"})
+        return self._molecule(chembl_id)
+
+    async def molecule_list(self, request: Request, molecule_chembl_id__in: str = "", limit: int = 20):
+        self.list_requests += 1
+        error = await self._respond(request)
+        if error is not None:
+            return error
+        ids = [i for i in molecule_chembl_id__in.split(",") if i.startswith("CHEMBL")]
+        return {"molecules": [self._molecule(i) for i in ids[:limit]], "page_meta": {"total_count": len(ids)}}
+
+
+@pytest.fixture
+def chembl(monkeypatch):
+    """Run a mock ChEMBL on an ephemeral local port and point the client at it"""
+    mock = MockChembl()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(mock.app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    monkeypatch.setattr(settings, "CHEMBL_API_URL", f"http://127.0.0.1:{sock.getsockname()[1]}")
+    chembl_service._clients.clear()
+    chembl_lookups._local.clear()
+    chembl_breaker.reset()
+    yield mock
+    chembl_service._clients.clear()
+    chembl_lookups._local.clear()
+    chembl_breaker.reset()
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def _run(coro_factory):
+    """Run coroutines on a fresh loop, closing that loop's client afterwards"""
+    async def main():
+        try:
+            return await coro_factory()
+        finally:
+            await chembl_service.close_chembl_client()
+    return asyncio.run(main())
+
+
+def test_lookups_share_one_keep_alive_connection(chembl):
+    async def lookups():
+        return [await get_chembl_compound_by_id(f"CHEMBL{i}") for i in range(5)]
+
+    results = _run(lookups)
+    assert [r["external_id"] for r in results] == [f"CHEMBL{i}" for i in range(5)]
+    assert results[1]["smiles"] == "NCCC(=O)O"
+    assert chembl.requests == 5
+    assert len(chembl.client_ports) == 1
+
+
+def test_lookups_and_misses_are_cached(chembl):
+    async def lookups():
+        return [
+            await get_chembl_compound_by_id("CHEMBL25"),
+            await get_chembl_compound_by_id("CHEMBL25"),
+            await get_chembl_compound_by_id("NOPE"),
+            await get_chembl_compound_by_id("NOPE"),
+        ]
+
+    found, cached, missing, cached_miss = _run(lookups)
+    assert found == cached and found["name"] == "Molecule CHEMBL25"
+    assert missing is None and cached_miss is None
+    assert chembl.requests == 2
+
+
+def test_identical_concurrent_lookups_coalesce(chembl):
+    chembl.delay = 0.2
+
+    async def lookups():
+        return await asyncio.gather(*(get_chembl_compound_by_id("CHEMBL1") for _ in range(10)))
+
+    results = _run(lookups)
+    assert all(r["external_id"] == "CHEMBL1" for r in results)
+    assert chembl.requests == 1
+
+
+def test_concurrency_is_bounded(chembl, monkeypatch):
+    monkeypatch.setattr(settings, "CHEMBL_MAX_CONCURRENCY", 2)
+    chembl.delay = 0.1
+
+    async def lookups():
+        return await asyncio.gather(*(get_chembl_compound_by_id(f"CHEMBL{i}") for i in range(6)))
+
+    assert len(_run(lookups)) == 6
+    assert chembl.requests == 6
+    assert chembl.max_in_flight == 2
+
+
+def test_breaker_fails_fast_and_recovers(chembl, monkeypatch):
+    monkeypatch.setattr(chembl_breaker, "failure_threshold", 3)
+    monkeypatch.setattr(chembl_breaker, "reset_timeout", 0.2)
+    chembl.status = 503
+
+    async def lookup():
+        return await get_chembl_compound_by_id("CHEMBL7")
+
+    for _ in range(4):
+        with pytest.raises(ChemblUnavailableError):
+            _run(lookup)
+    assert chembl.requests == 3  # the fourth call never left the process
+    assert chembl_breaker.is_open
+
+    # After the reset timeout a trial call goes through and closes it
+    chembl.status = 200
+    time.sleep(0.25)
+    assert _run(lookup)["external_id"] == "CHEMBL7"
+    assert not chembl_breaker.is_open
+    assert chembl.requests == 4
+
+
+@pytest.fixture
+def auth_headers():
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": "chembl@example.com", "password": "testpassword123"}
+    )
+    token = client.post(
+        "/api/v1/auth/login",
+        data={"username": "chembl@example.com", "password": "testpassword123"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_import_reports_unavailable_chembl(chembl, monkeypatch, auth_headers):
+    monkeypatch.setattr(chembl_breaker, "failure_threshold", 1)
+    chembl.status = 500
+
+    response = client.post("/api/v1/compounds/import/chembl/CHEMBL9", headers=auth_headers)
+    assert response.status_code == 503
+    assert chembl.requests == 1
+
+
+def test_bulk_import_batches_and_skips_existing(chembl, monkeypatch, auth_headers):
+    monkeypatch.setattr(settings, "CHEMBL_BULK_BATCH_SIZE", 2)
+    existing = client.post("/api/v1/compounds/import/chembl/CHEMBL1001", headers=auth_headers)
+    assert existing.status_code == 200
+
+    response = client.post(
+        "/api/v1/compounds/import/chembl/bulk",
+        json={"chembl_ids": ["chembl1001", "CHEMBL1002", "CHEMBL1003", "CHEMBL1002", "NOPE1", "CHEMBL1004"]},
+        headers=auth_headers
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["job_type"] == "chembl_import"
+    assert job["total"] == 5
+
+    # The test client runs background tasks before returning
+    job = client.get(f"/api/v1/jobs/{job['id']}", headers=auth_headers).json()
+    assert job["status"] == "completed"
+    assert job["processed"] == 5
+    assert job["result"]["existing"] == 1
+    assert job["result"]["imported"] == 3
+    assert job["result"]["not_found"] == ["NOPE1"]
+    assert job["result"]["failed"] == []
+    assert chembl.list_requests == 2  # four new ids in batches of two
+
+    compounds = client.get(
+        "/api/v1/compounds/", params={"search": "Molecule CHEMBL100"}, headers=auth_headers
+    ).json()
+    assert sorted(c["external_id"] for c in compounds) == [f"CHEMBL100{i}" for i in range(1, 5)]
+    imported = next(c for c in compounds if c["external_id"] == "CHEMBL1004")
+    assert imported["smiles"] == "NCCCCCC(=O)O"
+    assert imported["molecular_weight"] is not None
+    versions = client.get(f"/api/v1/compounds/{imported['id']}/versions", headers=auth_headers).json()
+    assert [v["change_type"] for v in versions] == ["create"]
+
+
+def test_bulk_import_records_failed_batches(chembl, auth_headers):
+    chembl.status = 503
+    job = client.post(
+        "/api/v1/compounds/import/chembl/bulk",
+        json={"chembl_ids": ["CHEMBL2001", "CHEMBL2002"]},
+        headers=auth_headers
+    ).json()
+
+    job = client.get(f"/api/v1/jobs/{job['id']}", headers=auth_headers).json()
+    assert job["status"] == "completed"
+    assert job["processed"] == 2
+    assert job["result"]["failed"] == ["CHEMBL2001", "CHEMBL2002"]
+    assert "503" in job["error"]
+
+
+def test_bulk_import_job_resumes(chembl, monkeypatch, auth_headers):
+    from app.tasks import import_tasks
+    # The message is lost with its worker before the job runs
+    with monkeypatch.context() as lost:
+        lost.setattr(import_tasks.run_chembl_import_task, "apply_async", lambda *args, **kwargs: None)
+        job = client.post(
+            "/api/v1/compounds/import/chembl/bulk",
+            json={"chembl_ids": ["CHEMBL3001", "CHEMBL3002"]},
+            headers=auth_headers
+        ).json()
+    assert client.get(f"/api/v1/jobs/{job['id']}", headers=auth_headers).json()["status"] == "pending"
+
+    # ...and the job makes no progress for JOB_STALE_SECONDS
+    monkeypatch.setattr(settings, "JOB_STALE_SECONDS", 0)
+    response = client.post(f"/api/v1/jobs/{job['id']}/resume", headers=auth_headers)
+    assert response.status_code == 202
+    job = client.get(f"/api/v1/jobs/{job['id']}", headers=auth_headers).json()
+    assert (job["status"], job["processed"], job["result"]["imported"]) == ("completed", 2, 2)
+
+    response = client.post(f"/api/v1/jobs/{job['id']}/resume", headers=auth_headers)
+    assert response.status_code == 409
+
+
+def test_running_import_job_runs_once(chembl, monkeypatch, auth_headers):
+    from sqlalchemy import func, select, update
+    from app.core.database import AsyncSessionLocal, SessionLocal, async_engine
+    from app.models.compound import Compound
+    from app.models.job import Job
+    from app.services.chembl_import_service import _compound_rows, _insert_compounds
+    from app.tasks import import_tasks
+    chembl_ids = ["CHEMBL3101", "CHEMBL3102"]
+    with monkeypatch.context() as lost:
+        lost.setattr(import_tasks.run_chembl_import_task, "apply_async", lambda *args, **kwargs: None)
+        job = client.post(
+            "/api/v1/compounds/import/chembl/bulk",
+            json={"chembl_ids": chembl_ids},
+            headers=auth_headers
+        ).json()
+    # A worker picks the job up
+    db = SessionLocal()
+    try:
+        db.execute(update(Job).where(Job.id == job["id"]).values(status="running"))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.post(f"/api/v1/jobs/{job['id']}/resume", headers=auth_headers)
+    assert response.status_code == 409
+    # Nor does a redelivered message start a second run
+    import_tasks.run_chembl_import_task(job["id"])
+    assert chembl.list_requests == 0
+
+    # Once the worker is gone for JOB_STALE_SECONDS, the job resumes
+    monkeypatch.setattr(settings, "JOB_STALE_SECONDS", 0)
+    assert client.post(f"/api/v1/jobs/{job['id']}/resume", headers=auth_headers).status_code == 202
+    job = client.get(f"/api/v1/jobs/{job['id']}", headers=auth_headers).json()
+    assert (job["status"], job["result"]["imported"]) == ("completed", 2)
+
+    # A run that overlapped the resumed one inserts nothing more
+    async def insert_again():
+        try:
+            async with AsyncSessionLocal() as db:
+                records = [chembl_service._molecule_record(MockChembl._molecule(i)) for i in chembl_ids]
+                inserted = await _insert_compounds(db, _compound_rows(records, job["user_id"]))
+                await db.commit()
+                return inserted
+        finally:
+            await async_engine.dispose()
+    assert asyncio.run(insert_again()) == []
+
+    db = SessionLocal()
+    try:
+        counts = db.execute(
+            select(Compound.external_id, func.count()).filter(Compound.external_id.in_(chembl_ids))
+            .group_by(Compound.external_id)
+        ).all()
+    finally:
+        db.close()
+    assert sorted(counts) == [(i, 1) for i in chembl_ids]
@@ -0,0 +1,187 @@
+"""Tests for the compound read-through cache"""
+import asyncio
+import weakref
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core import cache
+from app.core.cache import ReadThroughCache
+from app.core.config import settings
+from app.services.compound_cache import compound_details, compound_lists, compound_version_pages
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """Use an in-memory Redis stand-in and start from empty local tiers"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(settings, "CACHE_REDIS_ENABLED", True)
+    monkeypatch.setattr(
+        cache, "_connect",
+        lambda async_client: (fakeredis.aioredis.FakeRedis if async_client else fakeredis.FakeRedis)(server=server)
+    )
+    monkeypatch.setattr(cache, "_redis_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(cache, "_sync_redis_client", None)
+    for tier in (compound_details, compound_lists, compound_version_pages):
+        tier._local.clear()
+    yield fakeredis.FakeRedis(server=server)
+    for tier in (compound_details, compound_lists, compound_version_pages):
+        tier._local.clear()
+
+
+@pytest.fixture
+def auth_headers():
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": "cache@example.com", "password": "testpassword123"}
+    )
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "cache@example.com", "password": "testpassword123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def _query_count(response) -> int:
+    return int(response.headers["Server-Timing"].split('desc="')[1].split()[0])
+
+
+def test_compound_reads_served_from_cache(redis, auth_headers):
+    compound = client.post(
+        "/api/v1/compounds/",
+        json={"name": "Cached", "smiles": "CC(C)CO"},
+        headers=auth_headers
+    ).json()
+    url = f"/api/v1/compounds/{compound['id']}"
+    client.get("/api/v1/auth/me", headers=auth_headers)  # warm the principal cache
+
+    assert _query_count(client.get(url, headers=auth_headers)) > 0
+    response = client.get(url, headers=auth_headers)
+    assert response.json()["name"] == "Cached"
+    assert _query_count(response) == 0
+
+    # Another process has an empty local tier but shares Redis
+    compound_details._local.clear()
+    assert _query_count(client.get(url, headers=auth_headers)) == 0
+
+    client.get(f"{url}/versions", headers=auth_headers)
+    assert _query_count(client.get(f"{url}/versions", headers=auth_headers)) == 0
+
+
+def test_writes_invalidate_cached_reads(redis, auth_headers):
+    compound = client.post(
+        "/api/v1/compounds/",
+        json={"name": "Before", "smiles": "CC(C)CCO"},
+        headers=auth_headers
+    ).json()
+    url = f"/api/v1/compounds/{compound['id']}"
+    client.get(url, headers=auth_headers)
+    listing = client.get("/api/v1/compounds/", headers=auth_headers).json()
+
+    client.put(url, json={"name": "After"}, headers=auth_headers)
+    assert client.get(url, headers=auth_headers).json()["name"] == "After"
+    compound_details._local.clear()
+    assert client.get(url, headers=auth_headers).json()["name"] == "After"
+
+    history = client.get(f"{url}/versions", headers=auth_headers).json()
+    client.post(f"{url}/rollback/1", headers=auth_headers)
+    assert len(client.get(f"{url}/versions", headers=auth_headers).json()) == len(history) + 2
+    assert client.get(url, headers=auth_headers).json()["name"] == "Before"
+
+    client.post(
+        "/api/v1/compounds/",
+        json={"name": "Newcomer", "smiles": "CC(C)CCCO"},
+        headers=auth_headers
+    )
+    compound_lists._local.clear()
+    names = [c["name"] for c in client.get("/api/v1/compounds/", headers=auth_headers).json()]
+    assert "Newcomer" in names
+    assert len(names) == len(listing) + 1
+
+
+def test_concurrent_misses_load_once():
+    tier = ReadThroughCache("test:singleflight", ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def main():
+        return await asyncio.gather(*[tier.get_or_load("key", loader) for _ in range(20)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r == {"value": 42} for r in results)
+
+
+def test_load_racing_invalidation_is_not_stored():
+    tier = ReadThroughCache("test:race", ttl=60)
+
+    async def loader():
+        tier.invalidate("key")  # a write commits while the load is in flight
+        return {"value": "stale"}
+
+    assert asyncio.run(tier.get_or_load("key", loader)) == {"value": "stale"}
+    assert asyncio.run(tier.get("key")) is None
+
+
+def test_waits_for_load_in_other_process(redis):
+    tier = ReadThroughCache("test:lock", ttl=60)
+    redis.set("test:lock:lock:key", "1")  # held by another process
+
+    async def other_process():
+        await asyncio.sleep(0.05)
+        redis.set("test:lock:key", '{"value": "theirs"}')
+
+    async def loader():
+        raise AssertionError("should reuse the other process's result")
+
+    async def main():
+        publisher = asyncio.create_task(other_process())
+        value = await tier.get_or_load("key", loader)
+        await publisher
+        return value
+
+    assert asyncio.run(main()) == {"value": "theirs"}
+
+
+def test_local_copies_expire_without_redis(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_REDIS_ENABLED", False)
+    tier = ReadThroughCache("test:local", ttl=300)
+    # Invalidations only reach this process, so others hold entries briefly
+    assert tier._local.ttl == settings.CACHE_LOCAL_TTL_SECONDS
+
+
+def test_invalidation_outside_event_loop_reaches_redis(redis):
+    tier = ReadThroughCache("test:sync", ttl=60)
+    asyncio.run(tier.set("key", {"value": 1}))
+    assert redis.get("test:sync:key") is not None
+
+    tier.invalidate("key")  # e.g. a commit in a Celery task or script
+    assert redis.get("test:sync:key") is None
+
+
+def test_clear_reaches_every_process(redis):
+    tier = ReadThroughCache("test:grouped", ttl=60, grouped=True)
+    elsewhere = ReadThroughCache("test:grouped", ttl=60, grouped=True)  # the same cache in another process
+    asyncio.run(tier.set("page", {"value": 1}))
+    assert asyncio.run(elsewhere.get("page")) == {"value": 1}
+
+    tier.clear()  # e.g. the ingest script, outside an event loop
+    assert asyncio.run(elsewhere.get("page")) is None
+
+
+def test_grouped_load_racing_clear_elsewhere_is_ignored(redis):
+    tier = ReadThroughCache("test:grouped-race", ttl=60, grouped=True)
+
+    async def loader():
+        redis.incr("test:grouped-race:generation")  # another process clears mid-load
+        return {"value": "stale"}
+
+    assert asyncio.run(tier.get_or_load("page", loader)) == {"value": "stale"}
+    assert asyncio.run(tier.get("page")) is None
@@ -50,3 +50,91 @@ def test_list_compounds(auth_token):
     response = client.get("/api/v1/compounds", headers=headers)
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+
+def test_list_compounds_as_of(auth_token):
+    """Test listing the library as of a past timestamp"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.get(
+        "/api/v1/compounds",
+        params={"as_of": "2000-01-01T00:00:00"},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+
+    response = client.get(
+        "/api/v1/compounds",
+        params={"as_of": "2000-01-01T00:00:00", "search": "Ethanol"},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_get_compound_conditional(auth_token):
+    """Test ETag revalidation of a single compound"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    compound = client.post(
+        "/api/v1/compounds",
+        json={"name": "Propanol", "smiles": "CCCO"},
+        headers=headers
+    ).json()
+    url = f"/api/v1/compounds/{compound['id']}"
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    client.put(url, json={"name": "1-Propanol"}, headers=headers)
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["name"] == "1-Propanol"
+
+    versions_url = f"{url}/versions"
+    etag = client.get(versions_url, headers=headers).headers["ETag"]
+    assert client.get(versions_url, headers={**headers, "If-None-Match": etag}).status_code == 304
+    client.put(url, json={"name": "Propan-1-ol"}, headers=headers)
+    assert client.get(versions_url, headers={**headers, "If-None-Match": etag}).status_code == 200
+
+
+def test_list_compounds_conditional(auth_token):
+    """Test that list ETags change when the listed rows change"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    etag = client.get("/api/v1/compounds", headers=headers).headers["ETag"]
+    response = client.get("/api/v1/compounds", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Different parameters are a different representation
+    response = client.get(
+        "/api/v1/compounds", params={"limit": 5}, headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+
+    client.post("/api/v1/compounds", json={"name": "Hexanediol", "smiles": "OCCCCCCO"}, headers=headers)
+    response = client.get("/api/v1/compounds", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_list_compounds_sparse_fields(auth_token):
+    """Test projecting list rows to the requested columns"""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    full = client.get("/api/v1/compounds", headers=headers)
+    response = client.get(
+        "/api/v1/compounds", params={"fields": "id,name,molecular_weight"}, headers=headers
+    )
+    assert response.status_code == 200
+    rows = response.json()
+    assert rows
+    assert all(set(row) == {"id", "name", "molecular_weight"} for row in rows)
+    assert [row["id"] for row in rows] == [row["id"] for row in full.json()]
+    assert response.headers["ETag"] != full.headers["ETag"]
+
+    response = client.get("/api/v1/compounds", params={"fields": "id,password"}, headers=headers)
+    assert response.status_code == 400
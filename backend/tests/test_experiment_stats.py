@@ -0,0 +1,56 @@
+"""Tests for running experiment statistics"""
+import random
+import statistics
+import pytest
+from app.services.experiment_stats_service import RunningStats, QuantileSketch
+
+
+def test_running_stats_match_batch_statistics():
+    """Test Welford updates against a full recomputation"""
+    values = [random.uniform(-5, 50) for _ in range(1000)]
+    stats = RunningStats().update(values)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.variance == pytest.approx(statistics.variance(values))
+    assert stats.min == min(values)
+    assert stats.max == max(values)
+
+
+def test_merged_shards_equal_single_pass():
+    """Test that merging partial statistics matches a single pass"""
+    values = [random.gauss(10, 3) for _ in range(900)]
+    shards = [RunningStats().update(values[i:i + 300]) for i in range(0, 900, 300)]
+
+    merged = RunningStats()
+    for shard in shards:
+        # Round-trip through JSON-friendly state like a stored experiment
+        merged.merge(RunningStats.from_dict(shard.to_dict()))
+    single = RunningStats().update(values)
+
+    assert merged.count == single.count
+    assert merged.mean == pytest.approx(single.mean)
+    assert merged.variance == pytest.approx(single.variance)
+    assert merged.sketch.to_dict() == single.sketch.to_dict()
+
+
+def test_quantile_sketch_relative_accuracy():
+    """Test sketch quantiles stay within the configured relative error"""
+    values = sorted(random.uniform(0.01, 100) for _ in range(5000))
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.05, 0.5, 0.95):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+
+def test_summary_handles_empty_and_single_value():
+    """Test summaries for degenerate inputs"""
+    assert RunningStats().summary() == {"prediction_count": 0}
+
+    summary = RunningStats().update([0.0, None]).summary()
+    assert summary["prediction_count"] == 1
+    assert summary["prediction_std"] == 0.0
+    assert summary["prediction_p50"] == 0.0
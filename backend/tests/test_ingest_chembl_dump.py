@@ -0,0 +1,132 @@
+"""Tests for the offline ChEMBL dump ingestion script"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from sqlalchemy import create_engine, text
+from app.core.database import Base
+from app.models.user import User
+
+BACKEND = Path(__file__).parent.parent
+
+CHEMREPS = [
+    ("chembl_id", "canonical_smiles", "standard_inchi", "standard_inchi_key"),
+    ("CHEMBL25", "CC(=O)Nc1ccc(O)cc1", "", ""),
+    ("CHEMBL26", "CC(=O)Nc1ccc(O)cc1.Cl", "", ""),  # salt of CHEMBL25
+    ("CHEMBL27", "CC(C)Cc1ccc(cc1)C(C)C(=O)O", "", ""),
+    ("CHEMBL28", "CC(C)Cc1ccc(cc1)C(C)C(=O)[O-].[Na+]", "", ""),  # charged salt of CHEMBL27
+    ("CHEMBL29", "not a smiles", "", ""),
+    ("CHEMBL30", "CN1CCC[C@H]1c1cccnc1", "", ""),
+    ("CHEMBL31", "COc1ccc2cc(ccc2c1)[C@H](C)C(=O)O", "", ""),
+]
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A throwaway database with the schema and an ingesting user"""
+    url = f"sqlite:///{tmp_path / 'ingest.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), {"email": "ingest@example.com", "hashed_password": "x"})
+    yield engine, url
+    engine.dispose()
+
+
+def _ingest(url, dump, *args):
+    result = subprocess.run(
+        [sys.executable, "scripts/ingest_chembl_dump.py", str(dump),
+         "--user-email", "ingest@example.com", "--workers", "2", "--chunk-size", "2", "--batch-size", "2", *args],
+        cwd=BACKEND,
+        env={**os.environ, "DATABASE_URL": url},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    return result
+
+
+def test_ingest_standardizes_dedupes_and_resumes(database, tmp_path):
+    engine, url = database
+    dump = tmp_path / "chemreps.txt"
+    dump.write_text("".join("\t".join(row) + "\n" for row in CHEMREPS))
+
+    # Stop part-way, then rerun the same command to resume
+    _ingest(url, dump, "--max-records", "3")
+    checkpoint = json.loads((tmp_path / "chemreps.txt.checkpoint.json").read_text())
+    assert checkpoint["records_done"] == 3
+    assert checkpoint["inserted"] == 2
+
+    assert "Resuming after record 3" in _ingest(url, dump).stdout
+    checkpoint = json.loads((tmp_path / "chemreps.txt.checkpoint.json").read_text())
+    assert checkpoint["records_done"] == 7
+    assert checkpoint["inserted"] == 4
+    assert checkpoint["duplicates"] == 2
+    assert checkpoint["invalid"] == 1
+
+    with engine.connect() as conn:
+        compounds = conn.execute(text(
+            "SELECT id, external_id, smiles, inchi_key, molecular_weight, properties FROM compounds ORDER BY external_id"
+        )).all()
+        versions = conn.execute(text(
+            "SELECT compound_id, version, change_type FROM compound_versions ORDER BY compound_id"
+        )).all()
+    assert [c.external_id for c in compounds] == ["CHEMBL25", "CHEMBL27", "CHEMBL30", "CHEMBL31"]
+    assert len({c.inchi_key for c in compounds}) == 4
+    assert compounds[1].smiles == "CC(C)Cc1ccc(C(C)C(=O)O)cc1"
+    assert compounds[0].molecular_weight == pytest.approx(151.16, abs=0.01)
+    assert json.loads(compounds[0].properties)["hbd"] == 2
+    assert versions == [(c.id, 1, "create") for c in sorted(compounds, key=lambda c: c.id)]
+
+    # Once complete, a rerun ingests nothing new
+    _ingest(url, dump)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM compounds")).scalar() == 4
+
+
+def test_ingest_sdf(database, tmp_path):
+    engine, url = database
+    from rdkit import Chem
+    dump = tmp_path / "vendor.sdf"
+    with Chem.SDWriter(str(dump)) as writer:
+        for vendor_id, smiles in (("V-1", "OC(=O)c1ccccc1O"), ("V-2", "OC(=O)c1ccccc1[O-].[K+]")):
+            mol = Chem.MolFromSmiles(smiles)
+            mol.SetProp("catalog_id", vendor_id)
+            writer.write(mol)
+
+    _ingest(url, dump, "--source", "vendor", "--id-field", "catalog_id")
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT external_id, external_source, smiles FROM compounds")).all()
+    assert rows == [("V-1", "vendor", "O=C(O)c1ccccc1O")]
+
+
+def test_ingest_skips_ids_imported_through_the_api(database, tmp_path):
+    engine, url = database
+    dump = tmp_path / "chemreps.txt"
+    dump.write_text("".join("\t".join(row) + "\n" for row in CHEMREPS))
+    # API imports store no InChIKey, so only the ID identifies them
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO compounds (name, smiles, external_id, external_source, created_by, version) "
+            "VALUES ('Naproxen', 'COc1ccc2cc(ccc2c1)[C@H](C)C(=O)O', 'CHEMBL31', 'chembl', 1, 1)"
+        ))
+
+    _ingest(url, dump)
+    checkpoint = json.loads((tmp_path / "chemreps.txt.checkpoint.json").read_text())
+    assert (checkpoint["inserted"], checkpoint["duplicates"]) == (3, 3)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM compounds WHERE external_id = 'CHEMBL31'")).scalar() == 1
+
+
+def test_copy_keeps_empty_strings_apart_from_null():
+    spec = importlib.util.spec_from_file_location("ingest_chembl_dump", BACKEND / "scripts" / "ingest_chembl_dump.py")
+    ingest = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ingest)
+
+    row = {"name": "", "inchi": None, "smiles": 'C"C', "external_id": r"\N", "properties": {"alogp": None}}
+    line = ingest._copy_line(row, tuple(row))
+    # Only the unquoted marker is NULL to COPY
+    assert line == '"",\\N,"C""C","\\N","{""alogp"": null}"\n'
@@ -0,0 +1,32 @@
+"""Tests for the Prometheus metrics endpoint"""
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.ml_service import calculate_molecular_properties, predict_toxicity
+
+client = TestClient(app)
+
+
+def test_metrics_endpoint_reports_route_latency():
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+
+
+def test_metrics_use_route_templates():
+    """Path parameters must not create one time series per id"""
+    client.get("/api/v1/compounds/12345")
+    body = client.get("/metrics").text
+    assert 'route="/api/v1/compounds/{compound_id}"' in body
+    assert "/api/v1/compounds/12345" not in body
+
+
+def test_hot_path_histograms():
+    calculate_molecular_properties("c1ccccc1O")
+    predict_toxicity("c1ccccc1O")
+    body = client.get("/metrics").text
+    assert "rdkit_parse_seconds_count" in body
+    assert "descriptor_calculation_seconds_count" in body
+    assert 'model_inference_seconds_count{model="toxicity"}' in body
+    assert 'db_pool_size{engine="sync"}' in body
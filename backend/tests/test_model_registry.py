@@ -0,0 +1,194 @@
+"""Tests for loading prediction models from an MLflow registry"""
+import gc
+import multiprocessing
+import threading
+import time
+import mlflow.sklearn
+import numpy as np
+import pandas as pd
+import pytest
+from mlflow.exceptions import MlflowException
+from mlflow.tracking import MlflowClient
+from sklearn.linear_model import LinearRegression
+from app.core.config import settings
+from app.services import model_registry
+from app.services.ml_service import DESCRIPTOR_NAMES, calculate_molecular_properties, predict_solubility
+from app.services.model_registry import ModelRegistry, ModelRegistryError
+
+SMILES = "CC(C)Cc1ccc(cc1)C(C)C(=O)O"  # ibuprofen
+
+
+def _fit(slope):
+    """A linear model of logP, trained on descriptor frames like the ones predictions use"""
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 5, size=(20, len(DESCRIPTOR_NAMES)))
+    y = slope * X[:, DESCRIPTOR_NAMES.index("logp")] + 1.0
+    return LinearRegression().fit(pd.DataFrame(X, columns=list(DESCRIPTOR_NAMES)), y)
+
+
+@pytest.fixture
+def registry_uri(tmp_path, monkeypatch):
+    """A file-store registry; register(name, slope) adds a version and promotes it to Production"""
+    monkeypatch.setattr(settings, "MODEL_REFRESH_SECONDS", 0)
+    uri = (tmp_path / "mlruns").as_uri()
+    client = MlflowClient(tracking_uri=uri, registry_uri=uri)
+
+    def register(name, slope, model_type="solubility", stage="Production"):
+        path = tmp_path / f"{name}-{slope}"
+        mlflow.sklearn.save_model(_fit(slope), str(path))
+        try:
+            client.create_registered_model(name, tags={"model_type": model_type})
+        except Exception:
+            pass  # already registered
+        version = client.create_model_version(name, str(path)).version
+        client.transition_model_version_stage(name, version, stage, archive_existing_versions=True)
+        return version
+
+    return uri, register
+
+
+def _logp():
+    return calculate_molecular_properties(SMILES)["logp"]
+
+
+def test_resolves_stage_and_pinned_version(registry_uri):
+    uri, register = registry_uri
+    register("solubility_qsar", 2.0)
+    registry = ModelRegistry(uri, max_bytes=10**9)
+    properties = calculate_molecular_properties(SMILES)
+
+    model = registry.get("solubility", "solubility_qsar")
+    assert model.version == "1"
+    assert model.predict([properties])[0] == pytest.approx(2 * _logp() + 1)
+    assert registry.get("solubility", "solubility_qsar/1").version == "1"
+    assert registry.get("solubility", "solubility_qsar") is model  # cached
+    assert registry.get("solubility", "not_registered") is None
+    assert registry.get("solubility", "solubility_qsar/Staging") is None
+    with pytest.raises(ModelRegistryError):
+        registry.get("toxicity", "solubility_qsar")
+
+
+def test_hot_swap_on_new_production_version(registry_uri):
+    uri, register = registry_uri
+    register("solubility_swap", 2.0)
+    registry = ModelRegistry(uri, max_bytes=10**9)
+    properties = calculate_molecular_properties(SMILES)
+    old = registry.get("solubility", "solubility_swap")
+
+    register("solubility_swap", 3.0)
+    # Nothing changes until the refresh has loaded the new version
+    assert registry.get("solubility", "solubility_swap") is old
+
+    results, stop = [], threading.Event()
+
+    def predict():
+        while not stop.is_set():
+            results.append(registry.get("solubility", "solubility_swap").predict([properties])[0])
+
+    reader = threading.Thread(target=predict)
+    reader.start()
+    try:
+        assert registry.refresh() == 1
+    finally:
+        stop.set()
+        reader.join()
+
+    new = registry.get("solubility", "solubility_swap")
+    assert new.version == "2"
+    assert new.predict([properties])[0] == pytest.approx(3 * _logp() + 1)
+    # A request that still holds the old version can finish with it
+    assert old.predict([properties])[0] == pytest.approx(2 * _logp() + 1)
+    # Every request during the swap got one of the two versions
+    assert set(np.round(results, 6)) <= {round(2 * _logp() + 1, 6), round(3 * _logp() + 1, 6)}
+    assert registry.refresh() == 0
+
+
+def test_cache_evicts_least_recently_used_by_size(registry_uri):
+    uri, register = registry_uri
+    for name in ("solubility_a", "solubility_b", "solubility_c"):
+        register(name, 2.0)
+    size = ModelRegistry(uri, max_bytes=10**9).get("solubility", "solubility_a").size_bytes
+    registry = ModelRegistry(uri, max_bytes=int(size * 2.5))
+
+    a = registry.get("solubility", "solubility_a")
+    registry.get("solubility", "solubility_b")
+    registry.get("solubility", "solubility_a")  # a is now more recent than b
+    registry.get("solubility", "solubility_c")
+
+    assert [key[0] for key in registry._models] == ["solubility_a", "solubility_c"]
+    assert registry.cached_bytes <= registry.max_bytes
+    assert registry.get("solubility", "solubility_a") is a
+    assert registry.get("solubility", "solubility_b").version == "1"  # loaded again
+
+
+def test_predictions_use_registered_model(registry_uri, monkeypatch):
+    uri, register = registry_uri
+    register("solubility_registered", 2.0)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_URI", uri)
+    monkeypatch.setattr(model_registry, "_registry", None)
+
+    assert [m.name for m in model_registry.preload_models("solubility:solubility_registered,toxicity:nope")] == [
+        "solubility_registered"
+    ]
+    result = predict_solubility(SMILES, "solubility_registered")
+    assert result["prediction_value"] == pytest.approx(2 * _logp() + 1)
+    assert result["prediction_details"]["model_version"] == "1"
+
+    # Names that are not registered keep using the built-in heuristic
+    heuristic = predict_solubility(SMILES)
+    assert "model_version" not in heuristic["prediction_details"]
+    assert heuristic["prediction_value"] != pytest.approx(result["prediction_value"])
+
+
+
+def test_registry_failure_falls_back_to_heuristic(registry_uri, monkeypatch):
+    uri, register = registry_uri
+    register("solubility_flaky", 2.0)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_URI", uri)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_RETRY_SECONDS", 0.2)
+    monkeypatch.setattr(model_registry, "_registry", None)
+    registry = model_registry.get_model_registry()
+    calls = []
+
+    def unavailable(*args, **kwargs):
+        calls.append(args)
+        raise MlflowException("registry is down", error_code="TEMPORARILY_UNAVAILABLE")
+
+    with monkeypatch.context() as down:
+        down.setattr(registry.client, "get_latest_versions", unavailable)
+        result = predict_solubility(SMILES, "solubility_flaky")
+        assert "error" not in result
+        assert "model_version" not in result["prediction_details"]
+        assert predict_solubility(SMILES, "solubility_flaky")["prediction_value"] == result["prediction_value"]
+        assert len(calls) == 1  # the failure is remembered
+
+    time.sleep(0.3)
+    result = predict_solubility(SMILES, "solubility_flaky")
+    assert result["prediction_details"]["model_version"] == "1"
+
+def _inherited_model(queue):
+    registry = model_registry.get_model_registry()
+    model = registry.get("solubility", "solubility_shared")
+    queue.put((id(model.model), model.predict([calculate_molecular_properties(SMILES)])[0]))
+
+
+def test_forked_workers_inherit_preloaded_models(registry_uri, monkeypatch):
+    uri, register = registry_uri
+    register("solubility_shared", 2.0)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_URI", uri)
+    monkeypatch.setattr(settings, "MODEL_PRELOAD", "solubility:solubility_shared")
+    monkeypatch.setattr(model_registry, "_registry", None)
+    try:
+        [model] = model_registry.preload_before_fork()
+    finally:
+        gc.unfreeze()
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    worker = context.Process(target=_inherited_model, args=(queue,))
+    worker.start()
+    model_id, value = queue.get(timeout=60)
+    worker.join()
+    # The worker used the parent's copy rather than loading its own
+    assert model_id == id(model.model)
+    assert value == pytest.approx(2 * _logp() + 1)
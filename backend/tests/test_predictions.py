@@ -0,0 +1,419 @@
+"""Tests for prediction storage and reads"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.main import app
+from app.core.database import SessionLocal
+from app.models.experiment import DescriptorSet, ModelVersion, Prediction
+from app.services.ml_service import predict_solubility, predict_toxicity
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def auth_headers():
+    """Register and log in a user"""
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": "predictions@example.com", "password": "testpassword123"}
+    )
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "predictions@example.com", "password": "testpassword123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def compound(auth_headers):
+    response = client.post(
+        "/api/v1/compounds/",
+        json={"name": "Prediction probe", "smiles": "OCC(O)CCO"},
+        headers=auth_headers
+    )
+    return response.json()
+
+
+def test_prediction_details_stored_compactly(auth_headers, compound):
+    """Model metadata and descriptors are shared rows; reads rebuild the details"""
+    created = []
+    for model_type in ("solubility", "toxicity", "solubility"):
+        response = client.post(
+            "/api/v1/predictions/",
+            json={"compound_id": compound["id"], "model_type": model_type},
+            headers=auth_headers
+        )
+        assert response.status_code == 201
+        created.append(response.json())
+
+    expected = [predict_solubility(compound["smiles"], None), predict_toxicity(compound["smiles"], None)]
+    assert created[0]["prediction_details"] == {**expected[0]["prediction_details"], "model_name": None}
+    assert created[1]["prediction_details"] == {**expected[1]["prediction_details"], "model_name": None}
+
+    # Reads return the same details as the write did
+    listed = client.get(
+        "/api/v1/predictions/", params={"compound_id": compound["id"]}, headers=auth_headers
+    ).json()
+    assert {p["id"]: p["prediction_details"] for p in listed} == {
+        p["id"]: p["prediction_details"] for p in created
+    }
+    fetched = client.get(f"/api/v1/predictions/{created[1]['id']}", headers=auth_headers).json()
+    assert fetched == created[1]
+
+    with SessionLocal() as db:
+        rows = db.scalars(select(Prediction).filter(Prediction.id.in_([p["id"] for p in created]))).all()
+        rows.sort(key=lambda row: row.id)
+        assert len({row.descriptor_set_id for row in rows}) == 1
+        assert rows[0].model_version_id == rows[2].model_version_id != rows[1].model_version_id
+        assert rows[0].details_extra is None
+        assert rows[1].details_extra == {
+            k: v for k, v in expected[1]["prediction_details"].items()
+            if k in ("is_toxic", "risk_level")
+        }
+        descriptors = db.get(DescriptorSet, rows[0].descriptor_set_id).descriptors
+        assert descriptors == expected[0]["prediction_details"]["properties_used"]
+        assert db.get(ModelVersion, rows[1].model_version_id).details == {
+            "model_type": "toxicity", "model_name": None
+        }
+        # Sync sessions rebuild the details through lazy loads
+        assert rows[1].prediction_details == created[1]["prediction_details"]
+
+
+def test_prediction_experiment_must_belong_to_user(auth_headers, compound):
+    """Predictions only fold into the caller's own experiments"""
+    experiment = client.post(
+        "/api/v1/experiments/",
+        json={"name": "Owned stats", "model_type": "qsar"},
+        headers=auth_headers
+    ).json()
+    client.post("/api/v1/auth/register", json={"email": "intruder@example.com", "password": "testpassword123"})
+    token = client.post(
+        "/api/v1/auth/login",
+        data={"username": "intruder@example.com", "password": "testpassword123"}
+    ).json()["access_token"]
+
+    body = {"compound_id": compound["id"], "model_type": "solubility", "experiment_id": experiment["id"]}
+    response = client.post("/api/v1/predictions/", json=body, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+    assert client.post("/api/v1/predictions/", json=body, headers=auth_headers).status_code == 201
+
+    metrics = client.get(f"/api/v1/experiments/{experiment['id']}", headers=auth_headers).json()["metrics"]
+    assert metrics["prediction_count"] == 1
+
+
+def test_prediction_without_references_keeps_details(auth_headers, compound):
+    """Details with no model metadata or descriptors are stored as they are"""
+    with SessionLocal() as db:
+        prediction = Prediction(
+            compound_id=compound["id"],
+            user_id=compound["created_by"],
+            model_type="custom",
+            prediction_details={"note": "imported"}
+        )
+        db.add(prediction)
+        db.commit()
+        prediction_id = prediction.id
+        db.expunge_all()
+        stored = db.get(Prediction, prediction_id)
+        assert stored.model_version_id is None and stored.descriptor_set_id is None
+        assert stored.prediction_details == {"note": "imported"}
+
+
+def test_latest_predictions(auth_headers):
+    """The latest endpoint keeps the newest prediction per compound and model"""
+    compounds = [
+        client.post(
+            "/api/v1/compounds/",
+            json={"name": f"Latest probe {i}", "smiles": smiles},
+            headers=auth_headers
+        ).json()
+        for i, smiles in enumerate(["NCCCCN", "NCCCCCN", "NCCCCCCN"])
+    ]
+    ids = [c["id"] for c in compounds]
+    first = client.post(
+        "/api/v1/predictions/",
+        json={"compound_id": ids[0], "model_type": "solubility", "model_name": "v1"},
+        headers=auth_headers
+    ).json()
+    # The batch path replaces the first prediction and adds the others
+    response = client.post(
+        "/api/v1/predictions/batch",
+        json={"compound_ids": ids, "model_type": "solubility", "model_name": "v1"},
+        headers=auth_headers
+    )
+    assert response.status_code == 202
+    client.post(
+        "/api/v1/predictions/",
+        json={"compound_id": ids[1], "model_type": "toxicity"},
+        headers=auth_headers
+    )
+
+    response = client.get("/api/v1/predictions/latest", params={"compound_id": ids}, headers=auth_headers)
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    latest = response.json()
+    assert [(p["compound_id"], p["model_type"], p["model_name"]) for p in latest] == [
+        (ids[0], "solubility", "v1"),
+        (ids[1], "solubility", "v1"),
+        (ids[1], "toxicity", None),
+        (ids[2], "solubility", "v1"),
+    ]
+    assert latest[0]["prediction_id"] > first["id"]
+    history = client.get(
+        "/api/v1/predictions/", params={"compound_id": ids[0]}, headers=auth_headers
+    ).json()
+    assert latest[0]["prediction_id"] == history[0]["id"]
+
+    # Keyset paging visits every row once
+    seen, cursor = [], None
+    while True:
+        params = {"compound_id": ids, "limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/v1/predictions/latest", params=params, headers=auth_headers)
+        seen.extend(p["prediction_id"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [p["prediction_id"] for p in latest]
+
+    toxicity = client.get(
+        "/api/v1/predictions/latest", params={"compound_id": ids, "model_type": "toxicity"}, headers=auth_headers
+    ).json()
+    assert [p["compound_id"] for p in toxicity] == [ids[1]]
+    response = client.get("/api/v1/predictions/latest", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_top_compounds(auth_headers, monkeypatch):
+    """Single- and multi-objective rankings match a full sort of the latest predictions"""
+    from app.core.config import settings
+    ids = [
+        client.post(
+            "/api/v1/compounds/",
+            json={"name": f"Top probe {i}", "smiles": smiles},
+            headers=auth_headers
+        ).json()["id"]
+        for i, smiles in enumerate(["OCCCCCCCO", "c1ccccc1CCCO", "c1ccc2ccccc2c1CO", "ClCCCCCl", "OC(=O)CCCC(=O)O"])
+    ]
+    for model_type in ("solubility", "toxicity"):
+        client.post(
+            "/api/v1/predictions/batch",
+            json={"compound_ids": ids, "model_type": model_type},
+            headers=auth_headers
+        )
+    # A second model name for one compound; rankings still list it once
+    client.post(
+        "/api/v1/predictions/",
+        json={"compound_id": ids[1], "model_type": "solubility", "model_name": "v2"},
+        headers=auth_headers
+    )
+    latest = client.get("/api/v1/predictions/latest", params={"limit": 1000}, headers=auth_headers).json()
+    # Without a model name, each compound's newest prediction per model type counts
+    values = {}
+    for row in sorted(latest, key=lambda row: row["prediction_id"]):
+        values.setdefault(row["compound_id"], {})[row["model_type"]] = row["prediction_value"]
+
+    response = client.get(
+        "/api/v1/predictions/top", params={"objective": "solubility", "limit": 3}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    # A single objective ranks each compound by its newest row of the model type
+    solubility = sorted(
+        ((v["solubility"], c) for c, v in values.items() if "solubility" in v),
+        reverse=True
+    )[:3]
+    assert [(r["score"], r["compound_id"]) for r in response.json()] == solubility
+    response = client.get(
+        "/api/v1/predictions/top", params={"objective": "solubility", "limit": 1000}, headers=auth_headers
+    )
+    ranked = [r["compound_id"] for r in response.json()]
+    assert len(ranked) == len(set(ranked)) and ids[1] in ranked
+
+    # Chunk boundaries must not split a compound's rows
+    monkeypatch.setattr(settings, "TOP_K_CHUNK_SIZE", 3)
+    response = client.get(
+        "/api/v1/predictions/top",
+        params={"objective": ["solubility", "toxicity:-50"], "limit": 4},
+        headers=auth_headers
+    )
+    expected = sorted(
+        (
+            (v["solubility"] - 50 * v["toxicity"], c)
+            for c, v in values.items() if "solubility" in v and "toxicity" in v
+        ),
+        key=lambda item: (-item[0], item[1])
+    )[:4]
+    top = response.json()
+    assert [r["compound_id"] for r in top] == [c for _, c in expected]
+    assert [r["score"] for r in top] == pytest.approx([s for s, _ in expected])
+    assert set(top[0]["predictions"]) == {"solubility", "toxicity"}
+    assert top[0]["smiles"] and top[0]["compound_name"]
+
+    # Descriptor ranges filter on the compound's properties
+    response = client.get(
+        "/api/v1/predictions/top",
+        params={"objective": ["toxicity:-1", "solubility"], "descriptor": ["num_aromatic_rings:2:"]},
+        headers=auth_headers
+    )
+    assert [r["compound_id"] for r in response.json()] == [ids[2]]
+    response = client.get(
+        "/api/v1/predictions/top",
+        params={"objective": "toxicity:-1", "descriptor": "molecular_weight:150:", "limit": 1000},
+        headers=auth_headers
+    )
+    ranked = [r["compound_id"] for r in response.json()]
+    assert ids[2] in ranked and ids[0] not in ranked and ids[3] not in ranked  # 158, 132 and 141 Da
+
+    for params in ({"objective": "solubility:x"}, {"objective": "solubility", "descriptor": "color:1:2"}):
+        response = client.get("/api/v1/predictions/top", params=params, headers=auth_headers)
+        assert response.status_code == 400
+
+
+def test_batch_prediction_job_resumes(auth_headers, monkeypatch):
+    """A failed batch job resumes from its last committed chunk without duplicates"""
+    from app.core.config import settings
+    from app.models.job import Job
+    from app.tasks import prediction_tasks
+    ids = [
+        client.post(
+            "/api/v1/compounds/",
+            json={"name": f"Resume probe {i}", "smiles": smiles},
+            headers=auth_headers
+        ).json()["id"]
+        for i, smiles in enumerate(["OCCOCCO", "OCCOCCOCCO", "CCOCCOCC", "COCCOCCOC", "NCCOCCN"])
+    ]
+    monkeypatch.setattr(settings, "BATCH_PREDICTION_CHUNK_SIZE", 2)
+    calls = []
+
+    def failing_predict(smiles, model_name=None):
+        calls.append(smiles)
+        if len(calls) == 3:
+            raise RuntimeError("worker lost")
+        return predict_solubility(smiles, model_name)
+
+    monkeypatch.setattr(prediction_tasks, "predict_solubility", failing_predict)
+    response = client.post(
+        "/api/v1/predictions/batch",
+        json={"compound_ids": ids + ids[:1], "model_type": "solubility"},
+        headers=auth_headers
+    )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    job = client.get(f"/api/v1/jobs/{job_id}", headers=auth_headers).json()
+    assert (job["status"], job["total"], job["processed"]) == ("failed", 5, 2)
+    assert job["error"] == "worker lost"
+    assert job["result"] == {"created": 2, "existing": 0, "skipped": 0, "failed": 0}
+
+    response = client.post(f"/api/v1/jobs/{job_id}/resume", headers=auth_headers)
+    assert response.status_code == 202
+    job = client.get(f"/api/v1/jobs/{job_id}", headers=auth_headers).json()
+    assert (job["status"], job["processed"], job["error"]) == ("completed", 5, None)
+    assert job["result"]["created"] == 5
+
+    # A redelivery that finds the cursor behind committed work predicts nothing twice
+    with SessionLocal() as db:
+        db.get(Job, job_id).processed = 0
+        db.get(Job, job_id).status = "running"
+        db.commit()
+    result = prediction_tasks.run_batch_prediction_task(job_id)
+    assert result["status"] == "completed"
+    with SessionLocal() as db:
+        job_predictions = db.scalars(select(Prediction.compound_id).filter(Prediction.job_id == job_id)).all()
+        assert sorted(job_predictions) == sorted(ids)
+        assert db.get(Job, job_id).result["existing"] == 5
+    assert client.post(f"/api/v1/jobs/{job_id}/resume", headers=auth_headers).status_code == 409
+
+
+
+def test_batch_chunk_that_never_commits_fails_the_job(auth_headers, monkeypatch):
+    """A chunk rejected by the database on every attempt fails the job instead of retrying forever"""
+    from sqlalchemy.exc import IntegrityError
+    from app.core.config import settings
+    from app.tasks import prediction_tasks
+    compound_id = client.post(
+        "/api/v1/compounds/",
+        json={"name": "Stuck probe", "smiles": "OCCSCCO"},
+        headers=auth_headers
+    ).json()["id"]
+    calls = []
+
+    def rejected_chunk(db, job, compound_ids):
+        calls.append(compound_ids)
+        raise IntegrityError("INSERT INTO predictions", {}, Exception("duplicate key"))
+
+    monkeypatch.setattr(prediction_tasks, "_predict_chunk", rejected_chunk)
+    response = client.post(
+        "/api/v1/predictions/batch",
+        json={"compound_ids": [compound_id], "model_type": "solubility"},
+        headers=auth_headers
+    )
+    job = client.get(f"/api/v1/jobs/{response.json()['job_id']}", headers=auth_headers).json()
+    assert (job["status"], job["processed"]) == ("failed", 0)
+    assert "after 3 attempts" in job["error"]
+    assert len(calls) == settings.BATCH_CHUNK_MAX_ATTEMPTS
+
+def test_batch_jobs_are_routed_and_time_sliced(auth_headers, monkeypatch):
+    """Large jobs go to the bulk queue and give up their worker between slices"""
+    from app.core.config import settings
+    from app.tasks import prediction_tasks
+    assert prediction_tasks.batch_queue(1000) == "interactive"
+    assert prediction_tasks.batch_queue(1001) == "bulk"
+    assert [prediction_tasks.batch_priority(n) for n in (1, 9, 10, 50000, 10 ** 12)] == [0, 0, 1, 4, 9]
+
+    ids = [
+        client.post(
+            "/api/v1/compounds/",
+            json={"name": f"Slice probe {i}", "smiles": smiles},
+            headers=auth_headers
+        ).json()["id"]
+        for i, smiles in enumerate(["OCCCOCCCO", "NCCCOCCCN", "OCCNCCO"])
+    ]
+    monkeypatch.setattr(settings, "BATCH_INTERACTIVE_MAX_COMPOUNDS", 2)
+    monkeypatch.setattr(settings, "BATCH_PREDICTION_CHUNK_SIZE", 1)
+    monkeypatch.setattr(settings, "BATCH_SLICE_SECONDS", 0)
+    sent = []
+    send = prediction_tasks._send_batch_job
+    monkeypatch.setattr(prediction_tasks, "_send_batch_job", lambda *args: (sent.append(args), send(*args)))
+    response = client.post(
+        "/api/v1/predictions/batch", json={"compound_ids": ids, "model_type": "toxicity"}, headers=auth_headers
+    )
+    job_id = response.json()["job_id"]
+    # Queued once by the endpoint, then requeued after each of the first two chunks
+    assert sent == [(job_id, 3)] * 3
+    job = client.get(f"/api/v1/jobs/{job_id}", headers=auth_headers).json()
+    assert (job["status"], job["processed"], job["result"]["created"]) == ("completed", 3, 3)
+
+
+def test_batch_job_quota(auth_headers, monkeypatch):
+    """A user's jobs past the quota wait pending until an active one finishes"""
+    from app.core.config import settings
+    from app.models.job import Job
+    from app.tasks import prediction_tasks
+    user_id = client.get("/api/v1/auth/me", headers=auth_headers).json()["id"]
+    monkeypatch.setattr(settings, "BATCH_MAX_ACTIVE_JOBS_PER_USER", 2)
+    sent = []
+    monkeypatch.setattr(prediction_tasks, "_send_batch_job", lambda *args: sent.append(args))
+
+    with SessionLocal() as db:
+        jobs = [
+            Job(job_type="batch_prediction", status=status, user_id=user_id, total=total,
+                parameters={"compound_ids": [], "model_type": "solubility"})
+            for status, total in (("running", 5000), ("pending", 10), ("pending", 20000), ("pending", 30))
+        ]
+        db.add_all(jobs)
+        db.commit()
+        job_ids = [job.id for job in jobs]
+
+    assert prediction_tasks.dispatch_batch_jobs(user_id) == 1
+    assert sent == [(job_ids[1], 10)]
+    assert prediction_tasks.dispatch_batch_jobs(user_id) == 0
+
+    with SessionLocal() as db:
+        db.get(Job, job_ids[0]).status = "completed"
+        db.commit()
+    assert prediction_tasks.dispatch_batch_jobs(user_id) == 1
+    assert sent[-1] == (job_ids[2], 20000)
+    with SessionLocal() as db:
+        assert [db.get(Job, i).status for i in job_ids] == ["completed", "queued", "queued", "pending"]
+        for job_id in job_ids:
+            db.get(Job, job_id).status = "completed"
+        db.commit()
@@ -0,0 +1,90 @@
+"""Tests for per-request query instrumentation"""
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+from app.core.query_stats import RequestQueryStats
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def auth_headers():
+    """Register and log in a user"""
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": "querystats@example.com", "password": "testpassword123"}
+    )
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "querystats@example.com", "password": "testpassword123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_server_timing_header(auth_headers):
+    """Every response reports its database time and query count"""
+    response = client.get("/api/v1/compounds/", headers=auth_headers)
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "queries" in timing
+    assert "db-pool;dur=" in timing
+
+
+def test_predictions_export_stays_within_budget(auth_headers):
+    """The export issues a fixed number of queries however many rows it has"""
+    experiment = client.post(
+        "/api/v1/experiments/",
+        json={"name": "Budget probe", "model_type": "solubility"},
+        headers=auth_headers
+    ).json()
+    for i, smiles in enumerate(["CCCCO", "CCCCN", "CCCCC", "CCCOC", "CCCCCl", "CCCCBr", "CCCC=O", "CCCCS"]):
+        compound = client.post(
+            "/api/v1/compounds/",
+            json={"name": f"Budget probe {i}", "smiles": smiles},
+            headers=auth_headers
+        ).json()
+        response = client.post(
+            "/api/v1/predictions/",
+            json={
+                "compound_id": compound["id"],
+                "experiment_id": experiment["id"],
+                "model_type": "solubility"
+            },
+            headers=auth_headers
+        )
+        assert response.status_code == 201
+
+    response = client.get(
+        "/api/v1/reports/predictions/csv",
+        params={"experiment_id": experiment["id"]},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert len(lines) == 9
+    assert all(",Budget probe " in line for line in lines[1:])
+
+
+def test_query_budget_enforced(auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET", 0)
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_ENFORCE", True)
+    response = client.get("/api/v1/compounds/", headers=auth_headers)
+    assert response.status_code == 500
+    assert "Query budget exceeded" in response.json()["detail"]
+
+
+def test_repeated_statements_flagged():
+    stats = RequestQueryStats()
+    for _ in range(12):
+        stats.record_query("SELECT * FROM compounds WHERE id = ?", 0.001)
+    stats.record_query("SELECT * FROM predictions", 0.002)
+    assert stats.count == 13
+    assert stats.repeated_statements(10) == [("SELECT * FROM compounds WHERE id = ?", 12)]
+
+
+def test_pool_stats_endpoint():
+    response = client.get("/health/db")
+    assert response.status_code == 200
+    assert response.json()["sync"]["pool"] == "TimedQueuePool"
@@ -0,0 +1,163 @@
+"""Tests for streaming virtual screening"""
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from app.main import app
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.compound import Compound
+from app.models.experiment import LatestPrediction
+from app.services.ml_service import (
+    calculate_molecular_properties,
+    predict_drug_target_interaction,
+    predict_solubility,
+    predict_toxicity,
+    predict_values,
+)
+from app.services.screening_service import shutdown_screening_pool
+
+client = TestClient(app)
+
+LIBRARY = b"""# screening library
+NCCCCN putrescine
+c1ccc2ccccc2c1 naphthalene
+C1CC
+CCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCC long-chain
+
+OC(=O)CCC(=O)O"""
+
+
+@pytest.fixture(scope="module", autouse=True)
+def screening_pool():
+    """One worker and tiny chunks so the stream spans several chunks"""
+    workers, chunk_size = settings.SCREENING_WORKERS, settings.SCREENING_CHUNK_SIZE
+    settings.SCREENING_WORKERS, settings.SCREENING_CHUNK_SIZE = 1, 2
+    yield
+    shutdown_screening_pool()
+    settings.SCREENING_WORKERS, settings.SCREENING_CHUNK_SIZE = workers, chunk_size
+
+
+@pytest.fixture(scope="module")
+def auth_headers():
+    """Register and log in a user"""
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": "screening@example.com", "password": "testpassword123"}
+    )
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "screening@example.com", "password": "testpassword123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def screen(body, headers, **params):
+    def upload():
+        # Uneven pieces, so lines are split across reads
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+    with client.stream("POST", "/api/v1/screening/", params=params, content=upload(), headers=headers) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def compound_count():
+    with SessionLocal() as db:
+        return db.scalar(select(func.count(Compound.id)))
+
+
+def test_vectorized_models_match_single_predictions():
+    smiles = ["CCOC(=O)C", "c1ccccc1O", "CC(=O)Nc1ccc(O)cc1"]
+    properties = [calculate_molecular_properties(s) for s in smiles]
+    arrays = {name: np.array([p[name] for p in properties]) for name in properties[0]}
+    for model_type, predict in (
+        ("solubility", predict_solubility),
+        ("toxicity", predict_toxicity),
+        ("dti", predict_drug_target_interaction),
+    ):
+        expected = [predict(s)["prediction_value"] for s in smiles]
+        assert predict_values(model_type, arrays).tolist() == pytest.approx(expected)
+
+
+def test_screening_streams_one_line_per_molecule(auth_headers):
+    before = compound_count()
+    lines = screen(LIBRARY, auth_headers, model=["solubility", "toxicity"])
+    results, summary = lines[:-1], lines[-1]["summary"]
+
+    assert [r["line"] for r in results] == [2, 3, 4, 5, 7]
+    assert [r["id"] for r in results] == ["putrescine", "naphthalene", None, "long-chain", None]
+    assert results[2]["error"] == "Invalid SMILES"
+    assert results[3]["passed"] is False and results[3]["ro5_violations"] == 2
+    assert "predictions" not in results[3]
+    putrescine = results[0]
+    assert putrescine["passed"] is True
+    assert putrescine["predictions"] == pytest.approx({
+        "solubility": predict_solubility("NCCCCN")["prediction_value"],
+        "toxicity": predict_toxicity("NCCCCN")["prediction_value"],
+    })
+    assert summary == {"processed": 5, "invalid": 1, "filtered": 1, "scored": 3}
+    assert compound_count() == before
+
+    # The filter can be turned off
+    lines = screen(LIBRARY, auth_headers, rule_of_five="false", include_descriptors="true")
+    assert lines[3]["passed"] is True and "ro5_violations" not in lines[3]
+    assert lines[0]["descriptors"]["hbd"] == 2
+
+
+def test_screening_top_k(auth_headers):
+    before = compound_count()
+    lines = screen(LIBRARY, auth_headers, model=["solubility", "toxicity"], top_k=2, objective=["toxicity:-1"])
+    progress = [line for line in lines if "progress" in line]
+    ranked = [line for line in lines if "rank" in line]
+    assert len(progress) == 3
+    assert progress[-1]["progress"]["processed"] == 5
+    assert [r["rank"] for r in ranked] == [1, 2]
+    scored = screen(LIBRARY, auth_headers, model=["toxicity"])[:-1]
+    best = sorted((r for r in scored if r.get("passed")), key=lambda r: r["predictions"]["toxicity"])[:2]
+    assert [r["smiles"] for r in ranked] == [r["smiles"] for r in best]
+    assert ranked[0]["score"] == pytest.approx(-best[0]["predictions"]["toxicity"])
+    assert "persisted" not in lines[-1]["summary"]
+    assert compound_count() == before
+
+
+def test_screening_persists_hits(auth_headers, monkeypatch):
+    from app.services import model_registry
+
+    class RegisteredModel:
+        version = "7"
+
+        def predict(self, descriptors):
+            return [999.0]
+
+    # A registered model under the default names must not replace the values hits were ranked by
+    monkeypatch.setattr(
+        model_registry, "get_registered_model", lambda model_type, name: RegisteredModel() if name else None
+    )
+    before = compound_count()
+    lines = screen(b"NCC(=O)NCC(=O)O glycylglycine\nC1CC\n", auth_headers, model=["solubility", "dti"], top_k=1,
+                   objective=["solubility"], persist="true")
+    assert lines[-1]["summary"]["persisted"] == {"compounds_created": 1, "predictions": 2}
+    assert compound_count() == before + 1
+    with SessionLocal() as db:
+        compound = db.scalar(select(Compound).filter(Compound.smiles == "NCC(=O)NCC(=O)O"))
+        assert compound.name == "glycylglycine"
+        latest = db.scalars(select(LatestPrediction).filter(LatestPrediction.compound_id == compound.id)).all()
+        assert sorted(p.model_type for p in latest) == ["dti", "solubility"]
+    hit = next(line for line in lines if "rank" in line)
+    assert {p.model_type: p.prediction_value for p in latest} == pytest.approx(hit["predictions"])
+
+
+def test_screening_rejects_bad_requests(auth_headers):
+    response = client.post("/api/v1/screening/", params={"model": "potency"}, content=b"C", headers=auth_headers)
+    assert response.status_code == 400
+    response = client.post("/api/v1/screening/", params={"persist": "true"}, content=b"C", headers=auth_headers)
+    assert response.status_code == 400
+    response = client.post(
+        "/api/v1/screening/", params={"model": ["solubility", "dti"], "top_k": 5}, content=b"C", headers=auth_headers
+    )
+    assert response.status_code == 400
+    response = client.post("/api/v1/screening/", content=b"C")
+    assert response.status_code == 401
@@ -0,0 +1,21 @@
+"""Tests that heavy dependencies stay out of the application import path"""
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ("mlflow", "rdkit", "numpy", "pandas", "reportlab", "celery", "sklearn")
+
+
+def test_app_import_does_not_load_heavy_modules():
+    code = (
+        "import sys, app.main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,52 @@
+"""Tests for compound version encoding"""
+from app.core.config import settings
+from app.services.versioning_service import (
+    apply_json_patch,
+    encode_version_state,
+    make_json_patch,
+)
+
+
+def test_json_patch_roundtrip():
+    """Test that a patch turns the source state into the target state"""
+    source = {
+        "name": "Aspirin",
+        "smiles": "CC(=O)OC1=CC=CC=C1C(=O)O",
+        "properties": {"logp": 1.31, "tpsa": 63.6, "a/b": {"x~y": 1}, "old": True},
+    }
+    target = {
+        "name": "Acetylsalicylic acid",
+        "smiles": "CC(=O)OC1=CC=CC=C1C(=O)O",
+        "properties": {"logp": 1.31, "tpsa": 64.0, "a/b": {"x~y": 2}, "new": [1, 2]},
+    }
+    patch = make_json_patch(source, target)
+
+    assert apply_json_patch(source, patch) == target
+    assert source["properties"]["old"] is True  # source is not modified
+    assert make_json_patch(target, target) == []
+
+
+def test_json_patch_replaces_non_object_values():
+    """Test switching between objects and scalars"""
+    source = {"name": "x", "smiles": "C", "properties": None}
+    target = {"name": "x", "smiles": "C", "properties": {"logp": 0.5}}
+
+    assert apply_json_patch(source, make_json_patch(source, target)) == target
+    assert apply_json_patch(target, make_json_patch(target, source)) == source
+
+
+def test_encode_version_state_checkpoints():
+    """Test when a full checkpoint is written instead of a delta"""
+    checkpoint = {
+        "name": "Caffeine",
+        "smiles": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+        "properties": {"molecular_weight": 194.19, "logp": -1.03, "tpsa": 61.82, "hbd": 0},
+    }
+    renamed = dict(checkpoint, name="Guaranine")
+
+    assert encode_version_state(renamed, None, 0) is None
+    assert encode_version_state(renamed, checkpoint, 1) == [
+        {"op": "replace", "path": "/name", "value": "Guaranine"}
+    ]
+    interval = settings.COMPOUND_VERSION_CHECKPOINT_INTERVAL
+    assert encode_version_state(renamed, checkpoint, interval) is None